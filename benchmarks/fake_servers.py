@@ -0,0 +1,176 @@
+# fake_servers.py
+"""
+Local stand-ins for the OpenAI and Exa APIs, used by the load test.
+
+Both answer with canned but well-formed payloads after a random delay (lognormal around a
+median), so the real SDKs, the shared HTTP pool and the whole graph run unchanged:
+- OpenAI: `POST /v1/chat/completions`. It handles json_schema structured output (by schema name)
+  and tool calling (one `exa_search` round, then a plain answer).
+- Exa: `POST /search`.
+
+The load test starts each one as its own process so they don't share a GIL with the API.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import socket
+import time
+import uvicorn
+from fastapi import FastAPI, Request
+
+PRODUCTS = [
+    {"id": f"p{i}", "name": name, "price": price, "currency": "USD", "rating": rating, "rating_count": 100 * i,
+     "url": f"https://www.example-shop.com/p/{i}", "image_url": None, "source": "example-shop",
+     "availability": "in_stock", "snippet": f"{name}, a {kind}.",
+     "review": {"pros": ["fast", "light"], "cons": ["pricey"], "overall_sentiment": "positive"}}
+    for i, (name, price, rating, kind) in enumerate([
+        ("Dell XPS 13", 1099.0, 4.5, "laptop"),
+        ("Lenovo ThinkPad X1 Carbon", 1249.0, 4.6, "laptop"),
+        ("Apple MacBook Air M3", 1099.0, 4.8, "laptop"),
+        ("ASUS Zenbook 14", 899.0, 4.3, "laptop"),
+        ("HP Spectre x360", 1199.0, 4.4, "laptop"),
+    ], start=1)
+]
+
+RECOMMENDATION = {
+    "top_picks": [PRODUCTS[0]["name"], PRODUCTS[2]["name"]],
+    "recommendations": [
+        {"product_id": p["id"], "product_name": p["name"], "price": p["price"], "currency": "USD",
+         "rating": p["rating"], "source": p["source"], "url": p["url"],
+         "why": "Matches the budget and use case.", "tradeoffs": "Average battery life."}
+        for p in PRODUCTS[:3]
+    ],
+    "final_choice": {"product_id": "p1", "product_name": PRODUCTS[0]["name"], "reason": "Best balance."},
+}
+
+# Structured-output answers by json_schema name
+STRUCTURED = {
+    "ProductSpecs": {"category": "laptop", "max_price": 1200.0, "min_price": None, "brand_preferences": [],
+                     "excluded_brands": [], "use_cases": ["programming"], "key_requirements": ["lightweight"]},
+    "Product": {"products": PRODUCTS},
+    "Recommendation": RECOMMENDATION,
+    "SearchPlan": {"queries": ["best laptop for programming under 1200", "lightweight laptop deals",
+                               "dell xps 13 price", "thinkpad x1 carbon price"]},
+    "ProductsWithRecommendation": {"products": PRODUCTS, "recommendation": RECOMMENDATION},
+}
+
+
+class Latency:
+    """Lognormal delay around `median_ms`; sigma 0 makes it constant"""
+
+    def __init__(self, median_ms: float, sigma: float = 0.3, seed: int = 0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.rng = random.Random(seed)
+
+    async def wait(self) -> None:
+        if self.median_ms <= 0:
+            return
+        ms = self.median_ms if self.sigma <= 0 else self.rng.lognormvariate(math.log(self.median_ms), self.sigma)
+        await asyncio.sleep(ms / 1000)
+
+
+def _usage(body: dict, completion: str) -> dict:
+    prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+    completion_tokens = max(1, len(completion) // 4)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def openai_app(latency: Latency) -> FastAPI:
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/v1/models")
+    async def models():
+        # Hit by the API's start-up warm-up
+        return {"object": "list", "data": [{"id": "gpt-4.1", "object": "model", "created": 0, "owned_by": "fake"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        await latency.wait()
+
+        message = {"role": "assistant", "content": None}
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            name = response_format["json_schema"]["name"]
+            message["content"] = json.dumps(STRUCTURED[name])
+        elif body.get("tools") and not any(m.get("role") == "tool" for m in body.get("messages", [])):
+            query = body["messages"][-1].get("content") or "product"
+            message["tool_calls"] = [{
+                "id": f"call_{app.state.calls}",
+                "type": "function",
+                "function": {"name": body["tools"][0]["function"]["name"],
+                             "arguments": json.dumps({"query": str(query)[:80]})},
+            }]
+        elif body.get("tools") and body.get("tool_choice"):
+            # Tool-calling structured output (method="function_calling")
+            function = body["tools"][0]["function"]
+            message["tool_calls"] = [{
+                "id": f"call_{app.state.calls}", "type": "function",
+                "function": {"name": function["name"], "arguments": json.dumps(STRUCTURED[function["name"]])},
+            }]
+        else:
+            message["content"] = "Shortlist: " + ", ".join(p["name"] for p in PRODUCTS)
+
+        return {
+            "id": f"chatcmpl-{app.state.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": message,
+                         "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+            "usage": _usage(body, json.dumps(message)),
+        }
+
+    return app
+
+
+def exa_app(latency: Latency) -> FastAPI:
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/search")
+    async def search(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        await latency.wait()
+        n = int(body.get("numResults", 5))
+        return {
+            "requestId": f"req-{app.state.calls}",
+            "resolvedSearchType": "neural",
+            "results": [
+                {"id": p["url"], "url": p["url"], "title": f"{p['name']} | Example Shop",
+                 "text": f"{p['name']} {p['snippet']} Price: ${p['price']:,.2f}. "
+                         f"Rated {p['rating']} out of 5 stars {p['rating_count']} ratings. " * 5}
+                for p in PRODUCTS[:n]
+            ],
+        }
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+if __name__ == "__main__":
+    # python -m benchmarks.fake_servers --kind openai --port 9001 --median-ms 400
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kind", choices=["openai", "exa"], required=True)
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--median-ms", type=float, default=300)
+    parser.add_argument("--sigma", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    factory = openai_app if args.kind == "openai" else exa_app
+    uvicorn.run(factory(Latency(args.median_ms, args.sigma, args.seed)),
+                host="127.0.0.1", port=args.port, log_level="error", access_log=False)
@@ -0,0 +1,266 @@
+# load_test.py
+"""
+Load test and latency benchmark for POST /USER.
+
+Starts fake OpenAI and Exa servers (see fake_servers.py) and the API itself, each as its own
+process, then drives /USER with a weighted query mix, either closed-loop (`--concurrency`
+workers back to back) or open-loop (Poisson arrivals at `--rate` requests/second), once per
+search mode. Results are printed and written as JSON:
+
+    python -m benchmarks.load_test --requests 100 --concurrency 16 --modes react fanout
+    python -m benchmarks.load_test --rate 5 --requests 200 --llm-latency-ms 600 --cold
+
+Per mode it reports throughput, p50/p95/p99 latency, X-Cache outcomes, the per-node LLM time
+(from each response's `llm_usage`) and the API process's memory (RSS, Linux only).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+import httpx
+import numpy as np
+from benchmarks.fake_servers import free_port
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MIX = [
+    {"user": "lightweight laptop for programming under $1200", "weight": 4},
+    {"user": "noise cancelling headphones for travel under 300 dollars", "weight": 3},
+    {"user": "budget gaming monitor 144hz under 250", "weight": 2},
+    {"user": "running shoes for flat feet", "weight": 2},
+    {"user": "espresso machine for beginners under 500", "weight": 1},
+]
+
+# A run that answers within this is counted, anything slower is an error
+REQUEST_TIMEOUT_SECONDS = 300
+
+
+def _rss_kb(pid: int) -> Dict[str, Optional[int]]:
+    """Current (VmRSS) and peak (VmHWM) resident memory of `pid`, in kB"""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return {"rss_kb": None, "peak_rss_kb": None}
+    fields = dict(line.split(":", 1) for line in status.splitlines() if ":" in line)
+    parse = lambda name: int(fields[name].split()[0]) if name in fields else None
+    return {"rss_kb": parse("VmRSS"), "peak_rss_kb": parse("VmHWM")}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _start(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+async def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.time() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited: {process.stderr.read().decode()[-2000:]}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise TimeoutError(f"{url} did not come up within {timeout}s")
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 4), "p95": round(float(p95), 4), "p99": round(float(p99), 4),
+            "mean": round(float(np.mean(values)), 4), "max": round(float(np.max(values)), 4)}
+
+
+async def _one(client: httpx.AsyncClient, query: dict, mode: str) -> dict:
+    started = time.perf_counter()
+    record = {"mode": mode, "query": query["user"], "started": started}
+    try:
+        response = await client.post("/USER", json={**{k: v for k, v in query.items() if k != "weight"}, "search_mode": mode})
+        record["status"] = response.status_code
+        record["cache"] = response.headers.get("X-Cache")
+        if response.status_code == 200:
+            body = response.json()
+            record["degraded"] = body.get("degraded")
+            record["search_seconds"] = body.get("search_seconds")
+            record["products"] = len((body.get("product_list") or {}).get("products") or [])
+            nodes: Dict[str, float] = {}
+            for usage in (body.get("llm_usage") or {}).values():
+                nodes[usage["node"]] = nodes.get(usage["node"], 0.0) + usage["seconds"]
+            record["node_seconds"] = nodes
+    except httpx.HTTPError as e:
+        record["status"] = None
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["latency"] = time.perf_counter() - started
+    return record
+
+
+async def run_mode(base_url: str, mode: str, args, mix: List[dict], api_pid: int) -> dict:
+    rng = random.Random(args.seed)
+    queries = rng.choices(mix, weights=[q.get("weight", 1) for q in mix], k=args.requests)
+    limits = httpx.Limits(max_connections=max(args.concurrency, 1) * 2, max_keepalive_connections=args.concurrency)
+    memory_before = _rss_kb(api_pid)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=REQUEST_TIMEOUT_SECONDS) as client:
+        started = time.perf_counter()
+        if args.rate:
+            # Open loop: Poisson arrivals, requests don't wait for each other
+            tasks = []
+            for query in queries:
+                tasks.append(asyncio.create_task(_one(client, query, mode)))
+                await asyncio.sleep(rng.expovariate(args.rate))
+            records = await asyncio.gather(*tasks)
+        else:
+            pending = iter(queries)
+            records = []
+
+            async def worker():
+                for query in pending:
+                    records.append(await _one(client, query, mode))
+
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - started
+
+    ok = [r for r in records if r.get("status") == 200]
+    nodes = sorted({node for r in ok for node in r.get("node_seconds", {})})
+    cache = {}
+    for r in records:
+        cache[r.get("cache") or "none"] = cache.get(r.get("cache") or "none", 0) + 1
+    return {
+        "mode": mode,
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "degraded": sum(1 for r in ok if r.get("degraded")),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(ok) / wall, 3) if wall else None,
+        "latency_seconds": _percentiles([r["latency"] for r in ok]),
+        "search_seconds": _percentiles([r["search_seconds"] for r in ok if r.get("search_seconds") is not None]),
+        # Mean LLM time per request for each node (0 when a request skipped it, e.g. on a cache hit)
+        "node_seconds": {node: round(float(np.mean([r["node_seconds"].get(node, 0.0) for r in ok])), 4) for node in nodes},
+        "cache": cache,
+        "memory": {"before": memory_before, "after": _rss_kb(api_pid)},
+        "samples": [{k: v for k, v in r.items() if k != "started"} for r in records] if args.samples else None,
+    }
+
+
+async def main(args) -> dict:
+    mix = json.loads(Path(args.mix).read_text()) if args.mix else DEFAULT_MIX
+    ports = {"openai": free_port(), "exa": free_port(), "api": free_port()}
+
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    fakes = [
+        _start(["-m", "benchmarks.fake_servers", "--kind", kind, "--port", str(ports[kind]),
+                "--median-ms", str(latency), "--sigma", str(args.latency_sigma), "--seed", str(args.seed)], env)
+        for kind, latency in (("openai", args.llm_latency_ms), ("exa", args.exa_latency_ms))
+    ]
+
+    # Sessions and jobs live in a throwaway directory so runs neither touch the repo's .cache nor share state
+    state_dir = tempfile.TemporaryDirectory(prefix="vector-bench-")
+    api_env = {
+        **env,
+        "OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": f"http://127.0.0.1:{ports['openai']}/v1",
+        "EXA_API_KEY": "fake", "EXA_API_BASE": f"http://127.0.0.1:{ports['exa']}",
+        "LLM_MODEL_DEFAULT": "openai:gpt-4.1@0.1", "CASSETTE_MODE": "off",
+        "EXA_CACHE_PATH": "", "CATALOG_PATH": "", "VECTOR_INDEX_PATH": "",
+        "SESSION_CHECKPOINT_PATH": str(Path(state_dir.name) / "sessions.sqlite"),
+        "JOBS_DB_PATH": str(Path(state_dir.name) / "jobs.sqlite"),
+    }
+    if args.cold:
+        # Every request pays for the full pipeline
+        api_env.update({
+            "RESPONSE_CACHE_TTL_SECONDS": "0", "RESPONSE_CACHE_STALE_SECONDS": "0",
+            "EXA_CACHE_TTL_SECONDS": "0", "SPECS_CACHE_TTL_SECONDS": "0", "SPECS_RULES_ENABLED": "false",
+            "CATALOG_ENABLED": "false",
+        })
+    for pair in args.env:
+        name, _, value = pair.partition("=")
+        api_env[name] = value
+
+    api = _start(["-m", "uvicorn", "src.api.main:app", "--host", "127.0.0.1", "--port", str(ports["api"]),
+                  "--log-level", "warning", "--workers", "1"], api_env)
+    base_url = f"http://127.0.0.1:{ports['api']}"
+    try:
+        for kind, fake in zip(("openai", "exa"), fakes):
+            await _wait_ready(f"http://127.0.0.1:{ports[kind]}/docs", fake)
+        await _wait_ready(f"{base_url}/docs", api)
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            startup = (await client.get("/startup/stats")).json()
+
+        modes = [await run_mode(base_url, mode, args, mix, api.pid) for mode in args.modes]
+
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            http_pool = (await client.get("/http/stats")).json()
+    finally:
+        for process in (api, *fakes):
+            process.terminate()
+        for process in (api, *fakes):
+            process.wait(timeout=10)
+        state_dir.cleanup()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "startup": startup,
+        "modes": modes,
+        "http_pool": http_pool,
+    }
+
+
+def _print_summary(result: dict) -> None:
+    print(f"{'mode':8} {'req':>5} {'err':>4} {'rps':>7} {'p50':>7} {'p95':>7} {'p99':>7}  nodes (mean s)")
+    for m in result["modes"]:
+        lat = m["latency_seconds"]
+        fmt = lambda v: f"{v:7.3f}" if v is not None else "      -"
+        nodes = ", ".join(f"{k}={v:.3f}" for k, v in m["node_seconds"].items())
+        print(f"{m['mode']:8} {m['requests']:5d} {m['errors']:4d} {fmt(m['throughput_rps'])} "
+              f"{fmt(lat['p50'])} {fmt(lat['p95'])} {fmt(lat['p99'])}  {nodes}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="requests per search mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop workers (ignored with --rate)")
+    parser.add_argument("--rate", type=float, default=None, help="open-loop Poisson arrival rate, requests/second")
+    parser.add_argument("--modes", nargs="+", choices=["react", "fanout"], default=["react", "fanout"])
+    parser.add_argument("--mix", help='JSON file: [{"user": "...", "currency": "USD", "weight": 2}, ...]')
+    parser.add_argument("--llm-latency-ms", type=float, default=400, help="median fake OpenAI latency")
+    parser.add_argument("--exa-latency-ms", type=float, default=250, help="median fake Exa latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="lognormal sigma of the fake latencies")
+    parser.add_argument("--cold", action="store_true", help="disable the response / Exa / specs caches")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra env for the API process")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--samples", action="store_true", help="include every request in the output")
+    parser.add_argument("--output", default=None, help="results file (default: benchmarks/results/<timestamp>.json)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(main(args))
+    _print_summary(result)
+    output = Path(args.output or ROOT / "benchmarks" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, default=str))
+    print(f"results written to {output}")
@@ -0,0 +1,68 @@
+# batch.py
+"""
+Batch research: many queries run through the graph at once, at most `concurrency` at a time,
+with each result handed back as soon as its run finishes (completion order, not input order).
+
+Identical queries in a batch share one run. Across different queries, identical Exa searches and
+spec extractions are shared by the Exa cache and the specs agent's single-flight, which both
+coalesce calls that are in flight at the same time.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Sequence, Tuple
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 16))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", 500))
+
+
+def json_line(record: Dict[str, Any]) -> str:
+    """One JSON Lines record; Product / Recommendation models are dumped"""
+    return json.dumps(record, default=lambda o: o.model_dump() if hasattr(o, "model_dump") else str(o)) + "\n"
+
+
+async def run_batch(
+    items: Sequence[Any],
+    key: Callable[[Any], Hashable],
+    run: Callable[[Any], Awaitable[Tuple[Dict[str, Any], str]]],
+    concurrency: int = BATCH_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields one record per item as it finishes: `index` (position in `items`), `status` ("ok" or
+    "error"), `cache` (the X-Cache status `run` returned, or "BATCH" for a duplicate that reused
+    an earlier item's run), `elapsed_seconds` since the batch started, and the result fields.
+    """
+    started = time.perf_counter()
+    slots = asyncio.Semaphore(max(1, concurrency))
+    runs: Dict[Hashable, asyncio.Task] = {}
+
+    async def run_in_slot(item):
+        async with slots:
+            return await run(item)
+
+    async def one(index: int, item) -> Dict[str, Any]:
+        k = key(item)
+        duplicate = k in runs
+        if not duplicate:
+            runs[k] = asyncio.create_task(run_in_slot(item))
+        record: Dict[str, Any] = {"index": index}
+        try:
+            result, cache_status = await asyncio.shield(runs[k])
+        except Exception as e:
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        else:
+            record.update(status="ok", cache="BATCH" if duplicate else cache_status, **result)
+        record["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+        return record
+
+    tasks = [asyncio.create_task(one(i, item)) for i, item in enumerate(items)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # The client went away (or the CLI was interrupted): stop the runs nobody will read
+        for task in (*tasks, *runs.values()):
+            task.cancel()
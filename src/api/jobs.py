@@ -0,0 +1,271 @@
+# jobs.py
+"""
+Asynchronous research jobs: `POST /jobs` queues a run and returns its id straight away, then
+`GET /jobs/{id}` and `GET /jobs/{id}/result` are polled, so no connection stays open for the
+length of a run.
+
+- Job state is kept in SQLite (`JOBS_DB_PATH`), so queued and finished jobs survive a restart.
+  Jobs that were running when the process stopped are queued again.
+- At most `JOBS_WORKERS` runs execute at once. Queued interactive jobs always start before queued
+  bulk jobs, and bulk jobs never hold more than `JOBS_BULK_WORKERS` workers, so an interactive
+  job finds a free worker even while a large bulk backlog drains. Running jobs are never interrupted.
+- Finished jobs are deleted `JOBS_RETENTION_SECONDS` after they finish, checked every
+  `JOBS_PURGE_INTERVAL_SECONDS` by the dispatcher.
+- Once started, the queue reads and writes the store in a worker thread, so SQLite never holds
+  up the event loop the interactive requests run on.
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+PRIORITIES = {"interactive": 0, "bulk": 1}
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", ".cache/jobs.sqlite") or None
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", 4))
+JOBS_BULK_WORKERS = int(os.getenv("JOBS_BULK_WORKERS", max(1, JOBS_WORKERS - 1)))
+# Finished jobs (and their results) are deleted after this long
+JOBS_RETENTION_SECONDS = float(os.getenv("JOBS_RETENTION_SECONDS", 7 * 24 * 60 * 60))
+# How often the dispatcher deletes finished jobs past their retention
+JOBS_PURGE_INTERVAL_SECONDS = float(os.getenv("JOBS_PURGE_INTERVAL_SECONDS", 60 * 60))
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """The jobs table. Pass `path=None` to keep it in memory (nothing survives a restart)."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened lazily so that importing the API never touches the filesystem
+        if self._conn is None:
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            if self.path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, priority TEXT NOT NULL, status TEXT NOT NULL,"
+                " request TEXT NOT NULL, result TEXT, cache TEXT, error TEXT,"
+                " submitted_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, submitted_at)")
+        return self._conn
+
+    def insert(self, job_id: str, priority: str, request: Dict[str, Any], submitted_at: float) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT INTO jobs (id, priority, status, request, submitted_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, priority, json.dumps(request), submitted_at),
+            )
+            db.commit()
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            db = self._db()
+            db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            db.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Queued and running jobs, oldest first"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT id, priority, status, submitted_at FROM jobs"
+                " WHERE status IN ('queued', 'running') ORDER BY submitted_at"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        with self._lock:
+            rows = self._db().execute("SELECT status, priority, COUNT(*) FROM jobs GROUP BY status, priority").fetchall()
+        return {(status, priority): n for status, priority, n in rows}
+
+    def purge(self, finished_before: float) -> int:
+        with self._lock:
+            db = self._db()
+            deleted = db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (finished_before,)
+            ).rowcount
+            db.commit()
+        return deleted
+
+
+class JobQueue:
+    """
+    Priority queue plus dispatcher over a `JobStore`. `run(request)` executes one job and returns
+    (result, X-Cache status); the result must be JSON-serializable.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        run: Callable[[Dict[str, Any]], Awaitable[Tuple[Dict[str, Any], str]]],
+        workers: int = JOBS_WORKERS,
+        bulk_workers: int = JOBS_BULK_WORKERS,
+        retention_seconds: float = JOBS_RETENTION_SECONDS,
+        purge_interval_seconds: float = JOBS_PURGE_INTERVAL_SECONDS,
+    ):
+        self.store = store
+        self.run = run
+        self.workers = max(1, workers)
+        self.bulk_workers = max(1, min(bulk_workers, self.workers))
+        self.retention_seconds = retention_seconds
+        self.purge_interval_seconds = purge_interval_seconds
+        self._purged_at = 0.0
+        # Set while stop() cancels the running jobs, so they are told apart from runs cancelled from inside
+        self._stopping = False
+        # (priority rank, submitted_at, job id, priority)
+        self._pending: List[Tuple[int, float, str, str]] = []
+        self._running: Dict[str, Tuple[str, asyncio.Task]] = {}
+        self._wake = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def _push(self, job_id: str, priority: str, submitted_at: float) -> None:
+        heapq.heappush(self._pending, (PRIORITIES[priority], submitted_at, job_id, priority))
+        self._wake.set()
+
+    def start(self) -> None:
+        # Bound to the running loop, which may differ from the previous start()'s
+        self._wake = asyncio.Event()
+        # The store is the source of truth: queued jobs (including ones submitted before start) are reloaded
+        self._pending = []
+        self._stopping = False
+        self._purge()
+        for job in self.store.unfinished():
+            if job["status"] == "running":
+                # The process stopped mid-run; the run is lost, so it starts over
+                self.store.update(job["id"], status="queued", started_at=None)
+            self._push(job["id"], job["priority"], job["submitted_at"])
+        if self._pending:
+            logger.info("re-queued %d unfinished jobs", len(self._pending))
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def _purge(self) -> None:
+        deleted = self.store.purge(time.time() - self.retention_seconds)
+        self._purged_at = time.monotonic()
+        if deleted:
+            logger.info("purged %d finished jobs", deleted)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        tasks = [t for t in (self._dispatcher,) if t] + [task for _, task in self._running.values()]
+        for task in tasks:
+            task.cancel()
+        # Cancelled jobs stay "running" in the store and are queued again by the next start()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+
+    async def submit(self, request: Dict[str, Any], priority: str = "interactive") -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        submitted_at = time.time()
+        await asyncio.to_thread(self.store.insert, job_id, priority, request, submitted_at)
+        self._push(job_id, priority, submitted_at)
+        return await self.status(job_id)
+
+    def _next(self) -> Optional[Tuple[str, str]]:
+        if not self._pending or len(self._running) >= self.workers:
+            return None
+        _, _, job_id, priority = self._pending[0]
+        # Bulk jobs sort last, so if the head is a bulk job there is no interactive one waiting
+        if priority == "bulk" and sum(p == "bulk" for p, _ in self._running.values()) >= self.bulk_workers:
+            return None
+        heapq.heappop(self._pending)
+        return job_id, priority
+
+    async def _dispatch(self) -> None:
+        while True:
+            while (job := self._next()) is not None:
+                job_id, priority = job
+                self._running[job_id] = (priority, asyncio.create_task(self._execute(job_id)))
+            self._wake.clear()
+            wait = self._purged_at + self.purge_interval_seconds - time.monotonic()
+            if wait <= 0:
+                await asyncio.to_thread(self._purge)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), wait)
+            except TimeoutError:
+                pass
+
+    async def _execute(self, job_id: str) -> None:
+        try:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            await asyncio.to_thread(self.store.update, job_id, status="running", started_at=time.time())
+            try:
+                result, cache_status = await self.run(json.loads(job["request"]))
+            except asyncio.CancelledError:
+                if self._stopping:
+                    raise
+                # Cancelled from inside the run (e.g. a shared call was dropped): the job is over, not interrupted
+                logger.warning("job %s was cancelled mid-run", job_id)
+                await asyncio.to_thread(
+                    self.store.update, job_id, status="failed", error="CancelledError", finished_at=time.time()
+                )
+            except Exception as e:
+                logger.exception("job %s failed", job_id)
+                await asyncio.to_thread(
+                    self.store.update, job_id, status="failed", error=f"{type(e).__name__}: {e}", finished_at=time.time()
+                )
+            else:
+                await asyncio.to_thread(
+                    self.store.update,
+                    job_id, status="done", result=json.dumps(result), cache=cache_status, finished_at=time.time(),
+                )
+        finally:
+            self._running.pop(job_id, None)
+            self._wake.set()
+
+    def _position(self, job_id: str) -> Optional[int]:
+        """0-based place in the queue: jobs that will start before this one"""
+        for position, entry in enumerate(sorted(self._pending)):
+            if entry[2] == job_id:
+                return position
+        return None
+
+    async def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return None
+        job.pop("result")
+        job["request"] = json.loads(job["request"])
+        job["job_id"] = job.pop("id")
+        job["queue_position"] = self._position(job_id) if job["status"] == "queued" else None
+        return job
+
+    async def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job record including its result (None until the job is done)"""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return None
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    async def stats(self) -> Dict[str, Any]:
+        counts = await asyncio.to_thread(self.store.counts)
+        return {
+            "workers": self.workers,
+            "bulk_workers": self.bulk_workers,
+            "running": {p: sum(r == p for r, _ in self._running.values()) for p in PRIORITIES},
+            "queued": {p: sum(e[3] == p for e in self._pending) for p in PRIORITIES},
+            "by_status": {f"{status}/{priority}": n for (status, priority), n in sorted(counts.items())},
+        }
@@ -1,31 +1,413 @@
-from fastapi import FastAPI
-from src.graph.main_graph import build_graph
-from pydantic import BaseModel
+import asyncio
+import os
+import time
+import weakref
+_import_started = time.perf_counter()
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from src.graph.main_graph import CHECKPOINT_TYPES, build_graph
+from src.graph.checkpoint import SqliteCheckpointSaver
+from src.nodes.refine import search_reset
+from src.api.stream import stream_graph_events
+from src.api.jobs import JOBS_DB_PATH, PRIORITIES, JobQueue, JobStore
+from src.api.batch import BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY, BATCH_MAX_QUERIES, json_line, run_batch
+from src.tools.exa_tool import exa_cache
+from src.nodes.specs_agent import specs_cache, spec_parser_stats
+from src.catalog.product_catalog import catalog
+from src.tools.dedupe import dedupe_stats
+from src.nodes.fanout_search import fanout_stats
+from src.cache.response_cache import MISS, ResponseCache
+from src.graph.budget import deadline_from_ms
+from src.llm import registry
+from src.llm.usage import LLMUsageTracker, llm_usage_stats, summarize
+from src.net.http_pool import pool_stats
+from src.net.cassette import cassette
+from src.api.warmup import WARMUP_ENABLED, startup_report, warm_up
+from src.monitoring import metrics
+from src.monitoring.graph_metrics import instrument, register_cache
+from src.monitoring.trace import TraceRecorder, trace_store
+from pydantic import BaseModel, Field, field_validator
 
-# Initializing the graph
-graph = build_graph()
+# Initializing the graph; requests with a session_id run on a checkpointed copy, so follow-ups
+# continue from the session's last state
+_graph_started = time.perf_counter()
+graph = instrument(build_graph())
+session_graph = instrument(build_graph(checkpointer=SqliteCheckpointSaver(
+    os.getenv("SESSION_CHECKPOINT_PATH", ".cache/sessions.sqlite") or None,
+    ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", 24 * 60 * 60)),
+    keep_latest=int(os.getenv("SESSION_CHECKPOINTS_KEPT", 2)) or None,
+    purge_interval_seconds=float(os.getenv("SESSION_PURGE_INTERVAL_SECONDS", 60 * 60)),
+    serde=JsonPlusSerializer(allowed_msgpack_modules=CHECKPOINT_TYPES),
+)))
+startup_report["graph_build_seconds"] = round(time.perf_counter() - _graph_started, 3)
 
 
+# Identical (query, currency) requests are answered from here; empty or degraded runs are not cached
+response_cache = ResponseCache(
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 10 * 60)),
+    stale_seconds=float(os.getenv("RESPONSE_CACHE_STALE_SECONDS", 60 * 60)),
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", 512)),
+    cacheable=lambda result: bool(
+        result.get("product_list") and result["product_list"].products and not result.get("degraded")
+    ),
+)
+
+# Time kept back from the deadline to serialize and send the response
+RESPONSE_MARGIN_SECONDS = float(os.getenv("BUDGET_RESPONSE_MARGIN_SECONDS", 0.25))
+_default_deadline = os.getenv("DEFAULT_DEADLINE_MS")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm-up runs in the background: the port opens immediately and requests don't wait on it
+    task = asyncio.create_task(warm_up(_import_started)) if WARMUP_ENABLED else None
+    jobs.start()
+    yield
+    await jobs.stop()
+    if task is not None:
+        task.cancel()
+
 # Initializing the API
 app = FastAPI(
     title="VECTOR",
-    description="Product Search Agent")
+    description="Product Search Agent",
+    lifespan=lifespan)
+
+requests_in_flight = metrics.registry.gauge(
+    "vector_requests_in_flight", "Requests currently being served", ["endpoint"])
+requests_total = metrics.registry.counter(
+    "vector_requests_total", "Requests served", ["endpoint", "status"])
+request_duration = metrics.registry.histogram(
+    "vector_request_duration_seconds", "End-to-end request latency", ["endpoint"])
+upstream_requests = metrics.registry.counter(
+    "vector_upstream_requests_total", "Requests sent through the shared HTTP pool", ["host"])
+
+register_cache("response", lambda: response_cache.stats())
+register_cache("exa", lambda: exa_cache.stats())
+register_cache("specs", lambda: specs_cache.stats())
+register_cache("catalog", lambda: catalog.stats())
+
+def _collect_upstream():
+    for host, stats in pool_stats()["hosts"].items():
+        upstream_requests.set(stats["requests"], host=host)
+metrics.registry.add_collector(_collect_upstream)
+
+jobs_by_status = metrics.registry.gauge("vector_jobs", "Stored jobs", ["status", "priority"])
+
+def _collect_jobs():
+    counts = jobs.store.counts()
+    # Every combination is set, so a status that emptied out drops to 0 instead of keeping its last value
+    for status in ("queued", "running", "done", "failed"):
+        for priority in PRIORITIES:
+            jobs_by_status.set(counts.get((status, priority), 0), status=status, priority=priority)
+metrics.registry.add_collector(_collect_jobs)
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    # Only the search endpoints; monitoring scrapes would drown them out. For /USER/stream this
+    # times the response headers only, the run itself shows up in vector_graph_run_duration_seconds
+    if not request.url.path.startswith("/USER"):
+        return await call_next(request)
+    endpoint = request.url.path
+    requests_in_flight.inc(endpoint=endpoint)
+    started = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        requests_in_flight.dec(endpoint=endpoint)
+        requests_total.inc(endpoint=endpoint, status=status)
+        request_duration.observe(time.perf_counter() - started, endpoint=endpoint)
 
 # defining the type of input
 class InputQuery(BaseModel):
     user : str
     currency: str = "USD"
+    # "react": sequential tool-calling loop, "fanout": planned queries searched in parallel
+    search_mode: Literal["react", "fanout"] = os.getenv("SEARCH_MODE", "react")
+    # Latency budget; the response comes back by then with whatever exists, flagged as degraded
+    deadline_ms: Optional[int] = int(_default_deadline) if _default_deadline else None
+    # Per-node model overrides, e.g. {"specs_agent": "groq:openai/gpt-oss-20b@0"}
+    models: Optional[Dict[str, str]] = None
+    # Record a span tree of the run and return it as `trace` (traced requests skip the response cache)
+    trace: bool = False
+    # Later requests with the same session_id are follow-ups ("cheaper", "only Lenovo") that reuse
+    # the session's specs and products; new_search starts the session over
+    session_id: Optional[str] = None
+    new_search: bool = False
 
-@app.post("/USER", tags=["User Input"])
-def user_query(state: InputQuery):
-    initial_state = {
+    @field_validator("models")
+    @classmethod
+    def _check_models(cls, models):
+        return registry.validate_overrides(models)
+
+class JobRequest(InputQuery):
+    # Queued interactive jobs start before queued bulk jobs
+    priority: Literal["interactive", "bulk"] = "interactive"
+
+class BatchQuery(BaseModel):
+    queries: List[InputQuery] = Field(min_length=1, max_length=BATCH_MAX_QUERIES)
+    # Graph runs in flight at once for this batch (default BATCH_CONCURRENCY)
+    concurrency: Optional[int] = Field(default=None, ge=1, le=BATCH_MAX_CONCURRENCY)
+
+# Wall-clock time of the search stage per mode, so the two can be compared
+search_timings = {
+    mode: {"runs": 0, "total_seconds": 0.0} for mode in ("react", "fanout")
+}
+
+def _initial_state(state: InputQuery):
+    return {
         "user_query": state.user,
         "currency": state.currency,
+        "search_mode": state.search_mode,
+        "deadline_at": deadline_from_ms(state.deadline_ms),
+        "models": state.models or {},
         # optional; only if your search_agent uses it
         "messages": [],
     }
-    response = graph.invoke(initial_state)
-    return {
+
+# One run at a time per session; entries go away with the last request holding them
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def _session_lock(session_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    return lock
+
+async def _session_input(state: InputQuery) -> dict:
+    """Graph input for a session request: a follow-up to the last turn, or a fresh start"""
+    initial_state = _initial_state(state)
+    previous = (await session_graph.aget_state({"configurable": {"thread_id": state.session_id}})).values
+    per_request = {"degraded": [], "search_seconds": None, "refinement": None}
+    if previous.get("product_specs") is None or state.new_search or previous.get("currency") != state.currency:
+        # Outputs of earlier turns would otherwise carry over into this run
+        return {**initial_state, **search_reset(), **per_request,
+                "product_specs": None, "final_recommendation": None, "follow_up": None}
+    # The query stays the session's; the new text goes through the refine node
+    initial_state.pop("user_query")
+    return {**initial_state, **per_request, "follow_up": state.user}
+
+def _result(
+    initial_state, response, reasons, usage: LLMUsageTracker,
+    tracer: Optional[TraceRecorder] = None, session_id: Optional[str] = None,
+) -> dict:
+    """The /USER payload for a run's final (or, past the deadline, latest) state; also the stream's `done`"""
+    reasons = list(dict.fromkeys([*(response.get("degraded") or []), *reasons]))
+
+    search_seconds = response.get("search_seconds")
+    if search_seconds is not None:
+        timing = search_timings[initial_state["search_mode"]]
+        timing["runs"] += 1
+        timing["total_seconds"] += search_seconds
+    result = {
         "product_list": response.get("product_list"),
         "final_recommendation": response.get("final_recommendation"),
-    }
\ No newline at end of file
+        "search_mode": initial_state["search_mode"],
+        "search_seconds": search_seconds,
+        "degraded": bool(reasons),
+        "degraded_reasons": reasons,
+        "llm_usage": usage.report(),
+        "cached": False,
+    }
+    if session_id is not None:
+        result["session_id"] = session_id
+        result["refinement"] = response.get("refinement")
+    if tracer:
+        result["trace"] = tracer.export()
+        trace_store.put(result["trace"])
+    return result
+
+async def _run_graph(initial_state, tracer: Optional[TraceRecorder] = None, session_id: Optional[str] = None):
+    response = dict(initial_state)
+    reasons = []
+    usage = LLMUsageTracker()
+    config = {"callbacks": [usage] + ([tracer] if tracer else [])}
+    if session_id is not None:
+        config["configurable"] = {"thread_id": session_id}
+    deadline_at = initial_state.get("deadline_at")
+    timeout = None if deadline_at is None else max(0.0, deadline_at - time.time() - RESPONSE_MARGIN_SECONDS)
+    try:
+        # Streaming values keeps the latest state around, so a timeout still has partial results
+        async with asyncio.timeout(timeout):
+            runner = graph if session_id is None else session_graph
+            async for values in runner.astream(initial_state, config, stream_mode="values"):
+                response = values
+                if tracer:
+                    tracer.record_superstep(values)
+    except TimeoutError:
+        reasons.append("deadline_exceeded")
+    return _result(initial_state, response, reasons, usage, tracer, session_id)
+
+def _cache_key(state: InputQuery):
+    # Requests with different budgets must not share one (possibly degraded) run
+    return response_cache.make_key(
+        state.user, state.currency, state.search_mode, state.deadline_ms, tuple(sorted((state.models or {}).items()))
+    )
+
+async def answer(state: InputQuery) -> Tuple[dict, str]:
+    """The /USER result for `state` and its X-Cache status"""
+    tracer = TraceRecorder() if state.trace else None
+    if state.session_id:
+        # A follow-up's answer depends on the session's earlier turns, so it can't come from the cache
+        async with _session_lock(state.session_id):
+            return await _run_graph(await _session_input(state), tracer, state.session_id), "BYPASS"
+    initial_state = _initial_state(state)
+    if tracer:
+        # A trace of a cached answer would be useless for debugging a slow query
+        return await _run_graph(initial_state, tracer), "BYPASS"
+    result, cache_status = await response_cache.get(_cache_key(state), lambda: _run_graph(initial_state))
+    if cache_status != MISS:
+        # The answer is reused, its cost isn't: this request made no LLM calls and no search
+        result = {**result, "llm_usage": {}, "search_seconds": None, "cached": True}
+    return result, cache_status
+
+def batch_key(state: InputQuery):
+    """Batch items with the same key share one run"""
+    return _cache_key(state), state.trace, state.session_id, state.new_search
+
+@app.post("/USER", tags=["User Input"])
+async def user_query(state: InputQuery, response: Response):
+    result, cache_status = await answer(state)
+    response.headers["X-Cache"] = cache_status
+    return result
+
+async def _run_job(request: dict) -> Tuple[dict, str]:
+    result, cache_status = await answer(InputQuery(**request))
+    return jsonable_encoder(result), cache_status
+
+jobs = JobQueue(JobStore(JOBS_DB_PATH), _run_job)
+
+@app.post("/USER/batch", tags=["User Input"])
+async def user_query_batch(batch: BatchQuery):
+    """Runs many queries with bounded concurrency; one JSON line per query, in the order they finish"""
+    async def lines():
+        async for record in run_batch(batch.queries, batch_key, answer, batch.concurrency or BATCH_CONCURRENCY):
+            yield json_line({"user": batch.queries[record["index"]].user, **record})
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+@app.post("/USER/stream", tags=["User Input"])
+async def user_query_stream(state: InputQuery):
+    """Same as /USER, but streams node progress and partial results as server-sent events"""
+    async def events():
+        tracer = TraceRecorder() if state.trace else None
+        initial_state = _initial_state(state)
+        # Same bound as /USER: the run is cut off and `done` sent with partial results by the deadline
+        deadline_at = initial_state["deadline_at"]
+        if deadline_at is not None:
+            deadline_at -= RESPONSE_MARGIN_SECONDS
+        usage = LLMUsageTracker()
+        if state.session_id is None:
+            done = lambda values, reasons: _result(initial_state, values, reasons, usage, tracer)
+            async for event in stream_graph_events(graph, initial_state, done, usage, tracer, deadline_at=deadline_at):
+                yield event
+            return
+        async with _session_lock(state.session_id):
+            session_input = await _session_input(state)
+            done = lambda values, reasons: _result(session_input, values, reasons, usage, tracer, state.session_id)
+            async for event in stream_graph_events(
+                session_graph, session_input, done, usage, tracer,
+                thread_id=state.session_id, deadline_at=deadline_at,
+            ):
+                yield event
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/jobs", tags=["Jobs"], status_code=202)
+async def submit_job(request: JobRequest):
+    """Queues a /USER run and returns its job id; poll GET /jobs/{job_id}, then fetch /jobs/{job_id}/result"""
+    return await jobs.submit(request.model_dump(exclude={"priority"}), request.priority)
+
+@app.get("/jobs/stats", tags=["Monitoring"])
+async def job_stats():
+    """Workers, running and queued jobs per priority, and stored jobs per status"""
+    return await jobs.stats()
+
+@app.get("/jobs/{job_id}", tags=["Jobs"])
+async def job_status(job_id: str):
+    """Status, queue position and timestamps of a job"""
+    job = await jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown id or past retention)")
+    return job
+
+@app.get("/jobs/{job_id}/result", tags=["Jobs"])
+async def job_result(job_id: str, response: Response):
+    """The /USER response of a finished job; 409 while it is queued or running, or if it failed"""
+    job = await jobs.result(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown id or past retention)")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}" + (f": {job['error']}" if job["error"] else ""))
+    response.headers["X-Cache"] = job["cache"] or "MISS"
+    return job["result"]
+
+@app.get("/trace/{trace_id}", tags=["Monitoring"])
+def get_trace(trace_id: str):
+    """A recent trace recorded by a `"trace": true` request"""
+    trace = trace_store.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found (unknown id or evicted)")
+    return trace
+
+@app.get("/metrics", tags=["Monitoring"])
+def prometheus_metrics():
+    """Prometheus text exposition of node latencies, LLM tokens, Exa calls, caches and in-flight requests"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/cache/stats", tags=["Monitoring"])
+def cache_stats():
+    """Hit / miss / eviction counters for sizing the caches"""
+    return {
+        "response": response_cache.stats(),
+        "exa": exa_cache.stats(),
+        "specs": specs_cache.stats(),
+        "catalog": catalog.stats(),
+        "spec_parser": spec_parser_stats,
+        "cassette": cassette.stats(),
+    }
+
+@app.get("/search/stats", tags=["Monitoring"])
+def search_stats():
+    """Average wall-clock time of the search stage, per search mode, duplicate search results collapsed per stage and failed fan-out searches"""
+    return {
+        **{
+            mode: {
+                **timing,
+                "avg_seconds": round(timing["total_seconds"] / timing["runs"], 3) if timing["runs"] else None,
+            }
+            for mode, timing in search_timings.items()
+        },
+        "dedupe": dedupe_stats,
+        "fanout": fanout_stats,
+    }
+
+@app.get("/llm/stats", tags=["Monitoring"])
+def llm_stats():
+    """LLM calls, latency and tokens per node and model, the current node -> model mapping and the models requests may pick"""
+    return {
+        "models": {node: spec.label for node, spec in registry.node_models.items()},
+        "allowed_models": list(registry.allowed_models),
+        "usage": summarize(llm_usage_stats),
+    }
+
+@app.get("/http/stats", tags=["Monitoring"])
+def http_stats():
+    """Shared connection pool: open / idle connections, reuse and per-host queuing"""
+    return pool_stats()
+
+@app.get("/startup/stats", tags=["Monitoring"])
+def startup_stats():
+    """Import, graph build and warm-up timings of this process, and any configuration errors"""
+    return startup_report
+
+startup_report["import_seconds"] = round(time.perf_counter() - _import_started, 3)
@@ -0,0 +1,120 @@
+# stream.py
+"""
+Server-sent-events helpers for streaming graph progress to the frontend.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from langchain_core.messages import AIMessage, ToolMessage
+from src.llm.usage import LLMUsageTracker
+from src.monitoring.trace import TraceRecorder
+
+
+def _to_jsonable(value: Any) -> Any:
+    """Pydantic models (Product, Recommendation) are dumped, everything else is passed through"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return value
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one SSE frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _node_name(namespace: tuple) -> list:
+    # Subgraph namespaces look like ("search_agent:<task id>",)
+    return [part.split(":", 1)[0] for part in namespace]
+
+
+async def stream_graph_events(
+    graph, initial_state, result: Callable[[Dict[str, Any], List[str]], Dict[str, Any]],
+    usage: Optional[LLMUsageTracker] = None, tracer: Optional[TraceRecorder] = None,
+    thread_id: Optional[str] = None, deadline_at: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """
+    Run the graph with `astream` and translate every node update into SSE frames.
+
+    Events emitted:
+    - node: a node finished (router, specs_agent, catalog_search, search_agent, tools, product_list, extract_and_recommend, comb_results)
+    - specs: the extracted ProductSpecs
+    - tool_call / tool_result: each Exa search issued by the search agent
+    - products: the structured Product list
+    - recommendation: the final Recommendation
+    - done: `result(final state, degraded reasons seen)`, the same payload /USER returns
+    - error: the run failed; no further events follow
+
+    `thread_id` is required by (and only used with) a checkpointed graph. When the run is still
+    going at `deadline_at` (a time.time() timestamp) it is cancelled and `done` is sent with what
+    has arrived so far and `deadline_exceeded` among the degraded reasons.
+    """
+    sent = set()
+    state = dict(initial_state)
+    reasons = []
+
+    try:
+        config = {"callbacks": [c for c in (usage, tracer) if c is not None]}
+        if thread_id is not None:
+            config["configurable"] = {"thread_id": thread_id}
+        # The full state after each superstep makes up `done` (and, for a trace, its size)
+        chunks = graph.astream(initial_state, config, stream_mode=["updates", "values"], subgraphs=True)
+        while True:
+            # Bounded per chunk rather than around the loop, whose yields hand control to the client
+            timeout = None if deadline_at is None else max(0.0, deadline_at - time.time())
+            try:
+                namespace, mode, chunk = await asyncio.wait_for(anext(chunks), timeout)
+            except StopAsyncIteration:
+                break
+            except TimeoutError:
+                await chunks.aclose()
+                reasons.append("deadline_exceeded")
+                break
+            if mode == "values":
+                if not namespace:
+                    state = chunk
+                    if tracer:
+                        tracer.record_superstep(chunk)
+                continue
+            for node, update in chunk.items():
+                yield sse_event("node", {"node": node, "path": _node_name(namespace) + [node]})
+                if not isinstance(update, dict):
+                    continue
+                reasons.extend(r for r in update.get("degraded") or [] if r not in reasons)
+
+                if update.get("product_specs") and "specs" not in sent:
+                    sent.add("specs")
+                    yield sse_event("specs", {"product_specs": _to_jsonable(update["product_specs"])})
+
+                # Fan-out mode plans all its searches up front
+                for query in update.get("search_queries") or []:
+                    if f"query:{query}" in sent:
+                        continue
+                    sent.add(f"query:{query}")
+                    yield sse_event("tool_call", {"id": None, "name": "exa_search", "args": {"query": query}})
+
+                # Only the newest message of a search turn / tool turn is new
+                messages = update.get("messages") or []
+                last = messages[-1] if messages else None
+                if isinstance(last, AIMessage) and node == "search_agent":
+                    for call in last.tool_calls:
+                        yield sse_event("tool_call", {"id": call.get("id"), "name": call.get("name"), "args": call.get("args")})
+                # Nodes that return the whole state repeat earlier (possibly earlier-turn) tool results
+                for msg in messages if node == "tools" else ():
+                    if isinstance(msg, ToolMessage) and msg.tool_call_id not in sent:
+                        sent.add(msg.tool_call_id)
+                        yield sse_event("tool_result", {"id": msg.tool_call_id, "name": msg.name, "chars": len(str(msg.content))})
+
+                if update.get("product_list") is not None and "products" not in sent:
+                    sent.add("products")
+                    yield sse_event("products", {"product_list": _to_jsonable(update["product_list"])})
+
+                if update.get("final_recommendation") is not None and "recommendation" not in sent:
+                    sent.add("recommendation")
+                    yield sse_event("recommendation", {"final_recommendation": _to_jsonable(update["final_recommendation"])})
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
+        return
+
+    yield sse_event("done", {key: _to_jsonable(value) for key, value in result(state, reasons).items()})
@@ -0,0 +1,114 @@
+# warmup.py
+"""
+Start-up warm-up and cold-start report.
+
+Provider clients are built lazily, so without this the first request pays for SDK imports,
+client construction and TLS handshakes. `warm_up` does that work in the background right after
+start-up: it checks the configuration, builds the clients and structured-output wrappers every
+node uses, and opens a connection to each provider. `startup_report` records how long each
+step took; it is served on GET /startup/stats.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List
+from src.llm import registry
+from src.graph.state import ProductSpecs, Product, Recommendation, SearchPlan, ProductsWithRecommendation
+from src.nodes.search_agent import tools as search_tools
+from src.tools.exa_tool import get_exa_client
+from src.net.cassette import cassette
+from src.net.http_pool import async_client
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", 10))
+
+# What each node asks the registry for
+NODE_RUNNABLES = {
+    "specs_agent": {"schema": ProductSpecs},
+    "search_agent": {"tools": search_tools},
+    "plan_searches": {"schema": SearchPlan},
+    "product_list": {"schema": Product},
+    "comb_results": {"schema": Recommendation},
+    "extract_and_recommend": {"schema": ProductsWithRecommendation},
+}
+
+API_KEYS = {"openai": "OPENAI_API_KEY", "groq": "GROQ_API_KEY", "exa": "EXA_API_KEY"}
+
+logger = logging.getLogger(__name__)
+
+startup_report: Dict = {
+    "import_seconds": None,
+    "graph_build_seconds": None,
+    "config_errors": [],
+    "warmup": {},
+    "ready_seconds": None,
+}
+
+
+def validate_config() -> List[str]:
+    """Missing API keys for the providers the configured models (and Exa) need"""
+    providers = {spec.provider for spec in registry.node_models.values()} | {"exa"}
+    return [f"{API_KEYS[p]} is not set" for p in sorted(providers) if not os.getenv(API_KEYS[p])]
+
+
+async def _open_connection(provider: str) -> None:
+    # Any authenticated, token-free request opens (and pools) the TLS connection and checks the key
+    if provider == "exa":
+        await get_exa_client().client.head("/")
+        return
+    if provider == "openai":
+        spec = next(spec for spec in registry.node_models.values() if spec.provider == provider)
+        await registry.chat_model(spec).root_async_client.models.list()
+    else:
+        # ChatGroq keeps no public handle on its SDK client; a client on the same shared pool does the job
+        from groq import AsyncGroq
+        await AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), http_client=async_client()).models.list()
+
+
+async def _step(name: str, fn) -> None:
+    started = time.perf_counter()
+    entry = startup_report["warmup"][name] = {"ok": False, "seconds": None}
+    try:
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await asyncio.wait_for(result, WARMUP_TIMEOUT_SECONDS)
+        entry["ok"] = True
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+        logger.warning("warm-up step %s failed: %s", name, entry["error"])
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+
+
+def _build_runnables() -> None:
+    failed = []
+    for node, kwargs in NODE_RUNNABLES.items():
+        try:
+            registry.llm_for(node, **kwargs)
+        except Exception as e:
+            failed.append(f"{node} ({type(e).__name__})")
+    if failed:
+        raise RuntimeError(f"could not build {', '.join(failed)}")
+
+
+async def warm_up(process_started: float) -> Dict:
+    """Runs every warm-up step; never raises, failures are logged and reported"""
+    if cassette.mode == "replay":
+        # Nothing to connect to, every provider call is served from the cassette
+        startup_report["ready_seconds"] = round(time.perf_counter() - process_started, 3)
+        return startup_report
+
+    startup_report["config_errors"] = validate_config()
+    for error in startup_report["config_errors"]:
+        logger.error("configuration: %s", error)
+
+    await _step("build_runnables", _build_runnables)
+    providers = sorted({spec.provider for spec in registry.node_models.values()} | {"exa"})
+    await asyncio.gather(*(
+        _step(f"connect_{p}", lambda p=p: _open_connection(p))
+        for p in providers if os.getenv(API_KEYS[p])
+    ))
+
+    startup_report["ready_seconds"] = round(time.perf_counter() - process_started, 3)
+    return startup_report
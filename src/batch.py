@@ -0,0 +1,68 @@
+# batch.py
+"""
+Batch research from the command line, the same as POST /USER/batch but in-process (no API server):
+
+    python -m src.batch queries.txt --concurrency 8 --output results.jsonl
+    cat queries.jsonl | python -m src.batch - --currency INR
+
+The input has one query per line, either plain text or a JSON object with /USER fields
+({"user": "...", "currency": "EUR", "search_mode": "fanout"}). Results are written as JSON Lines,
+one per query as it finishes; a summary goes to stderr at the end.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from src.api.batch import BATCH_CONCURRENCY, json_line, run_batch
+from src.api.main import InputQuery, answer, batch_key
+
+
+def read_queries(lines, defaults: dict) -> list:
+    queries = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        fields = json.loads(line) if line.startswith("{") else {"user": line}
+        queries.append(InputQuery(**{**defaults, **fields}))
+    return queries
+
+
+async def main(args) -> int:
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    with source:
+        defaults = {"currency": args.currency, **({"search_mode": args.search_mode} if args.search_mode else {})}
+        queries = read_queries(source, defaults)
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    started = time.perf_counter()
+    counts = {}
+    try:
+        async for record in run_batch(queries, batch_key, answer, args.concurrency):
+            output.write(json_line({"user": queries[record["index"]].user, **record}))
+            output.flush()
+            outcome = record.get("cache") or record["status"]
+            counts[outcome] = counts.get(outcome, 0) + 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"{len(queries)} queries in {time.perf_counter() - started:.1f}s: "
+          + ", ".join(f"{k}={v}" for k, v in sorted(counts.items())), file=sys.stderr)
+    return 1 if counts.get("error") else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="queries file, or - for stdin")
+    parser.add_argument("--output", default=None, help="JSON Lines results file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="graph runs in flight at once")
+    parser.add_argument("--currency", default="USD", help="currency for queries that don't set one")
+    parser.add_argument("--search-mode", choices=["react", "fanout"], default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
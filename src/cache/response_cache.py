@@ -0,0 +1,114 @@
+# response_cache.py
+"""
+Whole-response cache for the API with stale-while-revalidate semantics.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set, Tuple
+from src.cache.single_flight import SingleFlight
+
+# Values of the X-Cache response header
+HIT = "HIT"
+STALE = "STALE"
+MISS = "MISS"
+COALESCED = "COALESCED"
+
+
+class ResponseCache:
+    """
+    - Fresh for `ttl_seconds`: served as HIT.
+    - Then stale for another `stale_seconds`: served immediately as STALE while one background
+      task recomputes it.
+    - Older than that, or never seen: computed as MISS; identical concurrent requests join that
+      computation (COALESCED) instead of starting their own.
+
+    Only values for which `cacheable(value)` is true are stored, so empty / failed runs are retried.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        stale_seconds: float,
+        max_entries: int = 512,
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.cacheable = cacheable
+
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight = SingleFlight()
+        # Strong references so background revalidations aren't garbage collected mid-run
+        self._background: Set[asyncio.Task] = set()
+        self._counters = {HIT: 0, STALE: 0, MISS: 0, COALESCED: 0, "revalidations": 0, "evictions": 0, "errors": 0}
+
+    @staticmethod
+    def make_key(query: str, currency: str, *extra: Hashable) -> Tuple[Hashable, ...]:
+        return (" ".join(query.lower().split()), currency.upper(), *extra)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        if not self.cacheable(value):
+            return
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    async def _compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        async def compute_and_store():
+            value = await compute()
+            self._store(key, value)
+            return value
+
+        return await self._inflight.do(key, compute_and_store)
+
+    def _revalidate(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._inflight:
+            return
+
+        async def run():
+            try:
+                await self._compute(key, compute)
+            except Exception:
+                # The stale value keeps being served; the next request past the stale window retries
+                self._counters["errors"] += 1
+
+        self._counters["revalidations"] += 1
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """Returns (value, status) where status is one of HIT / STALE / MISS / COALESCED"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self._counters[HIT] += 1
+                return value, HIT
+            if age <= self.ttl_seconds + self.stale_seconds:
+                self._entries.move_to_end(key)
+                self._revalidate(key, compute)
+                self._counters[STALE] += 1
+                return value, STALE
+            del self._entries[key]
+
+        value, shared = await self._compute(key, compute)
+        status = COALESCED if shared else MISS
+        self._counters[status] += 1
+        return value, status
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._counters[HIT] + self._counters[STALE] + self._counters[MISS] + self._counters[COALESCED]
+        return {
+            **{k.lower(): v for k, v in self._counters.items()},
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_ratio": round((lookups - self._counters[MISS]) / lookups, 4) if lookups else 0.0,
+        }
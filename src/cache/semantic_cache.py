@@ -0,0 +1,227 @@
+# semantic_cache.py
+"""
+Near-duplicate query cache.
+
+Queries are embedded locally as hashed character n-gram TF-IDF vectors held in one
+NumPy matrix, so a lookup is a single matrix-vector product (no embedding service).
+"""
+
+import re
+import time
+import zlib
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+NGRAM_SIZES = (2, 3, 4)
+
+# "1.2L", "120000rs", "20k", "1,20,000" ... all normalized to plain numbers
+_NUMBER = re.compile(
+    r"(?<![\d.,])(\d+(?:[.,]\d+)*)(?!\d)\s*(?:(lakhs|lakh|lac|crore|cr|k|l)(?![a-z]))?",
+    re.IGNORECASE,
+)
+_MULTIPLIERS = {"k": 1e3, "l": 1e5, "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "cr": 1e7, "crore": 1e7}
+
+
+def numeric_signature(text: str) -> frozenset:
+    """
+    The numbers mentioned in a query (budgets, sizes, ...).
+
+    Two queries that only differ in their numbers ("under 50k" vs "under 80k") are
+    textually very similar but must not share specs, so lookups require equal signatures.
+    """
+    values = set()
+    for number, suffix in _NUMBER.findall(text):
+        try:
+            value = float(number.replace(",", ""))
+        except ValueError:
+            continue
+        value *= _MULTIPLIERS.get(suffix.lower(), 1) if suffix else 1
+        values.add(round(value, 2))
+    return frozenset(values)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class SemanticCache:
+    """
+    Maps a query to the value stored for the most similar previous query, when the
+    cosine similarity is at least `threshold`.
+
+    - `namespace` separates entries that must never be mixed (e.g. the currency).
+    - `signature`, if given, maps a query to what else two similar queries must agree on besides
+      their numbers (e.g. the brands and use cases they name).
+    - At most `max_entries` rows are kept; the least recently used row is overwritten when full.
+    - Entries older than `ttl_seconds` are ignored and recycled.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        threshold: float = 0.85,
+        max_entries: int = 1000,
+        ttl_seconds: float = 6 * 60 * 60,
+        dim: int = 4096,
+        signature: Optional[Callable[[str], Hashable]] = None,
+    ):
+        self.name = name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.dim = dim
+        self.signature = signature
+
+        # Raw (sublinear) term frequencies; IDF is applied at lookup time so it tracks the current contents
+        self._tf = np.zeros((max_entries, dim), dtype=np.float32)
+        self._df = np.zeros(dim, dtype=np.float32)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._index: Dict[tuple, int] = {}
+        self._counters = {
+            "lookups": 0,
+            "hits": 0,
+            "exact_hits": 0,
+            "misses": 0,
+            "numeric_mismatch": 0,
+            "signature_mismatch": 0,
+            "expired": 0,
+            "evictions": 0,
+        }
+
+    # ---- Vectorization ----
+    def _vectorize(self, text: str) -> np.ndarray:
+        text = f" {_normalize(text)} "
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for n in NGRAM_SIZES:
+            for i in range(len(text) - n + 1):
+                # crc32 rather than hash() so buckets are stable across processes
+                vec[zlib.crc32(text[i:i + n].encode()) % self.dim] += 1.0
+        np.log1p(vec, out=vec)
+        return vec
+
+    def _idf(self) -> np.ndarray:
+        n = len(self._index)
+        return np.log((1.0 + n) / (1.0 + self._df)) + 1.0
+
+    # ---- Row management ----
+    def _release(self, row: int) -> None:
+        entry = self._entries[row]
+        if entry is None:
+            return
+        self._df -= self._tf[row] > 0
+        self._tf[row] = 0.0
+        self._index.pop((entry["namespace"], entry["query"]), None)
+        self._entries[row] = None
+
+    def _free_row(self) -> int:
+        for row, entry in enumerate(self._entries):
+            if entry is None:
+                return row
+        row = min(range(self.max_entries), key=lambda r: self._entries[r]["last_used"])
+        self._release(row)
+        self._counters["evictions"] += 1
+        return row
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry["created_at"] > self.ttl_seconds
+
+    # ---- Public API ----
+    def lookup(self, query: str, namespace: str = "") -> Optional[Dict[str, Any]]:
+        """Returns the stored value (plus `similarity` and `matched_query`), or None"""
+        self._counters["lookups"] += 1
+        now = time.time()
+        query = _normalize(query)
+
+        row = self._index.get((namespace, query))
+        if row is not None:
+            entry = self._entries[row]
+            if not self._expired(entry, now):
+                entry["last_used"] = now
+                self._counters["hits"] += 1
+                self._counters["exact_hits"] += 1
+                return {**entry["value"], "similarity": 1.0, "matched_query": entry["query"]}
+
+        if not self._index:
+            self._counters["misses"] += 1
+            return None
+
+        idf = self._idf()
+        q = self._vectorize(query) * idf
+        q_norm = np.linalg.norm(q)
+        if q_norm == 0:
+            self._counters["misses"] += 1
+            return None
+
+        # Only occupied rows take part in the product
+        rows = np.fromiter(self._index.values(), dtype=np.intp, count=len(self._index))
+        matrix = self._tf[rows] * idf
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        sims = (matrix @ q) / (norms * q_norm)
+
+        signature = numeric_signature(query)
+        extra = self.signature(query) if self.signature is not None else None
+        for i in np.argsort(-sims):
+            if sims[i] < self.threshold:
+                break
+            row = rows[i]
+            entry = self._entries[row]
+            if entry is None or entry["namespace"] != namespace:
+                continue
+            if self._expired(entry, now):
+                self._release(row)
+                self._counters["expired"] += 1
+                continue
+            if entry["signature"] != signature:
+                self._counters["numeric_mismatch"] += 1
+                continue
+            if entry["extra_signature"] != extra:
+                self._counters["signature_mismatch"] += 1
+                continue
+            entry["last_used"] = now
+            self._counters["hits"] += 1
+            return {**entry["value"], "similarity": float(sims[i]), "matched_query": entry["query"]}
+
+        self._counters["misses"] += 1
+        return None
+
+    def store(self, query: str, value: Dict[str, Any], namespace: str = "") -> None:
+        now = time.time()
+        query = _normalize(query)
+        row = self._index.get((namespace, query))
+        if row is not None:
+            self._release(row)
+        else:
+            row = self._free_row()
+
+        tf = self._vectorize(query)
+        self._tf[row] = tf
+        self._df += tf > 0
+        self._entries[row] = {
+            "query": query,
+            "namespace": namespace,
+            "signature": numeric_signature(query),
+            "extra_signature": self.signature(query) if self.signature is not None else None,
+            "value": dict(value),
+            "created_at": now,
+            "last_used": now,
+        }
+        self._index[(namespace, query)] = row
+
+    def update(self, query: str, namespace: str = "", **fields: Any) -> bool:
+        """Adds fields to the value stored for exactly this query; returns False if it is not cached"""
+        row = self._index.get((namespace, _normalize(query)))
+        if row is None:
+            return False
+        self._entries[row]["value"].update(fields)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._counters["lookups"]
+        return {
+            **self._counters,
+            "entries": len(self._index),
+            "threshold": self.threshold,
+            "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+        }
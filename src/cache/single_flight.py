@@ -0,0 +1,59 @@
+# single_flight.py
+"""
+Coalesces concurrent calls for the same key into one in-flight coroutine.
+
+The call runs as its own task, which every caller (the one that started it included) awaits
+through `asyncio.shield`. A caller that is cancelled or times out only stops waiting; the call
+itself is cancelled once no caller is left waiting for it.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    def _done(self, key: Hashable, flight: _Flight) -> None:
+        self._forget(key, flight)
+        # Mark retrieved so a failure nobody awaited any more doesn't log "exception was never retrieved"
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Runs `fn` unless a call for `key` is already in flight, in which case its result is awaited.
+        Returns (value, shared) where `shared` is True for callers that joined an existing call.
+        """
+        flight = self._inflight.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = self._inflight[key] = _Flight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda _, key=key, flight=flight: self._done(key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Nobody wants the result any more; later callers start a fresh call
+                self._forget(key, flight)
+                flight.task.cancel()
@@ -0,0 +1,232 @@
+# tiered_cache.py
+"""
+Two-tier (memory LRU + SQLite) TTL cache with single-flight de-duplication.
+
+`get_or_fetch` only touches the memory tier on the event loop; disk reads and writes run in a
+worker thread. A disk hit doesn't write: its access time is held back and written with the next
+disk write (or once `_TOUCH_BATCH` hits have piled up).
+"""
+
+import asyncio
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from src.cache.single_flight import SingleFlight
+
+# Pending access-time updates written in one go
+_TOUCH_BATCH = 64
+
+class TieredCache:
+    """
+    - Memory tier: an LRU of at most `max_memory_entries` items.
+    - Disk tier: a SQLite table of at most `max_disk_entries` items (least recently used is evicted first).
+      Pass `path=None` to run memory-only.
+    - Every entry expires `ttl_seconds` after it was stored, in both tiers.
+    - Concurrent `get_or_fetch` calls for the same key share one in-flight fetch.
+
+    Values are pickled for the disk tier, so the SQLite file must only ever be written by this process.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: Optional[str],
+        ttl_seconds: float,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 5000,
+    ):
+        self.name = name
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._inflight = SingleFlight()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # key -> last disk hit not yet written to `accessed_at`
+        self._touched: Dict[str, float] = {}
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "expired": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "errors": 0,
+        }
+
+    @staticmethod
+    def make_key(*parts: Hashable) -> str:
+        return json.dumps(parts, default=str)
+
+    # ---- Disk tier ----
+    def _db(self) -> Optional[sqlite3.Connection]:
+        # Opened lazily so that importing a module that owns a cache never touches the filesystem
+        if self.path is None:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed_at)")
+        return self._conn
+
+    def _disk_get(self, key: str, now: float) -> tuple[bool, Any]:
+        if self.path is None:
+            return False, None
+        # Under the lock: disk calls run in worker threads, and the first one opens the database
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            if row[1] <= now:
+                db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                db.commit()
+                self._counters["expired"] += 1
+                return False, None
+            self._touched[key] = now
+            if len(self._touched) >= _TOUCH_BATCH:
+                self._flush_touched(db)
+                db.commit()
+        return True, (row[1], pickle.loads(row[0]))
+
+    def _flush_touched(self, db: sqlite3.Connection) -> None:
+        # Called with the lock held; the caller commits
+        if self._touched:
+            db.executemany("UPDATE cache SET accessed_at = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def _disk_set(self, key: str, value: Any, expires_at: float, now: float) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, pickle.dumps(value), expires_at, now),
+            )
+            self._touched.pop(key, None)
+            self._flush_touched(db)
+            # Expired rows go first, then the least recently used ones beyond the size bound
+            db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            overflow = db.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_disk_entries
+            if overflow > 0:
+                db.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                self._counters["disk_evictions"] += overflow
+            db.commit()
+
+    # ---- Memory tier ----
+    def _memory_set(self, key: str, value: Any, expires_at: float) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def _memory_get(self, key: str, now: float) -> tuple[bool, Any]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return True, entry[1]
+            del self._memory[key]
+            self._counters["expired"] += 1
+        return False, None
+
+    # ---- Best-effort disk access ----
+    def _disk_lookup(self, key: str, now: float) -> tuple[bool, Any]:
+        try:
+            return self._disk_get(key, now)
+        except (sqlite3.Error, pickle.UnpicklingError):
+            self._counters["errors"] += 1
+            return False, None
+
+    def _disk_store(self, key: str, value: Any, expires_at: float, now: float) -> None:
+        try:
+            self._disk_set(key, value, expires_at, now)
+        except (sqlite3.Error, pickle.PicklingError):
+            # The disk tier is best-effort; the memory tier still serves the value
+            self._counters["errors"] += 1
+
+    def _disk_hit(self, key: str, entry: tuple[float, Any]) -> Any:
+        expires_at, value = entry
+        self._memory_set(key, value, expires_at)
+        self._counters["disk_hits"] += 1
+        return value
+
+    # ---- Public API ----
+    def get(self, key: str) -> tuple[bool, Any]:
+        """Returns (found, value) without fetching"""
+        now = time.time()
+        found, value = self._memory_get(key, now)
+        if found:
+            return True, value
+        found, entry = self._disk_lookup(key, now)
+        return (True, self._disk_hit(key, entry)) if found else (False, None)
+
+    async def aget(self, key: str) -> tuple[bool, Any]:
+        """`get` with the disk tier read off the event loop"""
+        now = time.time()
+        found, value = self._memory_get(key, now)
+        if found or self.path is None:
+            return found, value
+        found, entry = await asyncio.to_thread(self._disk_lookup, key, now)
+        return (True, self._disk_hit(key, entry)) if found else (False, None)
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        self._memory_set(key, value, expires_at)
+        self._disk_store(key, value, expires_at, now)
+
+    async def aset(self, key: str, value: Any) -> None:
+        """`set` with the disk tier written off the event loop"""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        self._memory_set(key, value, expires_at)
+        if self.path is not None:
+            await asyncio.to_thread(self._disk_store, key, value, expires_at, now)
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = await self.aget(key)
+        if found:
+            return value
+
+        async def fetch_and_store():
+            self._counters["misses"] += 1
+            value = await fetch()
+            await self.aset(key, value)
+            return value
+
+        value, shared = await self._inflight.do(key, fetch_and_store)
+        if shared:
+            self._counters["coalesced"] += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"] + self._counters["coalesced"]
+        hits = lookups - self._counters["misses"]
+        return {
+            **self._counters,
+            "memory_entries": len(self._memory),
+            "inflight": len(self._inflight),
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
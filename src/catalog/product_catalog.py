@@ -0,0 +1,259 @@
+# product_catalog.py
+"""
+Persistent local product catalog.
+
+Every product list the search stage extracts is upserted here, keyed by canonical URL and
+stamped with when it was last seen. Before searching, the graph asks the catalog for fresh
+products matching the specs (category, price range, brands) and their use cases / requirements,
+either as keywords (FTS5 index) or semantically (vector index over the same text), and only runs
+the Exa search when it has fewer than `CATALOG_MIN_CANDIDATES`.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from src.catalog.urls import canonical_url
+from src.catalog.vector_index import VectorIndex
+from src.graph.state import Product_info, ProductSpecs
+from src.net.cassette import CASSETTE_MODE
+from src.nodes.spec_rules import BRAND_LEXICON, brand_of, normalize_category
+
+# Off under a cassette: products served from the catalog would skip searches the cassette has to capture
+CATALOG_ENABLED = os.getenv("CATALOG_ENABLED", "true").lower() == "true" and CASSETTE_MODE == "off"
+CATALOG_PATH = os.getenv("CATALOG_PATH", ".cache/catalog.sqlite") or None
+# Prices and availability drift, so products last seen longer ago than this aren't served
+CATALOG_FRESH_SECONDS = float(os.getenv("CATALOG_FRESH_SECONDS", 24 * 60 * 60))
+CATALOG_MIN_CANDIDATES = int(os.getenv("CATALOG_MIN_CANDIDATES", 5))
+CATALOG_MAX_RESULTS = int(os.getenv("CATALOG_MAX_RESULTS", 5))
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", ".cache/catalog_vectors") or None
+# Cosine similarity from which a product counts as matching a use case / requirement
+VECTOR_MIN_SIMILARITY = float(os.getenv("VECTOR_MIN_SIMILARITY", 0.25))
+VECTOR_SEARCH_K = int(os.getenv("VECTOR_SEARCH_K", 50))
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS products ("
+    " id INTEGER PRIMARY KEY, url TEXT NOT NULL UNIQUE, name TEXT NOT NULL, category TEXT NOT NULL,"
+    " brand TEXT, price REAL, currency TEXT, rating REAL, rating_count INTEGER,"
+    " tags TEXT NOT NULL DEFAULT '[]', record TEXT NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS products_lookup ON products(category, currency, updated_at)",
+    # rowid = products.id; `tags` are the use cases / requirements of the queries that found the product
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(name, description, tags, tokenize='porter unicode61')",
+)
+
+
+def _fts_query(terms: Iterable[str]) -> Optional[str]:
+    """FTS5 query matching any of `terms` as a phrase"""
+    phrases = ['"' + term.replace('"', '""') + '"' for term in dict.fromkeys(t.strip().lower() for t in terms) if term]
+    return " OR ".join(phrases) or None
+
+
+def _brand_filter(preferences: List[str]) -> Optional[Tuple[List[str], str]]:
+    """
+    (lowercased canonical brands, FTS5 query for any of their aliases in the name) for brand
+    preferences as the LLM writes them ("ASUS", "dell"); the name match covers brands the lexicon
+    doesn't know, whose products are stored without a brand
+    """
+    canonical = list(dict.fromkeys(brand_of(b) or b.strip() for b in preferences if b.strip()))
+    if not canonical:
+        return None
+    aliases = [a for brand in canonical for a in BRAND_LEXICON if BRAND_LEXICON[a] == brand] + canonical
+    return [b.lower() for b in canonical], f"name : ({_fts_query(aliases)})"
+
+
+def _description(product: Product_info) -> str:
+    review = product.review or {}
+    return " ".join([product.snippet or "", *review.get("pros", []), *review.get("cons", [])])
+
+
+def _document(product: Product_info, tags: List[str]) -> str:
+    """The text a product is embedded from"""
+    return " ".join([product.name, _description(product), *tags])
+
+
+class ProductCatalog:
+    """Pass `path=None` to keep the catalog in memory (nothing survives a restart)."""
+
+    def __init__(
+        self,
+        path: Optional[str],
+        fresh_seconds: float = CATALOG_FRESH_SECONDS,
+        min_candidates: int = CATALOG_MIN_CANDIDATES,
+        max_results: int = CATALOG_MAX_RESULTS,
+        index: Optional[VectorIndex] = None,
+    ):
+        self.path = path
+        self.fresh_seconds = fresh_seconds
+        self.min_candidates = min_candidates
+        self.max_results = max(max_results, min_candidates)
+        self.index = index
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._counters = {"lookups": 0, "served": 0, "too_few": 0, "upserts": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened lazily so that importing the graph never touches the filesystem
+        if self._conn is None:
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False)
+            if self.path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+            self._conn.commit()
+            if self.index is not None:
+                self._sync_index()
+        return self._conn
+
+    def _sync_index(self) -> None:
+        """Indexes products the vector index is missing (e.g. it was deleted) and drops ones it shouldn't have"""
+        indexed = set(self.index.keys())
+        rows = self._conn.execute("SELECT id, tags, record FROM products").fetchall()
+        missing = [
+            (rowid, _document(Product_info.model_validate_json(record), json.loads(tags)))
+            for rowid, tags, record in rows if rowid not in indexed
+        ]
+        if missing:
+            logger.info("indexing %d catalog products", len(missing))
+            self.index.add(missing)
+        self.index.remove(indexed - {row[0] for row in rows})
+
+    def upsert(self, products: Iterable[Product_info], specs: ProductSpecs, currency: str) -> int:
+        """Adds or refreshes `products`, found for `specs`; returns how many were written"""
+        category = normalize_category(specs.get("category") or "")
+        if not category:
+            return 0
+        query_tags = [*(specs.get("use_cases") or []), *(specs.get("key_requirements") or [])]
+        now = time.time()
+        written = 0
+        documents = []
+        with self._lock:
+            db = self._db()
+            for product in products:
+                if not product.url or not product.name:
+                    continue
+                url = canonical_url(product.url)
+                row = db.execute("SELECT id, tags, record FROM products WHERE url = ?", (url,)).fetchone()
+                tags = list(dict.fromkeys((json.loads(row[1]) if row else []) + query_tags))
+                document = _document(product, tags)
+                values = (
+                    product.name, category, brand_of(product.name), product.price, product.currency or currency,
+                    product.rating, product.rating_count, json.dumps(tags), product.model_dump_json(), now,
+                )
+                if row:
+                    rowid = row[0]
+                    db.execute(
+                        "UPDATE products SET name = ?, category = ?, brand = ?, price = ?, currency = ?, rating = ?,"
+                        " rating_count = ?, tags = ?, record = ?, updated_at = ? WHERE id = ?",
+                        (*values, rowid),
+                    )
+                    db.execute("DELETE FROM products_fts WHERE rowid = ?", (rowid,))
+                    if document == _document(Product_info.model_validate_json(row[2]), json.loads(row[1])):
+                        # Seen again unchanged: only the freshness moves, the embedding stays
+                        document = None
+                else:
+                    rowid = db.execute(
+                        "INSERT INTO products (name, category, brand, price, currency, rating, rating_count, tags,"
+                        " record, updated_at, url) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (*values, url),
+                    ).lastrowid
+                db.execute(
+                    "INSERT INTO products_fts (rowid, name, description, tags) VALUES (?, ?, ?, ?)",
+                    (rowid, product.name, _description(product), " ".join(tags)),
+                )
+                if document is not None:
+                    documents.append((rowid, document))
+                written += 1
+            db.commit()
+        if self.index is not None:
+            self.index.add(documents)
+        self._counters["upserts"] += written
+        return written
+
+    def _semantic_matches(self, terms: List[str]) -> Dict[int, float]:
+        """Catalog id -> best cosine similarity to any of `terms`, for products similar enough to one"""
+        if self.index is None or not terms:
+            return {}
+        matches: Dict[int, float] = {}
+        for hits in self.index.search(terms, k=VECTOR_SEARCH_K, min_score=VECTOR_MIN_SIMILARITY):
+            for rowid, score in hits:
+                matches[rowid] = max(score, matches.get(rowid, 0.0))
+        return matches
+
+    def search(self, specs: ProductSpecs, currency: str) -> List[Product_info]:
+        """
+        Fresh products in the specs' category, currency and price range, from the preferred brands
+        (if any) and none of the excluded ones, matching at least one use case / requirement (if any)
+        by keyword or semantically, best matches first.
+        """
+        clauses = ["p.category = ?", "p.currency = ?", "p.updated_at >= ?"]
+        params: List[Any] = [normalize_category(specs.get("category") or ""), currency, time.time() - self.fresh_seconds]
+        if specs.get("min_price") is not None:
+            clauses.append("p.price >= ?")
+            params.append(specs["min_price"])
+        if specs.get("max_price") is not None:
+            clauses.append("p.price <= ?")
+            params.append(specs["max_price"])
+        for field, negate in (("brand_preferences", ""), ("excluded_brands", "NOT ")):
+            brands = _brand_filter(specs.get(field) or [])
+            if brands:
+                canonical, names = brands
+                clauses.append(
+                    f"{negate}(COALESCE(lower(p.brand), '') IN ({', '.join('?' * len(canonical))})"
+                    " OR p.id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?))"
+                )
+                params.extend([*canonical, names])
+
+        terms = [*(specs.get("use_cases") or []), *(specs.get("key_requirements") or [])]
+        match = _fts_query(terms)
+        self._counters["lookups"] += 1
+        with self._lock:
+            db = self._db()
+            semantic = self._semantic_matches(terms)
+            keyword_column = "0"
+            if match:
+                keyword_column = "p.id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)"
+                params.insert(0, match)
+                clauses.append(f"(keyword OR p.id IN ({', '.join('?' * len(semantic))}))")
+                params.extend(semantic)
+            rows = db.execute(
+                f"SELECT p.id, p.record, {keyword_column} AS keyword, COALESCE(p.rating * p.rating_count, 0)"
+                f" FROM products p WHERE {' AND '.join(clauses)}",
+                params,
+            ).fetchall()
+
+        # Keyword matches first, then semantic similarity, then well-rated products with many ratings
+        rows.sort(key=lambda row: (row[2] + semantic.get(row[0], 0.0), row[3]), reverse=True)
+        products = [Product_info.model_validate_json(row[1]) for row in rows[:self.max_results]]
+        if len(products) < self.min_candidates:
+            self._counters["too_few"] += 1
+            return []
+        self._counters["served"] += 1
+        # Products found by different searches may share ids; the recommendation refers to them by id
+        if len({p.id for p in products}) < len(products):
+            products = [p.model_copy(update={"id": str(i)}) for i, p in enumerate(products, start=1)]
+        return products
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, fresh = self._db().execute(
+                "SELECT COUNT(*), COUNT(CASE WHEN updated_at >= ? THEN 1 END) FROM products",
+                (time.time() - self.fresh_seconds,),
+            ).fetchone()
+        lookups = self._counters["lookups"]
+        return {
+            **self._counters,
+            "entries": entries,
+            "fresh_entries": fresh,
+            "hit_ratio": round(self._counters["served"] / lookups, 4) if lookups else 0.0,
+            "vector_index": self.index.stats() if self.index is not None else None,
+        }
+
+
+catalog = ProductCatalog(CATALOG_PATH, index=VectorIndex(VECTOR_INDEX_PATH))
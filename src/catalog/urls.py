@@ -0,0 +1,56 @@
+# urls.py
+"""
+Canonical product URLs, so the same product page found through different links maps to one key.
+"""
+
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a click came from
+_TRACKING_PREFIXES = ("utm_", "pd_rd_", "pf_rd_", "_encoding")
+_TRACKING_PARAMS = {
+    "gclid", "gclsrc", "dclid", "fbclid", "msclkid", "yclid", "srsltid", "ref", "ref_", "ref_src", "tag",
+    "affid", "affiliate", "affExtParam1", "affExtParam2", "psc", "qid", "sr", "spm", "crid", "sprefix",
+    "keywords", "th", "lid", "marketplace", "store", "otracker", "fm", "iid", "ppt", "ppn", "ssid",
+}
+_TRACKING_PARAMS = {name.lower() for name in _TRACKING_PARAMS}
+# Mobile / AMP hosts serve the same pages as the desktop site
+_HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+# Amazon product pages: /<slug>/dp/<ASIN>/ref=..., /gp/product/<ASIN>, /gp/aw/d/<ASIN>
+_AMAZON_ASIN = re.compile(r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})(?:[/?]|$)", re.IGNORECASE)
+# Trailing "/ref=sr_1_3" path segments
+_REF_SEGMENT = re.compile(r"/ref=[^/]*$")
+
+
+def _tracking(name: str) -> bool:
+    name = name.lower()
+    return name in _TRACKING_PARAMS or name.startswith(_TRACKING_PREFIXES)
+
+
+def canonical_host(host: str) -> str:
+    """"M.Flipkart.com:443" -> "flipkart.com" """
+    host = host.lower().rsplit("@", 1)[-1]
+    host = re.sub(r":(80|443)$", "", host)
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1:
+            host = host[len(prefix):]
+    return host
+
+
+def canonical_url(url: str) -> str:
+    """
+    https, canonical host (no "www." / mobile prefix, no default port), no fragment, no tracking
+    parameters, remaining parameters sorted and no trailing slash:
+    "http://m.Shop.com/p/1/?utm_source=x#top" -> "https://shop.com/p/1". Amazon product pages
+    collapse to "https://amazon.<tld>/dp/<ASIN>". Strings that aren't absolute URLs are only stripped.
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return url
+    host = canonical_host(parts.netloc)
+    path = _REF_SEGMENT.sub("", parts.path).rstrip("/")
+    if host.startswith("amazon.") and (asin := _AMAZON_ASIN.search(path + "/")):
+        return f"https://{host}/dp/{asin.group(1).upper()}"
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _tracking(k)))
+    return urlunsplit(("https", host, path, query, ""))
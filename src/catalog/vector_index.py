@@ -0,0 +1,232 @@
+# vector_index.py
+"""
+In-process vector similarity index over catalog products.
+
+Texts are embedded locally as hashed word + character trigram features (no embedding service),
+L2-normalized, so cosine similarity is a dot product. The vectors live in one float32 matrix
+that is memory-mapped from disk: opening the index reads no vector data up front, and a batch
+of queries is scored with a single matrix product per chunk of rows.
+
+Re-adding a key appends a new row and tombstones the old one; once tombstones make up
+`compact_ratio` of the rows the files are rewritten without them.
+"""
+
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+VECTOR_INDEX_DIM = int(os.getenv("VECTOR_INDEX_DIM", 1024))
+VECTOR_INDEX_COMPACT_RATIO = float(os.getenv("VECTOR_INDEX_COMPACT_RATIO", 0.25))
+
+_WORD = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+# Rows scored per matrix product, bounding the temporary (queries x rows) score matrix
+_CHUNK_ROWS = 65536
+_DEAD = -1
+
+
+def embed(text: str, dim: int = VECTOR_INDEX_DIM) -> np.ndarray:
+    """Unit-length hashed feature vector: one feature per word, plus its character trigrams"""
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        # crc32 rather than hash() so buckets are stable across processes
+        vec[zlib.crc32(f"w:{word}".encode()) % dim] += 1.0
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            vec[zlib.crc32(padded[i:i + 3].encode()) % dim] += 1.0
+    np.log1p(vec, out=vec)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class VectorIndex:
+    """
+    Maps integer keys to embedded texts. Pass `path=None` to keep the index in memory; otherwise
+    it is stored as `<path>.vectors` (float32 rows), `<path>.keys` (int64) and `<path>.json`
+    (row count), and the header is only written after the rows it counts.
+    """
+
+    def __init__(self, path: Optional[str], dim: int = VECTOR_INDEX_DIM, compact_ratio: float = VECTOR_INDEX_COMPACT_RATIO):
+        self.path = path
+        self.dim = dim
+        self.compact_ratio = compact_ratio
+        self._vectors: Optional[np.ndarray] = None
+        self._keys: Optional[np.ndarray] = None
+        self._count = 0
+        self._rows: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._counters = {"searches": 0, "queries": 0, "appends": 0, "compactions": 0}
+
+    # ---- Storage ----
+    def _files(self, suffix: str = "") -> Tuple[str, str, str]:
+        return tuple(f"{self.path}{suffix}.{ext}" for ext in ("vectors", "keys", "json"))
+
+    def _map(self, capacity: int, suffix: str = "") -> Tuple[np.ndarray, np.ndarray]:
+        """(vectors, keys) arrays with room for `capacity` rows, file-backed when there is a path"""
+        if self.path is None:
+            return np.zeros((capacity, self.dim), dtype=np.float32), np.full(capacity, _DEAD, dtype=np.int64)
+        vectors_file, keys_file, _ = self._files(suffix)
+        for name, row_bytes in ((vectors_file, 4 * self.dim), (keys_file, 8)):
+            with open(name, "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        return (
+            np.memmap(vectors_file, dtype=np.float32, mode="r+", shape=(capacity, self.dim)),
+            np.memmap(keys_file, dtype=np.int64, mode="r+", shape=(capacity,)),
+        )
+
+    def _load(self) -> None:
+        # Opened lazily so that importing the catalog never touches the filesystem
+        if self._vectors is not None:
+            return
+        count = 0
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            header_file = self._files()[2]
+            if os.path.exists(header_file):
+                with open(header_file) as f:
+                    header = json.load(f)
+                if header["dim"] == self.dim:
+                    count = header["count"]
+                else:
+                    # Embeddings of another width can't be compared; the owner re-adds everything
+                    for name in self._files():
+                        os.remove(name)
+        self._vectors, self._keys = self._map(max(count, 1024))
+        self._count = count
+        self._rows = {int(key): row for row, key in enumerate(self._keys[:count]) if key != _DEAD}
+
+    def _write_header(self, suffix: str = "") -> None:
+        if self.path is None:
+            return
+        header_file = self._files(suffix)[2]
+        with open(f"{header_file}.tmp", "w") as f:
+            json.dump({"dim": self.dim, "count": self._count}, f)
+        os.replace(f"{header_file}.tmp", header_file)
+
+    def _flush(self) -> None:
+        if self.path is not None:
+            self._vectors.flush()
+            self._keys.flush()
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._keys)
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity)
+        if self.path is None:
+            vectors, keys = self._map(capacity)
+            vectors[:self._count] = self._vectors[:self._count]
+            keys[:self._count] = self._keys[:self._count]
+        else:
+            self._flush()
+            self._vectors = self._keys = None
+            vectors, keys = self._map(capacity)
+        self._vectors, self._keys = vectors, keys
+
+    # ---- Writes ----
+    def add(self, items: Iterable[Tuple[int, str]]) -> int:
+        """Embeds and appends (key, text) pairs, replacing earlier rows of the same keys"""
+        embedded = [(int(key), embed(text, self.dim)) for key, text in items]
+        if not embedded:
+            return 0
+        with self._lock:
+            self._load()
+            self._grow(self._count + len(embedded))
+            for key, vector in embedded:
+                self._remove(key)
+                self._vectors[self._count] = vector
+                self._keys[self._count] = key
+                self._rows[key] = self._count
+                self._count += 1
+            self._flush()
+            self._write_header()
+            self._counters["appends"] += len(embedded)
+            if self._count - len(self._rows) > self.compact_ratio * self._count:
+                self._compact()
+        return len(embedded)
+
+    def _remove(self, key: int) -> None:
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._vectors[row] = 0.0
+            self._keys[row] = _DEAD
+
+    def remove(self, keys: Iterable[int]) -> None:
+        with self._lock:
+            self._load()
+            for key in keys:
+                self._remove(int(key))
+            self._flush()
+
+    def _compact(self) -> None:
+        """Rewrites the live rows contiguously, then swaps the new files in"""
+        live = np.flatnonzero(self._keys[:self._count] != _DEAD)
+        capacity = max(len(live) * 2, 1024)
+        vectors, keys = self._map(capacity, suffix=".compact")
+        vectors[:len(live)] = self._vectors[live]
+        keys[:len(live)] = self._keys[live]
+        self._count = len(live)
+        if self.path is not None:
+            vectors.flush()
+            keys.flush()
+            self._write_header(suffix=".compact")
+            self._vectors = self._keys = vectors = keys = None
+            for old, new in zip(self._files(), self._files(".compact")):
+                os.replace(new, old)
+            vectors, keys = self._map(capacity)
+        self._vectors, self._keys = vectors, keys
+        self._rows = {int(key): row for row, key in enumerate(self._keys[:self._count])}
+        self._counters["compactions"] += 1
+
+    # ---- Reads ----
+    def keys(self) -> List[int]:
+        with self._lock:
+            self._load()
+            return list(self._rows)
+
+    def search(
+        self, texts: Sequence[str], k: int = 10, min_score: float = 0.0
+    ) -> List[List[Tuple[int, float]]]:
+        """For each text, up to `k` (key, cosine similarity) pairs scoring at least `min_score`, best first"""
+        queries = np.stack([embed(text, self.dim) for text in texts]) if texts else np.zeros((0, self.dim), np.float32)
+        best_scores = np.full((len(texts), 0), -np.inf, dtype=np.float32)
+        best_keys = np.zeros((len(texts), 0), dtype=np.int64)
+        with self._lock:
+            self._load()
+            self._counters["searches"] += 1
+            self._counters["queries"] += len(texts)
+            for start in range(0, self._count, _CHUNK_ROWS):
+                end = min(start + _CHUNK_ROWS, self._count)
+                scores = queries @ self._vectors[start:end].T
+                scores[:, self._keys[start:end] == _DEAD] = -np.inf
+                # Running top-k: this chunk's best k merged with the best so far
+                top = min(k, end - start)
+                part = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+                best_scores = np.concatenate([best_scores, np.take_along_axis(scores, part, axis=1)], axis=1)
+                best_keys = np.concatenate([best_keys, np.asarray(self._keys[start:end])[part]], axis=1)
+                if best_scores.shape[1] > k:
+                    keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                    best_keys = np.take_along_axis(best_keys, keep, axis=1)
+
+        results = []
+        for scores, keys in zip(best_scores, best_keys):
+            order = np.argsort(-scores)
+            results.append([(int(keys[i]), float(scores[i])) for i in order if scores[i] >= min_score and scores[i] > -np.inf])
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._load()
+            return {
+                **self._counters,
+                "entries": len(self._rows),
+                "rows": self._count,
+                "capacity": len(self._keys),
+                "dim": self.dim,
+            }
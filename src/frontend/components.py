@@ -5,10 +5,14 @@ Streamlit components and utilities for the VECTOR frontend
 """
 
 import streamlit as st
-from typing import Dict, Any, List
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
+
+# plotly is only imported once a chart is actually built, so the first page load stays light
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+# Figures are memoized on the result payload, so reruns (widget clicks, typing) don't rebuild them
+FIGURE_CACHE_SIZE = 32
 
 class VectorUI:
     """UI components for the VECTOR application"""
@@ -113,6 +117,8 @@ class VectorUI:
                 ["USD", "INR", "EUR", "GBP"],
                 index=0
             )
+            trace = st.checkbox("🧭 Record trace", value=False,
+                                help="Show a timing waterfall of graph nodes, LLM calls and web searches")
 
             st.header("📝 How to use")
             st.write(
@@ -136,14 +142,16 @@ class VectorUI:
                 st.caption(example)
                 st.write("---")
 
-            return FIXED_API_URL, currency
+            return FIXED_API_URL, currency, trace
 
     
     @staticmethod
-    def create_price_comparison_chart(products: List[Dict]) -> go.Figure:
+    @st.cache_data(max_entries=FIGURE_CACHE_SIZE, show_spinner=False)
+    def create_price_comparison_chart(products: List[Dict]) -> Optional["go.Figure"]:
         """Create a price comparison chart"""
         if not products:
             return None
+        import plotly.graph_objects as go
         
         names = [p.get('name', 'Unknown')[:20] + '...' if len(p.get('name', '')) > 20 
                 else p.get('name', 'Unknown') for p in products]
@@ -188,6 +196,91 @@ class VectorUI:
         
         return fig
     
+    @staticmethod
+    @st.cache_data(max_entries=FIGURE_CACHE_SIZE, show_spinner=False)
+    def create_trace_waterfall_chart(trace: Dict[str, Any]) -> Optional["go.Figure"]:
+        """Create a waterfall of a request trace: one bar per span, nested spans indented"""
+        spans = trace.get('spans') or []
+        if not spans:
+            return None
+        import plotly.graph_objects as go
+        
+        by_id = {s['id']: s for s in spans}
+        def depth(span):
+            level = 0
+            while span.get('parent_id') in by_id:
+                span = by_id[span['parent_id']]
+                level += 1
+            return level
+        
+        colors = {'graph': '#9e9e9e', 'node': '#42a5f5', 'llm': '#ab47bc', 'tool': '#66bb6a'}
+        labels, hover = [], []
+        for i, span in enumerate(spans):
+            # The index keeps rows with the same name (e.g. repeated search_agent turns) apart
+            # Non-breaking spaces, SVG would collapse plain ones
+            labels.append(f"{chr(160) * 3 * depth(span)}{span['name']} #{i}")
+            attrs = {k: v for k, v in span.get('attrs', {}).items() if v is not None}
+            details = "<br>".join(f"{k}: {v}" for k, v in attrs.items())
+            hover.append(f"<b>{span['name']}</b> ({span['kind']})<br>"
+                         f"{span['start_ms']:.0f} → {span['end_ms']:.0f} ms ({span['duration_ms']:.0f} ms)"
+                         + (f"<br>{details}" if details else ""))
+        
+        fig = go.Figure(go.Bar(
+            y=labels,
+            x=[s['duration_ms'] for s in spans],
+            base=[s['start_ms'] for s in spans],
+            orientation='h',
+            marker=dict(
+                color=[colors.get(s['kind'], '#bdbdbd') for s in spans],
+                line=dict(color=['#e53935' if s.get('critical') else 'rgba(0,0,0,0)' for s in spans], width=2)
+            ),
+            hovertext=hover,
+            hoverinfo='text'
+        ))
+        
+        fig.update_layout(
+            title=f"Request trace ({trace.get('duration_ms', 0):.0f} ms, critical path outlined in red)",
+            xaxis_title="Milliseconds since request start",
+            yaxis=dict(autorange='reversed', tickfont=dict(family='monospace')),
+            height=max(300, 24 * len(spans) + 120),
+            showlegend=False
+        )
+        
+        return fig
+    
+    @staticmethod
+    @st.cache_data(max_entries=FIGURE_CACHE_SIZE, show_spinner=False)
+    def create_distribution_chart(values: List[float], label: str, nbins: int) -> Optional["go.Figure"]:
+        """Create a histogram of one product field (prices, ratings)"""
+        if not values:
+            return None
+        import plotly.graph_objects as go
+        
+        fig = go.Figure(go.Histogram(x=values, nbinsx=nbins, name=label))
+        fig.update_layout(
+            title=f"{label} Distribution",
+            xaxis_title=label,
+            yaxis_title="count",
+            bargap=0.05
+        )
+        
+        return fig
+    
+    @staticmethod
+    @st.cache_data(max_entries=FIGURE_CACHE_SIZE, show_spinner=False)
+    def create_product_table(products: List[Dict]) -> List[Dict[str, Any]]:
+        """Rows of the quick overview table"""
+        return [
+            {
+                "Product": product.get('name', 'N/A'),
+                "Price": f"{VectorUI.get_currency_symbol(product.get('currency') or 'USD')}{product.get('price', 'N/A')}",
+                "Rating": f"{product.get('rating', 'N/A')}/5.0" if product.get('rating') else 'N/A',
+                "Source": product.get('source', 'N/A'),
+                "Availability": product.get('availability', 'N/A')
+            }
+            for product in products
+        ]
+    
     @staticmethod
     def render_product_metrics(products: List[Dict]):
         """Render product metrics overview"""
@@ -0,0 +1,46 @@
+# budget.py
+"""
+Per-request latency budget.
+
+`/USER` turns `deadline_ms` into an absolute `deadline_at` timestamp in the state. Every
+stage checks what is left and switches to a cheaper behaviour when it runs low.
+"""
+
+import os
+import time
+from typing import List, Optional
+from src.graph.state import AgentState
+
+# Below this much remaining time, each stage downgrades (seconds)
+SEARCH_TURN_SECONDS = float(os.getenv("BUDGET_SEARCH_TURN_SECONDS", 8))          # no further search tool turns
+REDUCED_SEARCH_SECONDS = float(os.getenv("BUDGET_REDUCED_SEARCH_SECONDS", 15))   # fewer Exa results / planned queries
+PRODUCT_LIST_SECONDS = float(os.getenv("BUDGET_PRODUCT_LIST_SECONDS", 4))        # product_list extraction is skipped
+FULL_RECOMMENDATION_SECONDS = float(os.getenv("BUDGET_FULL_RECOMMENDATION_SECONDS", 12))  # shorter recommendation
+RECOMMENDATION_SECONDS = float(os.getenv("BUDGET_RECOMMENDATION_SECONDS", 3))    # recommendation is skipped
+
+
+def deadline_from_ms(deadline_ms: Optional[int]) -> Optional[float]:
+    if deadline_ms is None:
+        return None
+    return time.time() + deadline_ms / 1000
+
+
+def remaining(state: AgentState) -> Optional[float]:
+    """Seconds left before the deadline, or None when the request has no budget"""
+    deadline_at = state.get("deadline_at")
+    if deadline_at is None:
+        return None
+    return deadline_at - time.time()
+
+
+def below(state: AgentState, seconds: float) -> bool:
+    left = remaining(state)
+    return left is not None and left < seconds
+
+
+def degrade(state: AgentState, reason: str) -> List[str]:
+    """The state's degradation reasons with `reason` appended (to be written back as `degraded`)"""
+    reasons = list(state.get("degraded") or [])
+    if reason not in reasons:
+        reasons.append(reason)
+    return reasons
@@ -0,0 +1,333 @@
+# checkpoint.py
+"""
+SQLite checkpoint saver for LangGraph, so a session's graph state survives between requests
+(and restarts) and a follow-up can continue from it.
+
+Same layout as LangGraph's in-memory saver: checkpoint metadata per (thread, namespace, id),
+channel values stored once per version in `blobs`, and pending writes per checkpoint. The async
+methods the graph calls at every superstep run the SQLite work, serialization included, in a
+worker thread, so the event loop never waits on the database.
+
+Sessions only ever resume from their latest checkpoint, so each (thread, namespace) keeps its
+`keep_latest` newest checkpoints; older ones, their writes, the blob versions no kept checkpoint
+refers to and finished subgraph namespaces are deleted as new checkpoints are written.
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS checkpoints ("
+    " thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,"
+    " parent_checkpoint_id TEXT, type TEXT NOT NULL, checkpoint BLOB NOT NULL,"
+    " metadata_type TEXT NOT NULL, metadata BLOB NOT NULL, created_at REAL NOT NULL,"
+    " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))",
+    "CREATE TABLE IF NOT EXISTS blobs ("
+    " thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, version TEXT NOT NULL,"
+    " type TEXT NOT NULL, value BLOB, PRIMARY KEY (thread_id, checkpoint_ns, channel, version))",
+    "CREATE TABLE IF NOT EXISTS writes ("
+    " thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,"
+    " task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL, type TEXT NOT NULL,"
+    " value BLOB, task_path TEXT NOT NULL DEFAULT '',"
+    " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))",
+    "CREATE INDEX IF NOT EXISTS checkpoints_created ON checkpoints(created_at)",
+)
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    Pass `path=None` to keep checkpoints in memory. Threads whose latest checkpoint is older than
+    `ttl_seconds` are deleted when the database is opened and then every `purge_interval_seconds`
+    (checked on writes). `keep_latest=None` keeps every checkpoint.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        ttl_seconds: Optional[float] = None,
+        *,
+        keep_latest: Optional[int] = 2,
+        purge_interval_seconds: float = 60 * 60,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.keep_latest = keep_latest
+        self.purge_interval_seconds = purge_interval_seconds
+        self._purged_at = 0.0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened lazily so that building the graph never touches the filesystem
+        if self._conn is None:
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False)
+            if self.path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+            self._purge()
+            self._conn.commit()
+        return self._conn
+
+    def _purge(self) -> None:
+        """Deletes threads idle for longer than the TTL"""
+        self._purged_at = time.monotonic()
+        if not self.ttl_seconds:
+            return
+        stale = [row[0] for row in self._conn.execute(
+            "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?",
+            (time.time() - self.ttl_seconds,),
+        )]
+        for thread_id in stale:
+            self._delete(thread_id)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Keeps the thread's `keep_latest` newest checkpoints and the blobs they refer to"""
+        key = (thread_id, checkpoint_ns)
+        old = [row[0] for row in self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+            " ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+            (*key, self.keep_latest),
+        )]
+        if not old:
+            return
+        for table in ("checkpoints", "writes"):
+            self._conn.executemany(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                [(*key, checkpoint_id) for checkpoint_id in old],
+            )
+        referenced = set()
+        for type_, checkpoint_b in self._conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", key
+        ):
+            referenced.update(
+                (channel, str(version))
+                for channel, version in self.serde.loads_typed((type_, checkpoint_b))["channel_versions"].items()
+            )
+        unreferenced = [
+            row for row in self._conn.execute(
+                "SELECT channel, version FROM blobs WHERE thread_id = ? AND checkpoint_ns = ?", key
+            ) if row not in referenced
+        ]
+        self._conn.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+            [(*key, *row) for row in unreferenced],
+        )
+        if checkpoint_ns == "":
+            # Subgraph runs ("search_agent:<task id>") that finished before the oldest kept root checkpoint
+            finished = [row[0] for row in self._conn.execute(
+                "SELECT checkpoint_ns FROM checkpoints WHERE thread_id = ? AND checkpoint_ns != ''"
+                " GROUP BY checkpoint_ns HAVING MAX(created_at) < ("
+                "  SELECT MIN(created_at) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '')",
+                (thread_id, thread_id),
+            )]
+            for table in ("checkpoints", "blobs", "writes"):
+                self._conn.executemany(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ?",
+                    [(thread_id, ns) for ns in finished],
+                )
+
+    def _delete(self, thread_id: str) -> None:
+        for table in ("checkpoints", "blobs", "writes"):
+            self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    # ---- Reads ----
+    def _tuple(self, db: sqlite3.Connection, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint_b, metadata_type, metadata_b = row
+        checkpoint = self.serde.loads_typed((type_, checkpoint_b))
+        channel_values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            blob = db.execute(
+                "SELECT type, value FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if blob is not None and blob[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(blob)
+        writes = db.execute(
+            "SELECT task_id, channel, type, value FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_b)),
+            parent_config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_checkpoint_id,
+            }} if parent_checkpoint_id else None,
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+        )
+
+    _COLUMNS = "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            db = self._db()
+            if checkpoint_id := get_checkpoint_id(config):
+                row = db.execute(
+                    f"SELECT {self._COLUMNS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                # Checkpoint ids sort by creation time
+                row = db.execute(
+                    f"SELECT {self._COLUMNS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._tuple(db, row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            db = self._db()
+            rows = db.execute(
+                f"SELECT {self._COLUMNS} FROM checkpoints{where} ORDER BY checkpoint_id DESC", params
+            ).fetchall()
+            tuples = []
+            for row in rows:
+                # Metadata is serialized, so the filter is applied here rather than in SQL
+                if filter:
+                    metadata = self.serde.loads_typed((row[6], row[7]))
+                    if not all(metadata.get(k) == v for k, v in filter.items()):
+                        continue
+                tuples.append(self._tuple(db, row))
+                if limit is not None and len(tuples) >= limit:
+                    break
+        yield from tuples
+
+    # ---- Writes ----
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        c = checkpoint.copy()
+        values: Dict[str, Any] = c.pop("channel_values")
+        type_, checkpoint_b = self.serde.dumps_typed(c)
+        metadata_type, metadata_b = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            db = self._db()
+            for channel, version in new_versions.items():
+                blob = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+                db.execute(
+                    "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, channel, str(version), *blob),
+                )
+            db.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, checkpoint_b, metadata_type, metadata_b, time.time()),
+            )
+            if self.keep_latest:
+                self._prune(thread_id, checkpoint_ns)
+            if time.monotonic() - self._purged_at >= self.purge_interval_seconds:
+                self._purge()
+            db.commit()
+        return {"configurable": {
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            db = self._db()
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                # Regular writes are never overwritten; special channels (errors, interrupts) are
+                verb = "INSERT OR REPLACE" if idx < 0 else "INSERT OR IGNORE"
+                db.execute(
+                    f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel,
+                     *self.serde.dumps_typed(value), task_path),
+                )
+            db.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._db()
+            self._delete(thread_id)
+            self._conn.commit()
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ---- Async (in a worker thread, see the module docstring) ----
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None) -> AsyncIterator[CheckpointTuple]:
+        tuples = await asyncio.to_thread(lambda: [*self.list(config, filter=filter, before=before, limit=limit)])
+        for item in tuples:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
@@ -1,19 +1,50 @@
 # main_graph.py
 
+import os
 from langgraph.graph import StateGraph, START, END
+from src.graph import state as state_types
 from src.graph.state import AgentState
 from src.nodes.router import router_node, router_steps
 from src.nodes.specs_agent import specs_agent
-from src.nodes.search_agent import app as search_graph_app
+from src.nodes.catalog_search import catalog_search
+from src.nodes.search_agent import app as search_graph_app, build_search_graph
+from src.nodes.fanout_search import app as fanout_graph_app, build_fanout_graph
+from src.nodes.fused_results import extract_and_recommend
 from src.nodes.combine_results import comb_results
+from src.nodes.refine import refine
 
+# Replace the product_list -> comb_results pair with one fused LLM call
+FUSED_RESULTS = os.getenv("FUSED_RESULTS", "false").lower() == "true"
 
-def build_graph():
+# Pydantic models in the state that a checkpointer's serializer has to allow loading back
+# (LangGraph warns on, and will refuse, anything not allowed)
+CHECKPOINT_TYPES = [
+    (state_types.__name__, name)
+    for name in ("Product", "Product_info", "Recommendation", "RecommendationItem", "Choice")
+]
+
+
+def build_graph(fused: bool = FUSED_RESULTS, checkpointer=None):
+    """
+    The main graph. With a `checkpointer`, runs need a `thread_id` and each run continues from the
+    thread's last state; that is how session follow-ups reuse specs and products.
+    """
     graph = StateGraph(AgentState)
 
+    if fused:
+        # The search stage then also fills final_recommendation, so the router goes straight to the end.
+        # comb_results stays wired for product lists that come from the specs cache.
+        search_app = build_search_graph(extract_and_recommend, "extract_and_recommend")
+        fanout_app = build_fanout_graph(extract_and_recommend, "extract_and_recommend")
+    else:
+        search_app, fanout_app = search_graph_app, fanout_graph_app
+
     graph.add_node("router", router_node)
+    graph.add_node("refine", refine)
     graph.add_node("specs_agent", specs_agent)
-    graph.add_node("search_agent", search_graph_app)
+    graph.add_node("catalog_search", catalog_search)
+    graph.add_node("search_agent", search_app)
+    graph.add_node("fanout_search", fanout_app)
     graph.add_node("comb_results", comb_results)
 
     # Router is the fist node
@@ -23,18 +54,24 @@ def build_graph():
         "router",
         router_steps, # This function will return one of the keys below
         {
+            "refine": "refine",
             "specs_agent": "specs_agent",
+            "catalog_search": "catalog_search",
             "search_agent": "search_agent",
+            "fanout_search": "fanout_search",
             "comb_results": "comb_results",
             "__end__": END,
         }
     )
+    graph.add_edge("refine", "router")
     graph.add_edge("specs_agent", "router")
+    graph.add_edge("catalog_search", "router")
     graph.add_edge("search_agent", "router")
+    graph.add_edge("fanout_search", "router")
 
     graph.add_edge("comb_results", END)
 
-    app = graph.compile()
+    app = graph.compile(checkpointer=checkpointer)
     return app
 
 
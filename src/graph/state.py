@@ -1,5 +1,5 @@
 # State.py
-from typing import List, TypedDict, Literal, Optional, Annotated
+from typing import Dict, List, TypedDict, Literal, Optional, Annotated
 from pydantic import BaseModel, Field
 from typing_extensions import NotRequired
 from langchain_core.messages import AnyMessage
@@ -10,6 +10,7 @@ class ProductSpecs(TypedDict):
     max_price: Optional[float]
     min_price: Optional[float]
     brand_preferences: List[str]
+    excluded_brands: List[str]
     use_cases: List[str]
     key_requirements: List[str]
 
@@ -85,6 +86,14 @@ class Recommendation(BaseModel):
     recommendations: List[RecommendationItem]
     final_choice: Optional[Choice] = None
 
+class ProductsWithRecommendation(BaseModel):
+    """Fused output: the extracted products and the recommendation over them, in one call"""
+    products: List[Product_info]
+    recommendation: Recommendation
+
+class SearchPlan(BaseModel):
+    queries: List[str] = Field(description="Diverse web search queries that together cover the user's specifications")
+
 class AgentState(TypedDict):
     user_query: str
     currency: str
@@ -99,6 +108,26 @@ class AgentState(TypedDict):
     # Final Aggregated Recommendation
     final_recommendation: NotRequired[Recommendation]
 
+    # Search mode: the sequential ReAct loop or a planned, parallel fan-out
+    search_mode: NotRequired[Literal["react", "fanout"]]
+    search_queries: NotRequired[List[str]]
+    search_started_at: NotRequired[float]
+    search_seconds: NotRequired[float]
+    # Set once the local product catalog was asked; the search only runs when it had too few products
+    catalog_checked: NotRequired[bool]
+
+    # Latency budget: absolute deadline (epoch seconds) and why stages had to cut corners
+    deadline_at: NotRequired[Optional[float]]
+    degraded: NotRequired[List[str]]
+
+    # Per-request {node: "provider:model[@temperature]"} overrides of the model registry
+    models: NotRequired[Dict[str, str]]
+
+    # Sessions: a follow-up to the checkpointed state ("cheaper", "only Lenovo"), consumed by the
+    # refine node, and what it reused / re-ran
+    follow_up: NotRequired[Optional[str]]
+    refinement: NotRequired[Dict]
+
     # Control flags
     step: NotRequired[Literal[
         "specs_generation", 
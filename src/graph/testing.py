@@ -1,3 +1,4 @@
+import asyncio
 from src.graph.main_graph import build_graph
 # from IPython.display import Image
 
@@ -10,7 +11,7 @@ if __name__ == "__main__":
         "messages": [],
     }
 
-    final_state = app.invoke(initial_state)
+    final_state = asyncio.run(app.ainvoke(initial_state))
 
     print("\n=== FINAL STATE ===")
     print("Specs:\n", final_state.get("product_specs"))
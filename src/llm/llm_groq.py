@@ -1,14 +1,14 @@
-from langchain_groq import ChatGroq
-import os
 from dotenv import load_dotenv
+from src.llm import registry
 
 load_dotenv(override=True)
 
-llm_groq = ChatGroq(
-        groq_api_key= os.environ["GROQ_API_KEY"],
-        model="openai/gpt-oss-120b",  # Can be replace with our preferred model
-        temperature=0.1
-    )
+
+def __getattr__(name):
+    # Built on first access, so importing this module no longer requires GROQ_API_KEY
+    if name == "llm_groq":
+        return registry.chat_model(registry.ModelSpec("groq", "openai/gpt-oss-120b", 0.1))  # Can be replace with our preferred model
+    raise AttributeError(name)
 
 # result = llm.invoke("Tell me about Groq and its AI accelerators.")
-# print(result)
\ No newline at end of file
+# print(result)
@@ -1,13 +1,11 @@
-from langchain_openai import ChatOpenAI
-import os
 from dotenv import load_dotenv
+from src.llm import registry
 
 load_dotenv(override=True)
 
-llm_openai = ChatOpenAI(
-    model = "gpt-4.1",
-    temperature= 0.1,
-    api_key=os.getenv("OPENAI_API_KEY")
-
-)
 
+def __getattr__(name):
+    # Built on first access (and shared with the registry) instead of at import time
+    if name == "llm_openai":
+        return registry.chat_model(registry.ModelSpec("openai", "gpt-4.1", 0.1))
+    raise AttributeError(name)
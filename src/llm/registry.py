@@ -0,0 +1,192 @@
+# registry.py
+"""
+Per-node model registry.
+
+Each LLM-calling node resolves its chat model here instead of importing one shared client.
+A model is written as "provider:model[@temperature]", e.g. "openai:gpt-4.1-mini@0" or
+"groq:openai/gpt-oss-120b". The default comes from LLM_MODEL_DEFAULT, a node can be
+overridden with LLM_MODEL_<NODE> (e.g. LLM_MODEL_SPECS_AGENT), and a request can override
+any node through its `models` mapping (carried in the graph state) with one of the configured
+models or those listed in LLM_ALLOWED_MODELS.
+"""
+
+import os
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+from src.net.cassette import cassette
+from src.net.http_pool import async_client
+
+load_dotenv(override=True)
+
+PROVIDERS = ("openai", "groq")
+
+# Graph nodes that call an LLM
+NODES = (
+    "specs_agent",
+    "search_agent",
+    "plan_searches",
+    "product_list",
+    "comb_results",
+    "extract_and_recommend",
+)
+
+DEFAULT_TEMPERATURE = 0.1
+
+
+class ModelSpec(NamedTuple):
+    provider: str
+    model: str
+    temperature: float = DEFAULT_TEMPERATURE
+
+    @property
+    def label(self) -> str:
+        return f"{self.provider}:{self.model}@{self.temperature:g}"
+
+
+def parse_spec(value: str) -> ModelSpec:
+    """Parse "provider:model[@temperature]"; raises ValueError on anything else"""
+    provider, sep, rest = value.strip().partition(":")
+    if not sep or provider not in PROVIDERS or not rest:
+        raise ValueError(f"model must look like '<{'|'.join(PROVIDERS)}>:<model>[@temperature]', got {value!r}")
+    model, sep, temperature = rest.rpartition("@")
+    if not sep:
+        return ModelSpec(provider, rest)
+    try:
+        return ModelSpec(provider, model, float(temperature))
+    except ValueError:
+        raise ValueError(f"invalid temperature in {value!r}") from None
+
+
+DEFAULT_MODEL = parse_spec(os.getenv("LLM_MODEL_DEFAULT", f"openai:gpt-4.1@{DEFAULT_TEMPERATURE}"))
+
+node_models: Dict[str, ModelSpec] = {
+    node: parse_spec(os.environ[f"LLM_MODEL_{node.upper()}"]) if os.getenv(f"LLM_MODEL_{node.upper()}") else DEFAULT_MODEL
+    for node in NODES
+}
+
+# What a request may pick: the configured models plus LLM_ALLOWED_MODELS (comma separated). Each
+# one builds a client that stays cached, so callers can't grow the cache with arbitrary models.
+allowed_models: Dict[str, ModelSpec] = {
+    spec.label: spec
+    for spec in [
+        DEFAULT_MODEL, *node_models.values(),
+        *(parse_spec(v) for v in os.getenv("LLM_ALLOWED_MODELS", "").split(",") if v.strip()),
+    ]
+}
+
+
+def validate_overrides(models: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    """Checks a per-request {node: "provider:model[@temperature]"} mapping against the allowed models"""
+    for node, value in (models or {}).items():
+        if node not in NODES:
+            raise ValueError(f"unknown node {node!r}, expected one of {', '.join(NODES)}")
+        if parse_spec(value).label not in allowed_models:
+            raise ValueError(f"model {value!r} is not allowed, expected one of {', '.join(allowed_models)}")
+    return models
+
+
+def resolve(node: str, state: Optional[dict] = None) -> ModelSpec:
+    """The model `node` runs on for this request"""
+    override = ((state or {}).get("models") or {}).get(node)
+    return parse_spec(override) if override else node_models[node]
+
+
+def _chat_model(spec: ModelSpec):
+    # Provider SDKs are imported on first use; importing them costs most of the API's cold start
+    if spec.provider == "groq":
+        from langchain_groq import ChatGroq
+        return ChatGroq(
+            api_key=os.getenv("GROQ_API_KEY"), model=spec.model, temperature=spec.temperature,
+            http_async_client=async_client(),
+        )
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"), model=spec.model, temperature=spec.temperature,
+        http_async_client=async_client(),
+    )
+
+
+# Clients and their structured / tool-bound wrappers are built once per (model, schema, tools)
+_runnables: Dict[Tuple, object] = {}
+
+
+def chat_model(spec: ModelSpec):
+    """The (cached) bare chat model for `spec`"""
+    model = _runnables.get((spec, None, ()))
+    if model is None:
+        model = _runnables[(spec, None, ())] = _chat_model(spec)
+    return model
+
+
+def _build(spec: ModelSpec, schema=None, tools: Sequence = ()):
+    key = (spec, schema, tuple(tool.name for tool in tools))
+    runnable = _runnables.get(key)
+    if runnable is None:
+        runnable = chat_model(spec)
+        if schema is not None:
+            runnable = runnable.with_structured_output(schema)
+        elif tools:
+            runnable = runnable.bind_tools(list(tools))
+        _runnables[key] = runnable
+    return runnable
+
+
+def _message_key(message) -> Any:
+    # Only what the model sees; ids and response metadata differ between otherwise identical runs
+    if not isinstance(message, BaseMessage):
+        return message
+    return {
+        "type": message.type,
+        "content": message.content,
+        "tool_calls": [(c["name"], c["args"], c.get("id")) for c in getattr(message, "tool_calls", None) or []],
+        "tool_call_id": getattr(message, "tool_call_id", None),
+    }
+
+
+def _encode_output(value) -> Any:
+    if isinstance(value, BaseMessage):
+        return {"message": message_to_dict(value)}
+    # Pydantic schemas (Product, Recommendation...) or TypedDict ones (ProductSpecs), which come back as dicts
+    return {"structured": value.model_dump(mode="json") if isinstance(value, BaseModel) else value}
+
+
+def _decode_output(schema, data: Dict[str, Any]) -> Any:
+    if "message" in data:
+        return messages_from_dict([data["message"]])[0]
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return schema.model_validate(data["structured"])
+    return data["structured"]
+
+
+def _on_cassette(node: str, spec: ModelSpec, schema=None, tools: Sequence = ()):
+    """Record / replay wrapper; in replay mode the provider client is never built"""
+    async def call(input, config: RunnableConfig):
+        request = {
+            "node": node,
+            "model": spec.label,
+            "schema": schema.__name__ if schema is not None else None,
+            "tools": [tool.name for tool in tools],
+            "input": [_message_key(m) for m in input] if isinstance(input, list) else _message_key(input),
+        }
+        return await cassette.call(
+            "llm",
+            request,
+            lambda: _build(spec, schema, tools).ainvoke(input, config),
+            encode=_encode_output,
+            decode=lambda data: _decode_output(schema, data),
+        )
+
+    return RunnableLambda(call, name=node)
+
+
+def llm_for(node: str, state: Optional[dict] = None, *, schema=None, tools: Sequence = ()):
+    """
+    The runnable for `node`: its chat model, wrapped with `with_structured_output(schema)` or
+    `bind_tools(tools)` when given, and tagged so the usage callback can attribute the call.
+    """
+    spec = resolve(node, state)
+    runnable = _on_cassette(node, spec, schema, tools) if cassette.active else _build(spec, schema, tools)
+    return runnable.with_config(metadata={"llm_node": node, "llm_model": spec.label})
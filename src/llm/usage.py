@@ -0,0 +1,85 @@
+# usage.py
+"""
+Per-node LLM latency and token accounting.
+
+`LLMUsageTracker` is a LangChain callback passed in the graph's run config; it attributes every
+chat model call to the node that made it (via the metadata `registry.llm_for` attaches), keeps a
+per-request report, and folds each call into the process-wide `llm_usage_stats`.
+"""
+
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# (node, model) -> counters, across all requests since start-up
+llm_usage_stats: Dict[tuple, Dict[str, float]] = {}
+
+
+def _empty() -> Dict[str, float]:
+    return {"calls": 0, "errors": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0}
+
+
+def token_counts(response: LLMResult) -> tuple:
+    """(input, output) tokens reported by the provider"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+def summarize(usage: Dict[tuple, Dict[str, float]]) -> Dict[str, Dict[str, Any]]:
+    """{node: {model, calls, seconds, avg_seconds, tokens...}} for JSON responses"""
+    report = {}
+    for (node, model), counters in usage.items():
+        report[f"{node}/{model}"] = {
+            "node": node,
+            "model": model,
+            **counters,
+            "seconds": round(counters["seconds"], 3),
+            "avg_seconds": round(counters["seconds"] / counters["calls"], 3) if counters["calls"] else None,
+        }
+    return report
+
+
+class LLMUsageTracker(BaseCallbackHandler):
+    """One per request; see the module docstring"""
+
+    # Bookkeeping only, no need to hop to a thread for it
+    run_inline = True
+
+    def __init__(self):
+        self.usage: Dict[tuple, Dict[str, float]] = {}
+        self._started: Dict[UUID, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata: Optional[dict] = None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("llm_node") or metadata.get("langgraph_node") or "unknown"
+        self._started[run_id] = (node, metadata.get("llm_model") or "unknown", time.perf_counter())
+
+    def _finish(self, run_id: UUID, **counts) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        node, model, t0 = started
+        seconds = time.perf_counter() - t0
+        for usage in (self.usage, llm_usage_stats):
+            counters = usage.setdefault((node, model), _empty())
+            counters["calls"] += 1
+            counters["seconds"] += seconds
+            for name, value in counts.items():
+                counters[name] += value
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        input_tokens, output_tokens = token_counts(response)
+        self._finish(run_id, input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._finish(run_id, errors=1)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        return summarize(self.usage)
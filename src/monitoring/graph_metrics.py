@@ -0,0 +1,155 @@
+# graph_metrics.py
+"""
+Graph instrumentation for /metrics.
+
+`GraphMetricsCallback` is attached to the compiled graph (`instrument(graph)`), so every run,
+whichever endpoint started it, reports:
+- per-node latency and errors, for main-graph nodes and nodes inside the search subgraphs;
+- ReAct iterations (search_agent turns) per run;
+- Exa tool calls and their latency;
+- LLM calls, latency and prompt / completion tokens per node and model.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from src.llm.usage import token_counts
+from src.monitoring.metrics import registry
+
+ITERATION_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 25)
+
+node_duration = registry.histogram(
+    "vector_graph_node_duration_seconds", "Time spent in each graph node", ["graph", "node"])
+node_errors = registry.counter(
+    "vector_graph_node_errors_total", "Graph node runs that raised", ["graph", "node"])
+run_duration = registry.histogram(
+    "vector_graph_run_duration_seconds", "Wall-clock time of whole graph runs", ["status"])
+react_iterations = registry.histogram(
+    "vector_react_iterations", "search_agent turns per graph run that used the ReAct loop", buckets=ITERATION_BUCKETS)
+exa_calls = registry.counter(
+    "vector_exa_calls_total", "Exa search tool calls (including ones served from the Exa cache)", ["status"])
+exa_duration = registry.histogram(
+    "vector_exa_call_duration_seconds", "Latency of Exa search tool calls")
+llm_calls = registry.counter(
+    "vector_llm_calls_total", "LLM calls", ["node", "model", "status"])
+llm_tokens = registry.counter(
+    "vector_llm_tokens_total", "LLM tokens", ["node", "model", "type"])
+llm_duration = registry.histogram(
+    "vector_llm_call_duration_seconds", "Latency of LLM calls", ["node", "model"])
+
+cache_hit_ratio = registry.gauge("vector_cache_hit_ratio", "Hit ratio since start-up", ["cache"])
+cache_entries = registry.gauge("vector_cache_entries", "Entries currently held", ["cache"])
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, Any]]) -> None:
+    """Exports a cache's `stats()` (hit_ratio / entries) as gauges at scrape time"""
+    def collect():
+        values = stats()
+        if "hit_ratio" in values:
+            cache_hit_ratio.set(values["hit_ratio"], cache=name)
+        if values.get("entries") is not None:
+            cache_entries.set(values["entries"], cache=name)
+    registry.add_collector(collect)
+
+
+def _graph_node(name: str, tags, metadata: Dict[str, Any]) -> Optional[tuple]:
+    """(graph, node) when the run is a graph node itself, not one of the runnables inside it"""
+    if metadata.get("langgraph_node") != name or not any(t.startswith("graph:step:") for t in tags or ()):
+        return None
+    namespace = (metadata.get("langgraph_checkpoint_ns") or "").split("|")
+    graph = namespace[-2].split(":", 1)[0] if len(namespace) > 1 else "main"
+    return graph, name
+
+
+class GraphMetricsCallback(BaseCallbackHandler):
+    """One per process, shared by concurrent runs; state is keyed by run id"""
+
+    run_inline = True
+
+    def __init__(self):
+        # run id -> (kind, labels, started); root runs also count their ReAct turns
+        self._runs: Dict[UUID, tuple] = {}
+        self._roots: Dict[UUID, UUID] = {}
+        self._iterations: Dict[UUID, int] = {}
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], kind: str, labels: Dict[str, str]) -> None:
+        self._runs[run_id] = (kind, labels, time.perf_counter())
+        self._roots[run_id] = self._roots.get(parent_run_id, run_id) if parent_run_id else run_id
+
+    def _end(self, run_id: UUID, error: bool) -> None:
+        root = self._roots.pop(run_id, None)
+        started = self._runs.pop(run_id, None)
+        if started is None:
+            return
+        kind, labels, t0 = started
+        seconds = time.perf_counter() - t0
+        if kind == "graph":
+            run_duration.observe(seconds, status="error" if error else "ok")
+            # Fan-out runs and runs answered from the specs cache have no ReAct loop to count
+            iterations = self._iterations.pop(run_id, 0)
+            if iterations:
+                react_iterations.observe(iterations)
+        elif kind == "node":
+            node_duration.observe(seconds, **labels)
+            if error:
+                node_errors.inc(**labels)
+            if labels["node"] == "search_agent" and labels["graph"] == "search_agent" and root is not None:
+                self._iterations[root] = self._iterations.get(root, 0) + 1
+        elif kind == "exa":
+            exa_calls.inc(status="error" if error else "ok")
+            exa_duration.observe(seconds)
+        elif kind == "llm":
+            llm_calls.inc(status="error" if error else "ok", **labels)
+            llm_duration.observe(seconds, **labels)
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                       tags=None, metadata: Optional[dict] = None, **kwargs):
+        if parent_run_id is None:
+            self._start(run_id, None, "graph", {})
+            return
+        node = _graph_node(kwargs.get("name") or "", tags, metadata or {})
+        self._start(run_id, parent_run_id, "node" if node else "chain", dict(zip(("graph", "node"), node or ())))
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        self._end(run_id, error=False)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._end(run_id, error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name")
+        self._start(run_id, parent_run_id, "exa" if name == "exa_search" else "tool", {})
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        self._end(run_id, error=False)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._end(run_id, error=True)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                            metadata: Optional[dict] = None, **kwargs):
+        metadata = metadata or {}
+        labels = {"node": metadata.get("llm_node") or metadata.get("langgraph_node") or "unknown",
+                  "model": metadata.get("llm_model") or "unknown"}
+        self._start(run_id, parent_run_id, "llm", labels)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        started = self._runs.get(run_id)
+        if started is not None:
+            input_tokens, output_tokens = token_counts(response)
+            llm_tokens.inc(input_tokens, type="prompt", **started[1])
+            llm_tokens.inc(output_tokens, type="completion", **started[1])
+        self._end(run_id, error=False)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._end(run_id, error=True)
+
+
+graph_metrics = GraphMetricsCallback()
+
+
+def instrument(graph):
+    """The compiled graph with the metrics callback attached to every run"""
+    return graph.with_config(callbacks=[graph_metrics])
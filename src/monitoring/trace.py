@@ -0,0 +1,180 @@
+# trace.py
+"""
+Opt-in per-request traces.
+
+A `TraceRecorder` is passed as a callback for one run (`"trace": true` on /USER) and builds a
+span tree: the graph run, each graph node, each LLM call (model, tokens) and each Exa call
+(query, result size). State size after every superstep is recorded as well. Times are
+milliseconds from the start of the trace, and the spans on the critical path are flagged.
+Finished traces are kept in `trace_store` so they can also be fetched by id.
+"""
+
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from src.llm.usage import token_counts
+
+
+def state_size(state: Dict[str, Any]) -> int:
+    """Serialized size of a graph state in bytes"""
+    return len(json.dumps(
+        state, default=lambda o: o.model_dump() if hasattr(o, "model_dump") else str(o)
+    ).encode())
+
+
+class TraceRecorder(BaseCallbackHandler):
+
+    run_inline = True
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self._t0 = time.perf_counter()
+        self.spans: Dict[UUID, Dict[str, Any]] = {}
+        # Runs that are not spans themselves (sequences, parsers...) hand their children to their parent
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+        self.supersteps: List[Dict[str, Any]] = []
+
+    def _now(self) -> float:
+        return round((time.perf_counter() - self._t0) * 1000, 3)
+
+    def _span_parent(self, parent_run_id: Optional[UUID]) -> Optional[UUID]:
+        while parent_run_id is not None and parent_run_id not in self.spans:
+            parent_run_id = self._parents.get(parent_run_id)
+        return parent_run_id
+
+    def _open(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: str, **attrs) -> None:
+        self.spans[run_id] = {
+            "id": str(run_id),
+            "parent_id": str(p) if (p := self._span_parent(parent_run_id)) else None,
+            "name": name,
+            "kind": kind,
+            "start_ms": self._now(),
+            "end_ms": None,
+            "attrs": attrs,
+        }
+
+    def _close(self, run_id: UUID, error: Optional[BaseException] = None, **attrs) -> None:
+        self._parents.pop(run_id, None)
+        span = self.spans.get(run_id)
+        if span is None:
+            return
+        span["end_ms"] = self._now()
+        span["attrs"].update(attrs)
+        if error is not None:
+            span["attrs"]["error"] = f"{type(error).__name__}: {error}"
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                       tags=None, metadata: Optional[dict] = None, **kwargs):
+        metadata = metadata or {}
+        name = kwargs.get("name") or ""
+        if parent_run_id is None:
+            self._open(run_id, None, "graph", "graph")
+        elif metadata.get("langgraph_node") == name and any(t.startswith("graph:step:") for t in tags or ()):
+            self._open(run_id, parent_run_id, name, "node", step=metadata.get("langgraph_step"))
+        else:
+            self._parents[run_id] = parent_run_id
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs):
+        self._close(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._close(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                      inputs: Optional[dict] = None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        query = (inputs or {}).get("query", input_str)
+        self._open(run_id, parent_run_id, name, "tool", query=str(query)[:200])
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        content = str(getattr(output, "content", output))
+        try:
+            results = len(json.loads(content))
+        except (TypeError, ValueError):
+            results = None
+        self._close(run_id, result_chars=len(content), results=results)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._close(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                            metadata: Optional[dict] = None, **kwargs):
+        metadata = metadata or {}
+        node = metadata.get("llm_node") or metadata.get("langgraph_node") or "llm"
+        self._open(run_id, parent_run_id, f"llm:{node}", "llm", model=metadata.get("llm_model"),
+                   messages=sum(len(batch) for batch in messages))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        input_tokens, output_tokens = token_counts(response)
+        self._close(run_id, input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._close(run_id, error)
+
+    def record_superstep(self, state: Dict[str, Any]) -> None:
+        self.supersteps.append({
+            "step": len(self.supersteps),
+            "at_ms": self._now(),
+            "state_bytes": state_size(state),
+            "messages": len(state.get("messages") or []),
+        })
+
+    def export(self) -> Dict[str, Any]:
+        spans = list(self.spans.values())
+        now = self._now()
+        for span in spans:
+            # Spans cut off by a deadline never closed
+            if span["end_ms"] is None:
+                span["end_ms"] = now
+                span["attrs"]["unfinished"] = True
+            span["duration_ms"] = round(span["end_ms"] - span["start_ms"], 3)
+            span["critical"] = False
+
+        children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        for span in spans:
+            children.setdefault(span["parent_id"], []).append(span)
+        def mark_critical(level: List[Dict[str, Any]]) -> None:
+            # Walk back from the child that finished last, each time to the one that finished
+            # latest before it started; with parallel children only the slowest one is on the path
+            candidates = level
+            while candidates:
+                span = max(candidates, key=lambda s: s["end_ms"])
+                span["critical"] = True
+                mark_critical(children.get(span["id"], []))
+                # Strictly before, so a zero-length span (or a sibling ending as it starts) can't be picked again
+                candidates = [s for s in level if s is not span and s["end_ms"] < span["start_ms"]]
+
+        mark_critical(children.get(None, []))
+
+        spans.sort(key=lambda s: s["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "duration_ms": max((s["end_ms"] for s in spans), default=0.0),
+            "spans": spans,
+            "supersteps": self.supersteps,
+        }
+
+
+class TraceStore:
+    """The most recent finished traces, by id"""
+
+    def __init__(self, max_entries: int = 100):
+        self.max_entries = max_entries
+        self._traces: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def put(self, trace: Dict[str, Any]) -> None:
+        self._traces[trace["trace_id"]] = trace
+        while len(self._traces) > self.max_entries:
+            self._traces.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        return self._traces.get(trace_id)
+
+
+trace_store = TraceStore(int(os.getenv("TRACE_STORE_SIZE", 100)))
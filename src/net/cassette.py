@@ -0,0 +1,148 @@
+# cassette.py
+"""
+Record / replay of OpenAI, Groq and Exa calls.
+
+CASSETTE_MODE=record  every LLM runnable call (from `registry.llm_for`) and every Exa search
+                      goes to the live API as usual, and the request / response pair is appended
+                      to the cassette (gzipped JSON lines at CASSETTE_PATH).
+CASSETTE_MODE=replay  the same calls are answered from the cassette only; no API keys or network
+                      are needed, and a call that was never recorded raises `CassetteMiss`.
+                      CASSETTE_LATENCY injects a delay per call so timings stay realistic:
+                      "none", "recorded", "fixed:<ms>", "uniform:<lo_ms>,<hi_ms>" or
+                      "lognormal:<median_ms>,<sigma>", seeded by CASSETTE_SEED.
+
+While a cassette is active (either mode) the Exa disk cache, the specs semantic cache and the
+product catalog are off, so no state left by earlier runs decides which calls a run makes: a
+recording captures every call, and a replay needs nothing but the cassette.
+
+Calls are keyed by what determines their answer: node, model, output schema / tools and the
+message contents for LLM calls, and the search parameters for Exa.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import math
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassettes/default.jsonl.gz")
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "recorded")
+CASSETTE_SEED = int(os.getenv("CASSETTE_SEED", 0))
+
+MODES = ("off", "record", "replay")
+
+
+class CassetteMiss(KeyError):
+    """Replay mode got a call that is not on the cassette"""
+
+
+class LatencyModel:
+    """Delay (seconds) injected in front of each replayed call"""
+
+    def __init__(self, spec: str = "recorded", seed: int = 0):
+        self.kind, _, args = spec.strip().lower().partition(":")
+        self.args = [float(a) for a in args.split(",") if a]
+        if self.kind not in ("none", "recorded", "fixed", "uniform", "lognormal"):
+            raise ValueError(f"unknown CASSETTE_LATENCY {spec!r}")
+        self.rng = random.Random(seed)
+
+    def sample(self, recorded_ms: float) -> float:
+        if self.kind == "none":
+            return 0.0
+        if self.kind == "recorded":
+            return recorded_ms / 1000
+        if self.kind == "fixed":
+            return self.args[0] / 1000
+        if self.kind == "uniform":
+            return self.rng.uniform(self.args[0], self.args[1]) / 1000
+        median_ms, sigma = self.args
+        return self.rng.lognormvariate(math.log(median_ms), sigma) / 1000
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str = "off", latency: Optional[LatencyModel] = None):
+        if mode not in MODES:
+            raise ValueError(f"CASSETTE_MODE must be one of {', '.join(MODES)}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency or LatencyModel()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._counters = {"replayed": 0, "recorded": 0, "misses": 0}
+
+    @property
+    def active(self) -> bool:
+        return self.mode != "off"
+
+    @staticmethod
+    def make_key(request: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        # Re-recorded calls are appended; the last one wins
+                        self._entries[entry["key"]] = entry
+        return self._entries
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Each append adds a gzip member; gzip.open reads them back as one stream
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+        self._load()[entry["key"]] = entry
+
+    async def call(
+        self,
+        kind: str,
+        request: Dict[str, Any],
+        live: Callable[[], Awaitable[Any]],
+        encode: Callable[[Any], Any] = lambda value: value,
+        decode: Callable[[Any], Any] = lambda value: value,
+    ) -> Any:
+        """Runs `live()` (recording it in record mode) or answers from the cassette in replay mode"""
+        if self.mode == "off":
+            return await live()
+
+        key = self.make_key({"kind": kind, **request})
+        if self.mode == "replay":
+            entry = self._load().get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                raise CassetteMiss(f"{kind} call not on cassette {self.path}: {json.dumps(request, default=str)[:200]}")
+            self._counters["replayed"] += 1
+            delay = self.latency.sample(entry.get("latency_ms", 0.0))
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return decode(entry["response"])
+
+        started = time.perf_counter()
+        value = await live()
+        self._append({
+            "key": key,
+            "kind": kind,
+            "request": request,
+            "response": encode(value),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+        self._counters["recorded"] += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "entries": len(self._entries) if self._entries is not None else None,
+            **self._counters,
+        }
+
+
+cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE, LatencyModel(CASSETTE_LATENCY, CASSETTE_SEED))
@@ -0,0 +1,206 @@
+# http_pool.py
+"""
+Process-wide keep-alive HTTP connection pool.
+
+Exa, OpenAI and Groq all send their requests through one `httpx` transport, so connections
+(DNS + TCP + TLS) are opened once and reused across tool calls, nodes and requests.
+
+- Pool size, keep-alive and per-host limits come from HTTP_* env vars.
+- HTTP/2 is used when the optional `h2` package is installed (`pip install httpx[http2]`).
+- httpx connections belong to the event loop that opened them, so the transport keeps one
+  inner pool per running loop; one `AsyncClient` can then be shared process-wide.
+- New connections are counted through httpcore's public `trace` request extension, so the
+  statistics don't depend on the pool's internals.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import weakref
+from typing import Dict, Optional
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", 60))
+HTTP_PER_HOST_CONNECTIONS = int(os.getenv("HTTP_PER_HOST_CONNECTIONS", 20))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _HostStats:
+    __slots__ = ("requests", "errors", "in_flight", "peak_in_flight", "queued", "wait_seconds", "connections_opened")
+
+    def __init__(self):
+        self.requests = self.errors = self.in_flight = self.peak_in_flight = 0
+        self.queued = self.connections_opened = 0
+        self.wait_seconds = 0.0
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Holds the per-host slot until the response body is closed, not just until the headers arrive"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """One keep-alive pool per event loop, with a per-host concurrency limit and utilization counters"""
+
+    def __init__(self):
+        self.http2 = HTTP2_ENABLED and _http2_available()
+        if HTTP2_ENABLED and not self.http2:
+            logger.info("h2 is not installed, the shared HTTP pool uses HTTP/1.1")
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+        self._hosts: Dict[str, _HostStats] = {}
+
+    def _for_loop(self):
+        loop = asyncio.get_running_loop()
+        entry = self._loops.get(loop)
+        if entry is None:
+            # Pools of loops that have been closed (e.g. earlier asyncio.run calls) are dead weight
+            for old in [old for old in self._loops if old.is_closed()]:
+                del self._loops[old]
+            transport = httpx.AsyncHTTPTransport(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+                ),
+            )
+            entry = self._loops[loop] = (transport, {})
+        return entry
+
+    @staticmethod
+    def _traced(request: httpx.Request, stats: _HostStats) -> None:
+        """Counts the connections opened for `request`, keeping any trace callback it already had"""
+        previous = request.extensions.get("trace")
+
+        async def trace(event: str, info: dict) -> None:
+            if event == "connection.connect_tcp.complete":
+                stats.connections_opened += 1
+            if previous is not None:
+                await previous(event, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport, semaphores = self._for_loop()
+        host = request.url.host
+        stats = self._hosts.setdefault(host, _HostStats())
+        semaphore = semaphores.get(host)
+        if semaphore is None:
+            semaphore = semaphores[host] = asyncio.Semaphore(HTTP_PER_HOST_CONNECTIONS)
+
+        if semaphore.locked():
+            stats.queued += 1
+        started = time.perf_counter()
+        await semaphore.acquire()
+        stats.wait_seconds += time.perf_counter() - started
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                stats.in_flight -= 1
+                semaphore.release()
+
+        self._traced(request, stats)
+        try:
+            response = await transport.handle_async_request(request)
+        except BaseException:
+            stats.errors += 1
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        # Only the current loop's pool can be closed from here; others go away with their loops
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        entry = self._loops.pop(loop, None)
+        if entry is not None:
+            await entry[0].aclose()
+
+    def stats(self) -> Dict:
+        requests = sum(s.requests for s in self._hosts.values())
+        opened = sum(s.connections_opened for s in self._hosts.values())
+        # Requests between sending and closing their response body each hold a connection (or an HTTP/2 stream)
+        active = sum(s.in_flight for s in self._hosts.values())
+        return {
+            "http2": self.http2,
+            "limits": {
+                "max_connections": HTTP_MAX_CONNECTIONS,
+                "max_keepalive": HTTP_MAX_KEEPALIVE,
+                "keepalive_seconds": HTTP_KEEPALIVE_SECONDS,
+                "per_host_connections": HTTP_PER_HOST_CONNECTIONS,
+            },
+            "connections": {
+                "opened": opened,
+                "active": active,
+                "utilization": round(active / HTTP_MAX_CONNECTIONS, 4),
+            },
+            # Requests served per connection opened; >1 means keep-alive is paying off
+            "reuse_ratio": round(requests / opened, 2) if opened else None,
+            "hosts": {
+                host: {
+                    "requests": s.requests,
+                    "errors": s.errors,
+                    "in_flight": s.in_flight,
+                    "peak_in_flight": s.peak_in_flight,
+                    "queued": s.queued,
+                    "avg_wait_ms": round(s.wait_seconds / s.requests * 1000, 3) if s.requests else None,
+                    "connections_opened": s.connections_opened,
+                }
+                for host, s in self._hosts.items()
+            },
+        }
+
+
+_transport: Optional[PooledTransport] = None
+
+
+def shared_transport() -> PooledTransport:
+    global _transport
+    if _transport is None:
+        _transport = PooledTransport()
+    return _transport
+
+
+def async_client(**kwargs) -> httpx.AsyncClient:
+    """An AsyncClient on the shared pool; kwargs (base_url, headers, timeout...) are per client"""
+    return httpx.AsyncClient(transport=shared_transport(), **kwargs)
+
+
+def pool_stats() -> Dict:
+    return shared_transport().stats() if _transport is not None else {"connections": {"opened": 0, "active": 0}, "hosts": {}}
@@ -0,0 +1,27 @@
+# catalog_search.py
+"""
+Serves the product list from the local product catalog when it has enough fresh matches for
+the specs, so the Exa search (and the LLM extraction after it) never runs.
+"""
+
+import asyncio
+import logging
+from src.graph.state import AgentState, Product
+from src.catalog.product_catalog import catalog
+from src.nodes.specs_agent import specs_cache
+
+logger = logging.getLogger(__name__)
+
+
+async def catalog_search(state: AgentState):
+    """Product list from the catalog, or only the `catalog_checked` flag so the router searches"""
+    currency = state.get("currency", "USD")
+    # SQLite and the vector index (embedding the use cases) run in a worker thread
+    products = await asyncio.to_thread(catalog.search, state["product_specs"], currency)
+    if not products:
+        return {"catalog_checked": True}
+
+    logger.info("served %d products from the catalog", len(products))
+    product_list = Product(products=products)
+    specs_cache.update(state["user_query"], currency, product_list=product_list)
+    return {"catalog_checked": True, "product_list": product_list}
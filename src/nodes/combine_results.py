@@ -1,13 +1,25 @@
 #Combine_results.py
 
-from typing import cast
+from typing import Dict, List, Optional, cast
 from src.graph.state import AgentState, ProductSpecs, Product, Recommendation
-from src.llm.llm_openai import llm_openai
+from src.llm import registry
+from src.graph import budget
+from src.nodes.prerank import PRERANK_ENABLED, PRERANK_TOP_K, prerank
 from langchain_core.messages import SystemMessage, HumanMessage
 
 
-# LLM configured to output `Recommendation` model
-llm_reco_structured = llm_openai.with_structured_output(Recommendation)
+# How to judge the shortlist; shared with the fused extract_and_recommend node
+RECOMMENDATION_GUIDELINES = (
+    "Your job:\n"
+    "- Compare the products strictly against the user's specs\n"
+    "- Prioritize fit to use-cases and key requirements first, then price, then ratings\n"
+    "- Select the top 1–3 products\n"
+    "- Explain *why* they match the user’s needs\n"
+    "- Mention trade-offs when relevant\n"
+    "- End with a clear final recommendation and optional alternatives.\n"
+    "Respond in concise markdown."
+)
+SHORT_RECOMMENDATION = "\nTime is short: recommend a single product and keep every field to one sentence."
 
 # First we need to convert the dictionary in to natural language format.
 def _format_specs(specs: ProductSpecs) -> str:
@@ -16,11 +28,16 @@ def _format_specs(specs: ProductSpecs) -> str:
         f"Max price: {specs.get('max_price')}\n"
         f"Min price: {specs.get('min_price')}\n"
         f"Brand preferences: {', '.join(specs.get('brand_preferences', []))}\n"
+        f"Excluded brands: {', '.join(specs.get('excluded_brands') or [])}\n"
         f"Use cases: {', '.join(specs.get('use_cases', []))}\n"
         f"Key requirements: {', '.join(specs.get('key_requirements', []))}"
     )
 
-def _format_products(product_list: Product) -> str:
+def _format_scores(scores: Dict[str, float]) -> str:
+    components = ", ".join(f"{name.replace('_', ' ')} {value}" for name, value in scores.items() if name != "total")
+    return f"   - pre-rank score: {scores['total']} ({components})\n"
+
+def _format_products(product_list: Product, scores: Optional[List[Dict[str, float]]] = None) -> str:
     """
     Turn the structured Product list into a readable text block
     that the LLM can reason over.
@@ -44,12 +61,13 @@ def _format_products(product_list: Product) -> str:
             f"   - review pros: {', '.join(pros) if pros else 'N/A'}\n"
             f"   - review cons: {', '.join(cons) if cons else 'N/A'}\n"
             f"   - overall sentiment: {overall or 'N/A'}\n"
+            + (_format_scores(scores[idx - 1]) if scores else "")
         )
 
     return "\n".join(lines)
 
 
-def comb_results(state: AgentState) -> AgentState:
+async def comb_results(state: AgentState) -> AgentState:
     """
     Combine extracted specs + product list into a final recommendation
     text stored in state["final_recommendation"].
@@ -64,23 +82,36 @@ def comb_results(state: AgentState) -> AgentState:
     if not specs or not product_list or not getattr(product_list, "products", []):
         return state
 
+    if budget.below(state, budget.RECOMMENDATION_SECONDS):
+        state["degraded"] = budget.degrade(state, "recommendation_skipped")
+        return state
+
+    # Low on time: fewer candidates in, a single short pick out
+    short = budget.below(state, budget.FULL_RECOMMENDATION_SECONDS)
+    if short:
+        state["degraded"] = budget.degrade(state, "recommendation_shortened")
+    top_k = min(PRERANK_TOP_K, 3) if short else PRERANK_TOP_K
+
+    # Only the best pre-ranked candidates reach the prompt; the response still lists them all
+    scores = None
+    if PRERANK_ENABLED:
+        product_list, scores = prerank(product_list, specs, top_k)
+    elif short:
+        product_list = product_list.model_copy(update={"products": product_list.products[:3]})
+
     specs_text = _format_specs(specs)
-    products_text = _format_products(product_list)
+    products_text = _format_products(product_list, scores)
 
     system_prompt = SystemMessage(
         content=(
             "You are an expert product recommendation assistant.\n"
             "You are given:\n"
             "1) The user's desired specifications\n"
-            "2) A shortlist of candidate products with price, rating, snippet, and review summaries\n\n"
-            "Your job:\n"
-            "- Compare the products strictly against the user's specs\n"
-            "- Prioritize fit to use-cases and key requirements first, then price, then ratings\n"
-            "- Select the top 1–3 products\n"
-            "- Explain *why* they match the user’s needs\n"
-            "- Mention trade-offs when relevant\n"
-            "- End with a clear final recommendation and optional alternatives.\n"
-            "Respond in concise markdown."
+            "2) A shortlist of candidate products with price, rating, snippet, and review summaries\n"
+            + ("   (ordered by a deterministic pre-rank score in [0, 1] over price fit, rating, brand, requirements and sentiment; use it as a hint, not a verdict)\n" if scores else "")
+            + "\n"
+            + RECOMMENDATION_GUIDELINES
+            + (SHORT_RECOMMENDATION if short else "")
         )
     )
 
@@ -96,7 +127,7 @@ def comb_results(state: AgentState) -> AgentState:
         )
     )
 
-    response = llm_reco_structured.invoke([system_prompt, human_message])
+    response = await registry.llm_for("comb_results", state, schema=Recommendation).ainvoke([system_prompt, human_message])
 
     state["final_recommendation"] = response
     return state
\ No newline at end of file
@@ -0,0 +1,136 @@
+# fanout_search.py
+"""
+Fan-out search: one planning call derives several diverse queries from the specs,
+they run concurrently against Exa, and the merged results go through a single
+product_list extraction. N searches cost one LLM round trip instead of N.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from src.graph.state import AgentState, SearchPlan
+from src.llm import registry
+from src.nodes.combine_results import _format_specs
+from src.nodes.search_agent import product_list
+from src.tools.exa_tool import exa_tool
+from src.tools.dedupe import DEDUPE_ENABLED, dedupe_records
+from src.graph import budget
+from langchain_core.messages import SystemMessage, HumanMessage
+from langgraph.graph import START, StateGraph, END
+
+FANOUT_QUERIES = int(os.getenv("FANOUT_QUERIES", 4))
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", 4))
+
+logger = logging.getLogger(__name__)
+
+# Planned queries run, and how many of them (or whole fan-outs) failed, for /search/stats
+fanout_stats = {"queries": 0, "failed_queries": 0, "failed_fanouts": 0}
+
+
+def _currency(state: AgentState) -> str:
+    return state.get("currency", os.getenv("CURRENCY", "USD"))
+
+
+async def plan_searches(state: AgentState):
+    """Derive a set of diverse web search queries from the specs in one call"""
+    state["step"] = "product_search"
+    started_at = time.time()
+    specs = state["product_specs"]
+
+    # Low on time: skip the planning call and search once with the specs themselves
+    if budget.below(state, budget.REDUCED_SEARCH_SECONDS):
+        query = " ".join(
+            [specs.get("category") or ""] + list(specs.get("brand_preferences") or [])
+            + list(specs.get("key_requirements") or [])
+            + ([f"under {specs['max_price']:g} {_currency(state)}"] if specs.get("max_price") else [])
+        ).strip()
+        return {
+            "search_queries": [query],
+            "search_started_at": started_at,
+            "degraded": budget.degrade(state, "search_reduced"),
+        }
+
+    system_prompt = SystemMessage(content=
+        f"You plan web searches for a product research agent. Write {FANOUT_QUERIES} diverse search queries "
+        "that together find concrete, purchasable products matching the specifications: mix retailer listings, "
+        "'best ... under ...' roundups, review sites and the preferred brands; never target an excluded brand. "
+        f"Prices are in {_currency(state)}. Each query must stand on its own."
+    )
+    human_message = HumanMessage(content=_format_specs(specs))
+    plan = await registry.llm_for("plan_searches", state, schema=SearchPlan).ainvoke([system_prompt, human_message])
+
+    # De-duplicate and cap, the model sometimes repeats itself or over-delivers
+    queries = list(dict.fromkeys(q.strip() for q in plan.queries if q.strip()))[:FANOUT_QUERIES]
+    return {"search_queries": queries, "search_started_at": started_at}
+
+
+async def fanout(state: AgentState):
+    """Run every planned query concurrently (bounded) and merge the results into one extraction prompt"""
+    semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+
+    async def run(query: str):
+        async with semaphore:
+            fanout_stats["queries"] += 1
+            try:
+                return await exa_tool.ainvoke({"query": query, "state": state})
+            except Exception:
+                # One failed search shouldn't sink the others
+                logger.exception("fan-out search failed for %r", query)
+                fanout_stats["failed_queries"] += 1
+                return None
+
+    outputs = await asyncio.gather(*(run(q) for q in state.get("search_queries", [])))
+    update = {}
+    if outputs and all(output is None for output in outputs):
+        # Nothing came back at all: that's an outage, not "no matching products"
+        fanout_stats["failed_fanouts"] += 1
+        update["degraded"] = budget.degrade(state, "search_failed")
+
+    results, seen_urls = [], set()
+    for output in outputs:
+        try:
+            records = json.loads(output)
+        except (TypeError, ValueError):
+            continue
+        for record in records:
+            url = record.get("url")
+            if url in seen_urls:
+                continue
+            seen_urls.add(url)
+            results.append(record)
+    if DEDUPE_ENABLED:
+        # The same product is usually found by several of the queries, under different URLs and titles
+        results = dedupe_records(results, "fanout")
+
+    system_prompt = SystemMessage(content=
+        "You are given web search results for a product search. "
+        f"Pick the 5 products that best match the user's specifications, none from an excluded brand. "
+        f"Currency must be in {_currency(state)}. "
+        "Only use products, prices and URLs that appear in the search results."
+    )
+    human_message = HumanMessage(content=(
+        f"{_format_specs(state['product_specs'])}\n\n"
+        "Search results:\n"
+        f"{json.dumps(results, ensure_ascii=False, separators=(',', ':'))}"
+    ))
+    return {**update, "messages": [system_prompt, human_message]}
+
+
+def build_fanout_graph(extract_node=product_list, extract_name="product_list"):
+    """plan_searches -> fanout -> `extract_node` (product_list, or the fused extract_and_recommend)"""
+    graph = StateGraph(AgentState)
+
+    graph.add_node("plan_searches", plan_searches)
+    graph.add_node("fanout", fanout)
+    graph.add_node(extract_name, extract_node)
+
+    graph.add_edge(START, "plan_searches")
+    graph.add_edge("plan_searches", "fanout")
+    graph.add_edge("fanout", extract_name)
+    graph.add_edge(extract_name, END)
+
+    return graph.compile()
+
+app = build_fanout_graph()
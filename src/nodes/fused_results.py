@@ -0,0 +1,48 @@
+# fused_results.py
+"""
+Fused product extraction + recommendation.
+
+product_list and comb_results both read essentially the same product information, so
+this node produces the `Product` list and the `Recommendation` in a single structured
+call over the search transcript, saving one full LLM round trip.
+"""
+
+from src.graph.state import AgentState, Product, ProductsWithRecommendation
+from src.llm import registry
+from src.nodes.combine_results import RECOMMENDATION_GUIDELINES, SHORT_RECOMMENDATION, _format_specs
+from src.nodes.search_agent import search_result
+from src.graph import budget
+from src.tools.dedupe import DEDUPE_ENABLED, dedupe_tool_messages
+from langchain_core.messages import HumanMessage
+
+
+async def extract_and_recommend(state: AgentState):
+    """Extract up to 5 products from the search transcript and recommend among them"""
+    messages = state.get("messages") or []
+    if not messages or budget.below(state, budget.PRODUCT_LIST_SECONDS):
+        return {
+            "product_list": Product(products=[]),
+            "degraded": budget.degrade(state, "product_list_skipped"),
+        }
+
+    update = {}
+    short = budget.below(state, budget.FULL_RECOMMENDATION_SECONDS)
+    if short:
+        update["degraded"] = budget.degrade(state, "recommendation_shortened")
+
+    instructions = HumanMessage(content=(
+        "Using only the search results above:\n"
+        "1) Extract up to 5 products that match the specifications below into `products`.\n"
+        "2) Fill `recommendation` by comparing those products.\n\n"
+        f"{RECOMMENDATION_GUIDELINES}{SHORT_RECOMMENDATION if short else ''}\n\n"
+        "User specifications:\n"
+        f"{_format_specs(state['product_specs'])}"
+    ))
+    if DEDUPE_ENABLED:
+        messages = dedupe_tool_messages(messages)
+    response = await registry.llm_for("extract_and_recommend", state, schema=ProductsWithRecommendation).ainvoke(messages + [instructions])
+
+    update.update(await search_result(state, Product(products=response.products)))
+    if response.products:
+        update["final_recommendation"] = response.recommendation
+    return update
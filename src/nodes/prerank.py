@@ -0,0 +1,130 @@
+# prerank.py
+"""
+Deterministic pre-ranking of candidate products before comb_results.
+
+Every candidate gets five component scores in [0, 1], computed as NumPy arrays over the whole
+list at once, and a weighted total. comb_results only sends the best `PRERANK_TOP_K` to the LLM,
+with their scores, so the prompt stays small however many candidates the search produced.
+"""
+
+import os
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.graph.state import Product, Product_info, ProductSpecs
+from src.nodes.spec_rules import brand_of
+
+PRERANK_ENABLED = os.getenv("PRERANK_ENABLED", "true").lower() == "true"
+PRERANK_TOP_K = int(os.getenv("PRERANK_TOP_K", 4))
+
+COMPONENTS = ("price_fit", "rating", "brand", "requirements", "sentiment")
+WEIGHTS = np.array([0.3, 0.2, 0.15, 0.25, 0.1], dtype=np.float64)
+
+# Ratings are shrunk towards this prior as if it came from this many extra ratings,
+# so 5.0 from 3 ratings doesn't beat 4.6 from 2,000
+RATING_PRIOR = 3.5
+RATING_PRIOR_COUNT = 20
+_SENTIMENT = {"positive": 1.0, "neutral": 0.5, "negative": 0.0}
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _price_fit(prices: np.ndarray, low, high) -> np.ndarray:
+    """1 inside [low, high], falling linearly to 0 at 100% outside the range"""
+    fit = np.ones_like(prices)
+    if high:
+        fit = np.minimum(fit, 1.0 - np.clip((prices - high) / high, 0.0, 1.0))
+    if low:
+        fit = np.minimum(fit, 1.0 - np.clip((low - prices) / low, 0.0, 1.0))
+    # A missing price can't be judged either way
+    return np.where(prices > 0, fit, 0.5)
+
+
+def _requirement_overlap(texts: List[str], terms: List[str]) -> np.ndarray:
+    """Mean over terms of the share of each term's words that appear in a product's text"""
+    term_words = [set(_WORD.findall(term.lower())) for term in terms]
+    term_words = [words for words in term_words if words]
+    if not term_words:
+        return np.zeros(len(texts))
+    vocabulary = sorted(set().union(*term_words))
+    column = {word: i for i, word in enumerate(vocabulary)}
+    present = np.zeros((len(texts), len(vocabulary)), dtype=np.float64)
+    for row, text in enumerate(texts):
+        for word in set(_WORD.findall(text.lower())) & column.keys():
+            present[row, column[word]] = 1.0
+    # (terms x vocabulary) membership, each row averaging over the term's words
+    membership = np.zeros((len(term_words), len(vocabulary)), dtype=np.float64)
+    for row, words in enumerate(term_words):
+        membership[row, [column[w] for w in words]] = 1.0 / len(words)
+    return (present @ membership.T).mean(axis=1)
+
+
+def _of_brands(products: List[Product_info], brands: List[str]) -> np.ndarray:
+    """Whether each product is of one of `brands`: same lexicon brand, or the brand named as a whole word"""
+    wanted = {(brand_of(b) or b.strip()).lower() for b in brands if b.strip()}
+    if not wanted:
+        return np.zeros(len(products), dtype=bool)
+    # Brands the lexicon doesn't know ("Framework") can still appear in the name
+    named = re.compile(r"(?<![a-z0-9])(?:" + "|".join(map(re.escape, wanted)) + r")(?![a-z0-9])")
+    return np.array([
+        (brand_of(p.name) or "").lower() in wanted or bool(named.search(p.name.lower()))
+        for p in products
+    ], dtype=bool)
+
+
+def _brand_match(products: List[Product_info], preferences: List[str], excluded: List[str]) -> np.ndarray:
+    """
+    1 for products of a preferred brand (or, with only exclusions, of any other brand), 0 for the rest
+    and always 0 for an excluded brand
+    """
+    if any(b.strip() for b in preferences):
+        score = _of_brands(products, preferences).astype(np.float64)
+    else:
+        score = np.full(len(products), float(any(b.strip() for b in excluded)))
+    return np.where(_of_brands(products, excluded), 0.0, score)
+
+
+def score_products(product_list: Product, specs: ProductSpecs) -> np.ndarray:
+    """(products x COMPONENTS) matrix of component scores"""
+    products = product_list.products
+    prices = np.array([p.price or 0.0 for p in products], dtype=np.float64)
+    ratings = np.array([p.rating if p.rating is not None else np.nan for p in products], dtype=np.float64)
+    counts = np.array([p.rating_count or 0 for p in products], dtype=np.float64)
+    counts = np.where(np.isnan(ratings), 0.0, counts)
+    ratings = np.nan_to_num(ratings, nan=RATING_PRIOR)
+
+    rating = (ratings * counts + RATING_PRIOR * RATING_PRIOR_COUNT) / (counts + RATING_PRIOR_COUNT) / 5.0
+
+    brand = _brand_match(products, specs.get("brand_preferences") or [], specs.get("excluded_brands") or [])
+
+    texts = [
+        " ".join([p.name, p.snippet or "", *(p.review or {}).get("pros", [])])
+        for p in products
+    ]
+    requirements = _requirement_overlap(texts, [*(specs.get("use_cases") or []), *(specs.get("key_requirements") or [])])
+
+    sentiment = np.array([_SENTIMENT.get((p.review or {}).get("overall_sentiment"), 0.5) for p in products])
+
+    return np.column_stack([
+        _price_fit(prices, specs.get("min_price"), specs.get("max_price")),
+        np.clip(rating, 0.0, 1.0),
+        brand,
+        requirements,
+        sentiment,
+    ])
+
+
+def prerank(product_list: Product, specs: ProductSpecs, k: int) -> Tuple[Product, List[Dict[str, float]]]:
+    """The best `k` products, best first, and their scores (`total` plus each component)"""
+    if not product_list.products:
+        return product_list, []
+    components = score_products(product_list, specs)
+    totals = components @ WEIGHTS
+    # Stable, so equally scored products keep the search's order
+    order = np.argsort(-totals, kind="stable")[:k]
+    scores = [
+        {"total": round(float(totals[i]), 3), **{name: round(float(v), 3) for name, v in zip(COMPONENTS, components[i])}}
+        for i in order
+    ]
+    return product_list.model_copy(update={"products": [product_list.products[i] for i in order]}), scores
@@ -0,0 +1,184 @@
+# refine.py
+"""
+Follow-up refinement for sessions.
+
+A follow-up ("cheaper", "only Lenovo", "show more gaming ones") arrives as `follow_up` on top of
+the checkpointed state of the previous turn. This node works out which constraints it changes
+(with the rule-based spec parser, no LLM call) and resets only the stages those invalidate:
+
+- price / brand only: the existing product list is re-filtered and only comb_results runs again;
+- category, use cases, requirements, or asking for more / other products: the search runs again
+  with the updated specs (from the product catalog when it has enough matches, except for "other
+  products"; Exa results are still served from the Exa cache where queries repeat);
+- nothing the parser understands: the specs are extracted again from the combined query.
+"""
+
+import os
+import re
+from typing import List, Optional
+from langchain_core.messages import RemoveMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from src.graph.state import AgentState, Product, ProductSpecs
+from src.nodes.spec_rules import BRAND_LEXICON, parse_specs
+
+# "cheaper" without a number lowers the price ceiling by this factor
+CHEAPER_FACTOR = float(os.getenv("REFINE_CHEAPER_FACTOR", 0.8))
+
+_CHEAPER = re.compile(r"\b(cheaper|less expensive|lower (?:price|budget)|more affordable|budget options?)\b", re.IGNORECASE)
+_PRICIER = re.compile(r"\b(more expensive|pricier|costlier|premium|high(?:er)?[ -]end)\b", re.IGNORECASE)
+# Asking for products the previous search didn't return
+_MORE = re.compile(r"\b(more|other|others|different|alternatives?|else)\b", re.IGNORECASE)
+
+
+def search_reset() -> dict:
+    """State update that discards the search stage's outputs, so the router runs the search again"""
+    return {
+        "product_list": None,
+        # The next search starts a fresh ReAct conversation
+        "messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES)],
+        "search_queries": [],
+        "search_started_at": None,
+        "search_seconds": None,
+        "catalog_checked": None,
+    }
+
+
+def _price_ceiling(specs: ProductSpecs, products: Optional[Product]) -> Optional[float]:
+    if specs.get("max_price"):
+        return specs["max_price"]
+    prices = [p.price for p in (products.products if products else []) if p.price]
+    return max(prices) if prices else None
+
+
+def _brand_pattern(brands: List[str]) -> Optional[re.Pattern]:
+    """Whole-word match of any lexicon alias of `brands` ("Lenovo" -> lenovo, thinkpad)"""
+    aliases = [
+        alias for brand in brands
+        for alias in ([a for a, canonical in BRAND_LEXICON.items() if canonical == brand] or [brand.lower()])
+    ]
+    if not aliases:
+        return None
+    return re.compile(r"(?<![a-z0-9])(?:" + "|".join(map(re.escape, aliases)) + r")(?![a-z0-9])", re.IGNORECASE)
+
+
+def _filter_products(products: Product, specs: ProductSpecs, by_brand: bool) -> Product:
+    low, high = specs.get("min_price"), specs.get("max_price")
+    # Brand preferences only become a filter when the follow-up named brands ("only Lenovo")
+    preferred = _brand_pattern(specs.get("brand_preferences") or []) if by_brand else None
+    # ... and brands ruled out ("not Lenovo") are dropped either way
+    ruled_out = _brand_pattern(specs.get("excluded_brands") or [])
+    kept = [
+        p for p in products.products
+        if (low is None or p.price >= low)
+        and (high is None or p.price <= high)
+        and (preferred is None or preferred.search(p.name))
+        and (ruled_out is None or not ruled_out.search(p.name))
+    ]
+    return products.model_copy(update={"products": kept})
+
+
+def plan_refinement(specs: ProductSpecs, products: Optional[Product], follow_up: str) -> tuple:
+    """
+    (updated specs, changed fields, action, excluded brands) where action is "recommend", "search"
+    or "extract"
+    """
+    parsed = parse_specs(follow_up)
+    updated = dict(specs)
+    changed = []
+
+    if "min_price" in parsed.found or "max_price" in parsed.found:
+        for field in ("min_price", "max_price"):
+            if field in parsed.found:
+                updated[field] = parsed.specs[field]
+        changed.append("price")
+    elif _CHEAPER.search(follow_up):
+        ceiling = _price_ceiling(specs, products)
+        if ceiling:
+            updated["max_price"] = round(ceiling * CHEAPER_FACTOR, 2)
+            changed.append("price")
+    elif _PRICIER.search(follow_up):
+        ceiling = _price_ceiling(specs, products)
+        if ceiling:
+            # Everything in the current list sits at or below the new floor, so this needs a new search
+            updated["min_price"], updated["max_price"] = ceiling, None
+            changed.append("price_floor")
+
+    if "brand_preferences" in parsed.found:
+        # "only Lenovo" / "Dell instead": the follow-up's brands replace the previous ones
+        updated["brand_preferences"] = parsed.specs["brand_preferences"]
+        changed.append("brands")
+    elif parsed.excluded_brands:
+        # "not Lenovo": the other preferred brands stay
+        updated["brand_preferences"] = [
+            b for b in specs.get("brand_preferences") or [] if b not in parsed.excluded_brands
+        ]
+        changed.append("brands")
+    excluded = parsed.excluded_brands
+    if "brand_preferences" in parsed.found or excluded:
+        # A brand asked for again is no longer ruled out
+        updated["excluded_brands"] = [
+            b for b in dict.fromkeys(list(specs.get("excluded_brands") or []) + excluded)
+            if b not in parsed.specs["brand_preferences"]
+        ]
+
+    if "category" in parsed.found and parsed.specs["category"] != specs.get("category"):
+        updated["category"] = parsed.specs["category"]
+        changed.append("category")
+    for field in ("use_cases", "key_requirements"):
+        new = [v for v in parsed.specs[field] if v not in (specs.get(field) or [])]
+        if new:
+            updated[field] = list(specs.get(field) or []) + new
+            changed.append(field)
+
+    # "more affordable" / "more expensive" are price changes, not a request for other products
+    more = bool(_MORE.search(_PRICIER.sub("", _CHEAPER.sub("", follow_up))))
+    if parsed.negated:
+        # "without touchscreen" has no field of its own; the LLM words it into the specs
+        return updated, changed, "extract", excluded
+    if not changed:
+        # "show me other ones" still means a new search; anything else is beyond the parser
+        return (updated, ["results"], "search", excluded) if more else (updated, [], "extract", excluded)
+    if set(changed) <= {"price", "brands"} and not more:
+        return updated, changed, "recommend", excluded
+    return updated, changed, "search", excluded
+
+
+async def refine(state: AgentState):
+    """Apply `follow_up` to the previous turn's state, resetting what it invalidates"""
+    follow_up = state["follow_up"]
+    previous = state.get("product_list")
+    specs, changed, action, excluded = plan_refinement(state.get("product_specs") or {}, previous, follow_up)
+
+    update = {
+        "follow_up": None,
+        # Keys caches by the whole conversation, so a refined product list never lands on the original query
+        "user_query": f"{state['user_query']}; {follow_up}",
+        "product_specs": specs,
+        "final_recommendation": None,
+    }
+
+    if action == "recommend" and previous is not None:
+        filtered = _filter_products(previous, specs, by_brand="brands" in changed)
+        if filtered.products:
+            update["product_list"] = filtered
+        else:
+            # Nothing in the list fits any more
+            action = "search"
+
+    if action != "recommend":
+        update.update(search_reset())
+    if changed == ["results"]:
+        # The catalog would only offer the same products again
+        update["catalog_checked"] = True
+    if action == "extract":
+        update["product_specs"] = None
+
+    update["refinement"] = {
+        "follow_up": follow_up,
+        "changed": changed,
+        "action": action,
+        "excluded_brands": excluded,
+        "products_before": len(previous.products) if previous else 0,
+        "products_kept": len(update["product_list"].products) if update.get("product_list") else 0,
+    }
+    return update
@@ -1,5 +1,7 @@
 # src/nodes/router.py
 from src.graph.state import AgentState
+from src.graph.budget import below
+from src.catalog.product_catalog import CATALOG_ENABLED
 
 def router_node(state: AgentState) -> AgentState:
     """
@@ -11,7 +13,9 @@ def router_node(state: AgentState) -> AgentState:
     """
     # Example: you might track that routing happened
     # state["step"] = state.get("step", "routing")
-    return state
+    # No changes: echoing the state back would re-announce a session's previous products and
+    # recommendation to stream consumers before a follow-up has even been applied
+    return {}
 
 def router_steps(state: AgentState)-> AgentState:
     """
@@ -22,16 +26,30 @@ def router_steps(state: AgentState)-> AgentState:
     #       "has_products:", bool(state.get("product_list")),
     #       "has_final:", bool(state.get("final_recommendation")))
     
+    # Out of time: return whatever exists so far
+    if below(state, 0):
+        return "__end__"
+
+    # A follow-up in a session first decides which of the stages below have to run again
+    # (a stage it invalidates has its output reset to None)
+    if state.get("follow_up"):
+        return "refine"
+
     #step 1: Extracting the Specs from the suer query
-    if "product_specs" not in state:
+    if state.get("product_specs") is None:
         return "specs_agent"
     
     #step 2: Now we have the product specifications, we have to proceed to the search agent
-    if "product_list" not in state:
+    if state.get("product_list") is None:
+        # Products extracted by earlier searches are served from the local catalog when enough match
+        if CATALOG_ENABLED and not state.get("catalog_checked"):
+            return "catalog_search"
+        if state.get("search_mode") == "fanout":
+            return "fanout_search"
         return "search_agent"
     
     #step 3: Now we have the procucts list, lets combine and give the final reccomndadyions
-    if "final_recommendation" not in state:
+    if state.get("final_recommendation") is None:
         return "comb_results"
     
     # Finally when all the steps are done we can end thge Graph
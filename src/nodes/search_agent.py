@@ -1,30 +1,65 @@
 # Search Agent .py
 
+import asyncio
 import os
+import time
 from src.graph.state import AgentState, Product
-from src.llm.llm_openai import llm_openai
+from src.llm import registry
 from langchain_core.messages import SystemMessage, HumanMessage
 from src.tools.exa_tool import exa_tool
+from src.tools.dedupe import DEDUPE_ENABLED, dedupe_products, dedupe_tool_messages
+from src.nodes.specs_agent import specs_cache
+from src.catalog.product_catalog import CATALOG_ENABLED, catalog
+from src.graph import budget
 from langgraph.graph import START, StateGraph, END
 from langgraph.prebuilt import ToolNode, tools_condition
 
 tools =[exa_tool]
-llm_search_tool = llm_openai.bind_tools(tools)
-llm_structured_output = llm_openai.with_structured_output(Product)
 
 # For structured Output i am using the  Full Proof strategy. Using one more node to parse the output into the desired format.
-def product_list(state: AgentState):
+async def product_list(state: AgentState):
     """Parsing the product list into structured format"""
-    messages = state["messages"]
-    response = llm_structured_output.invoke(messages)
-    return {"product_list": response}
+    messages = state.get("messages") or []
+    if not messages or budget.below(state, budget.PRODUCT_LIST_SECONDS):
+        return {
+            "product_list": Product(products=[]),
+            "degraded": budget.degrade(state, "product_list_skipped"),
+        }
+    if DEDUPE_ENABLED:
+        # Products repeated across Exa calls reach the extraction once
+        messages = dedupe_tool_messages(messages)
+    response = await registry.llm_for("product_list", state, schema=Product).ainvoke(messages)
+    return await search_result(state, response)
+
+async def search_result(state: AgentState, products: Product) -> dict:
+    """State update that closes the search stage with the extracted products"""
+    if DEDUPE_ENABLED:
+        products = dedupe_products(products)
+    # Attach the products to the cached specs so near-duplicate queries can skip the search too
+    specs_cache.update(state["user_query"], state.get("currency", "USD"), product_list=products)
+    if CATALOG_ENABLED and state.get("product_specs"):
+        # Embedding and SQLite writes, kept off the event loop
+        await asyncio.to_thread(catalog.upsert, products.products, state["product_specs"], state.get("currency", "USD"))
+    update = {"product_list": products}
+    if state.get("search_started_at") is not None:
+        update["search_seconds"] = round(time.time() - state["search_started_at"], 3)
+    return update
 
 # It will be a react agent that uses exa tool to search products based on specifications
-def search_agent(state: AgentState):
+async def search_agent(state: AgentState):
 
     state["step"] = "product_search"
+    started_at = time.time()
     spec = state["product_specs"]
     msg = state.get("messages", [])
+
+    # Low on time: no further tool turns, route_after_search jumps straight to product_list
+    if budget.below(state, budget.SEARCH_TURN_SECONDS):
+        return {
+            "search_started_at": state.get("search_started_at") or started_at,
+            "degraded": budget.degrade(state, "search_truncated"),
+        }
+
     if not msg:
         system_prompt = SystemMessage(content=
         "You are a web search agent that helps find products based on user specifications." \
@@ -39,6 +74,7 @@ def search_agent(state: AgentState):
             f"Max price: {spec['max_price']}\n"
             f"Min price: {spec['min_price']}\n"
             f"Brand preferences: {', '.join(spec['brand_preferences'])}\n"
+            f"Excluded brands: {', '.join(spec.get('excluded_brands') or [])}\n"
             f"Use cases: {', '.join(spec['use_cases'])}\n"
             f"Key requirements: {', '.join(spec['key_requirements'])}"
         ))
@@ -47,37 +83,46 @@ def search_agent(state: AgentState):
 
     # using previous messages and new instructions
     
-    response = llm_search_tool.invoke(msg)
+    response = await registry.llm_for("search_agent", state, tools=tools).ainvoke(msg)
 
-    return {"messages": msg + [response]}
+    update = {"messages": msg + [response]}
+    if state.get("search_started_at") is None:
+        update["search_started_at"] = started_at
+    return update
 
 def route_after_search(state:AgentState):
     """It will decide wheather to call tools again or proceed to product listing"""
+    if not state.get("messages"):
+        return "product_list"
     dest = tools_condition(state)
     if dest == "__end__":
         return "product_list"
     return dest
 
-graph = StateGraph(AgentState)
+def build_search_graph(extract_node=product_list, extract_name="product_list"):
+    """The ReAct search loop, ending in `extract_node` (product_list, or the fused extract_and_recommend)"""
+    graph = StateGraph(AgentState)
+
+    graph.add_node("search_agent", search_agent)
+    graph.add_node("tools", ToolNode(tools = tools))
+    graph.add_node(extract_name, extract_node)
 
-graph.add_node("search_agent", search_agent)
-graph.add_node("tools", ToolNode(tools = tools))
-graph.add_node("product_list", product_list)
+    graph.add_edge(START, "search_agent")
 
-graph.add_edge(START, "search_agent")
+    graph.add_conditional_edges(
+        "search_agent",
+         route_after_search,
+          {
+              "tools":"tools",
+              "product_list": extract_name
+          },
+            )
+    graph.add_edge("tools", "search_agent")
+    graph.add_edge(extract_name, END)
 
-graph.add_conditional_edges(
-    "search_agent",
-     route_after_search,
-      {
-          "tools":"tools",
-          "product_list": "product_list"
-      },
-        )
-graph.add_edge("tools", "search_agent")
-graph.add_edge("product_list", END)
+    return graph.compile()
 
-app = graph.compile()
+app = build_search_graph()
 
 
 # if __name__ == "__main__":
@@ -95,7 +140,7 @@ app = graph.compile()
 #     }
 
 
-#     result = app.invoke(test_state)
+#     result = asyncio.run(app.ainvoke(test_state))
 
 #     print("Structured Output:\n", result["product_list"])
 
@@ -0,0 +1,369 @@
+# spec_rules.py
+"""
+Rule-based specification extraction.
+
+Most queries state their constraints in plain text ("under 20000rs", "Dell or Lenovo",
+"for gaming"), so a local parser can fill `ProductSpecs` without an LLM round trip.
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from src.graph.state import ProductSpecs
+
+# ---- Lexicons (alias -> canonical). Longer aliases win over shorter ones. ----
+BRAND_LEXICON: Dict[str, str] = {
+    # Computers / electronics
+    "dell": "Dell", "alienware": "Dell", "lenovo": "Lenovo", "thinkpad": "Lenovo", "hp": "HP",
+    "apple": "Apple", "macbook": "Apple", "iphone": "Apple", "ipad": "Apple", "asus": "Asus",
+    "rog": "Asus", "acer": "Acer", "msi": "MSI", "samsung": "Samsung", "lg": "LG",
+    "microsoft": "Microsoft", "surface": "Microsoft", "google": "Google", "pixel": "Google",
+    "oneplus": "OnePlus", "xiaomi": "Xiaomi", "redmi": "Xiaomi", "realme": "Realme",
+    "motorola": "Motorola", "nothing phone": "Nothing", "vivo": "Vivo", "oppo": "Oppo", "iqoo": "iQOO",
+    "nokia": "Nokia", "poco": "Poco", "infinix": "Infinix",
+    # Audio / peripherals
+    "sony": "Sony", "bose": "Bose", "jbl": "JBL", "sennheiser": "Sennheiser", "boat": "boAt",
+    "logitech": "Logitech", "razer": "Razer", "hyperx": "HyperX", "corsair": "Corsair",
+    "steelseries": "SteelSeries", "audio-technica": "Audio-Technica", "skullcandy": "Skullcandy",
+    "beats": "Beats", "marshall": "Marshall", "noise colorfit": "Noise", "zebronics": "Zebronics",
+    # Cameras / wearables / appliances
+    "canon": "Canon", "nikon": "Nikon", "fujifilm": "Fujifilm", "gopro": "GoPro",
+    "garmin": "Garmin", "fitbit": "Fitbit", "amazfit": "Amazfit", "philips": "Philips",
+    "panasonic": "Panasonic", "whirlpool": "Whirlpool", "bajaj": "Bajaj", "dyson": "Dyson",
+    # Vehicles / sports
+    "hero": "Hero", "honda": "Honda", "tvs": "TVS", "yamaha": "Yamaha", "royal enfield": "Royal Enfield",
+    "ktm": "KTM", "suzuki": "Suzuki", "ather": "Ather", "ola": "Ola",
+    "nike": "Nike", "adidas": "Adidas", "puma": "Puma", "asics": "Asics",
+}
+
+CATEGORY_LEXICON: Dict[str, str] = {
+    "laptop": "laptop", "laptops": "laptop", "notebook": "laptop", "macbook": "laptop", "ultrabook": "laptop",
+    "phone": "smartphone", "smartphone": "smartphone", "mobile": "smartphone", "iphone": "smartphone",
+    "tablet": "tablet", "ipad": "tablet",
+    "headphones": "headphones", "headphone": "headphones", "headset": "headset", "earbuds": "earbuds",
+    "earphones": "earphones", "tws": "earbuds", "speaker": "speaker", "soundbar": "soundbar",
+    "monitor": "monitor", "keyboard": "keyboard", "mouse": "mouse", "webcam": "webcam",
+    "tv": "television", "television": "television", "smartwatch": "smartwatch", "watch": "smartwatch",
+    "fitness band": "fitness band", "camera": "camera", "dslr": "camera", "printer": "printer",
+    "router": "router", "ssd": "ssd", "graphics card": "graphics card", "gpu": "graphics card",
+    "refrigerator": "refrigerator", "fridge": "refrigerator", "washing machine": "washing machine",
+    "air purifier": "air purifier", "vacuum cleaner": "vacuum cleaner",
+    "motorbike": "motorbike", "motorcycle": "motorbike", "bike": "motorbike", "scooter": "scooter",
+    "bicycle": "bicycle", "cycle": "bicycle", "running shoes": "running shoes", "shoes": "shoes",
+}
+
+USE_CASE_LEXICON: Dict[str, str] = {
+    "gaming": "gaming", "games": "gaming", "programming": "programming", "coding": "programming",
+    "development": "programming", "video editing": "video editing", "editing": "video editing",
+    "photo editing": "photo editing", "photography": "photography", "office": "office work",
+    "office work": "office work", "work from home": "office work", "students": "study", "student": "study",
+    "study": "study", "college": "study", "travel": "travel", "travelling": "travel", "traveling": "travel",
+    "running": "running", "gym": "workout", "workout": "workout", "music": "music", "calls": "calls",
+    "meetings": "calls", "streaming": "streaming", "commute": "commuting", "commuting": "commuting",
+    "daily commute": "commuting", "machine learning": "machine learning", "ml": "machine learning",
+    "design": "design", "vlogging": "vlogging", "content creation": "content creation",
+}
+
+REQUIREMENT_LEXICON: Dict[str, str] = {
+    "lightweight": "lightweight", "light weight": "lightweight", "portable": "portable",
+    "thin": "thin", "noise cancellation": "noise cancellation", "noise cancelling": "noise cancellation",
+    "noise canceling": "noise cancellation", "anc": "noise cancellation", "wireless": "wireless",
+    "bluetooth": "bluetooth", "wired": "wired", "long battery life": "long battery life",
+    "battery life": "long battery life", "good battery": "long battery life", "fast charging": "fast charging",
+    "4k": "4K", "oled": "OLED", "amoled": "AMOLED", "high refresh rate": "high refresh rate",
+    "144hz": "144Hz", "120hz": "120Hz", "mechanical": "mechanical", "rgb": "RGB", "backlit": "backlit",
+    "waterproof": "waterproof", "water resistant": "water resistant", "comfortable": "comfortable",
+    "good camera": "good camera", "durable": "durable", "fuel efficient": "fuel efficient",
+    "mileage": "good mileage", "ssd": "SSD", "dedicated graphics": "dedicated GPU", "touchscreen": "touchscreen",
+    "8gb ram": "8GB RAM", "16gb ram": "16GB RAM", "32gb ram": "32GB RAM", "5g": "5G", "usb-c": "USB-C",
+    "microphone": "microphone", "mic": "microphone", "low latency": "low latency",
+}
+
+# Words that carry no specification on their own
+_STOPWORDS = {
+    "i", "im", "i'm", "me", "my", "we", "want", "need", "looking", "look", "find", "get", "buy", "a", "an",
+    "the", "for", "with", "and", "or", "of", "to", "in", "on", "is", "it", "that", "which", "some", "any",
+    "good", "best", "great", "nice", "new", "prefer", "preferably", "preferred", "please", "suggest",
+    "recommend", "something", "one", "should", "be", "have", "has", "having", "like", "also", "but",
+    "brand", "brands", "budget", "price", "around", "approx", "approximately", "range", "within", "under",
+    "below", "above", "over", "between", "from", "upto", "up", "max", "min", "less", "more", "than",
+    "at", "most", "least", "cheap", "affordable", "rs", "inr", "usd", "rupees", "dollars",
+}
+
+# ---- Prices ----
+_SUFFIX = r"(?:k|lakhs?|lacs?|l|cr|crores?)(?![a-z])"
+_CURRENCY_BEFORE = r"(?:[$₹€£]|rs\.?|inr|usd|eur|gbp)"
+_CURRENCY_AFTER = r"(?:rs\.?|rupees|inr|usd|dollars?|bucks|eur|euros?|gbp|pounds?)(?![a-z])|/-"
+_MONEY = rf"(?:{_CURRENCY_BEFORE}\s*)?\d+(?:[.,]\d+)*(?!\d)\s*(?:{_SUFFIX})?\s*(?:{_CURRENCY_AFTER})?"
+
+_MAX_WORDS = r"under|below|less than|lower than|cheaper than|not more than|no more than|upto|up to|within|max(?:imum)?|at most|<"
+_MIN_WORDS = r"above|over|more than|at least|min(?:imum)?|starting (?:from|at)|>"
+
+_RANGE = re.compile(rf"(?:between|from)\s+({_MONEY})\s*(?:and|to|-)\s*({_MONEY})", re.IGNORECASE)
+_BARE_RANGE = re.compile(rf"({_MONEY})\s*(?:-|to)\s*({_MONEY})", re.IGNORECASE)
+_MAX = re.compile(rf"(?:{_MAX_WORDS})\s*({_MONEY})", re.IGNORECASE)
+_MIN = re.compile(rf"(?:{_MIN_WORDS})\s*({_MONEY})", re.IGNORECASE)
+_BUDGET = re.compile(rf"(?:budget(?: of| is)?|around|approx(?:imately)?|for)\s*({_MONEY})", re.IGNORECASE)
+
+_AMOUNT = re.compile(
+    rf"({_CURRENCY_BEFORE})?\s*(\d+(?:[.,]\d+)*)(?!\d)\s*({_SUFFIX})?\s*({_CURRENCY_AFTER})?",
+    re.IGNORECASE,
+)
+_MULTIPLIERS = {"k": 1e3, "l": 1e5, "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5,
+                "cr": 1e7, "crore": 1e7, "crores": 1e7}
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9'\-]*")
+
+# ---- Brands ----
+# "not samsung", "no apple", "without a dell", "anything except hp", "non-apple"
+_NEGATION = re.compile(
+    r"(?<![a-z0-9])(?:not|no|without|except|excluding|other than|apart from|avoid|non)(?:\s+(?:a|an|the|from|by|any|for|with))*[\s-]*$"
+)
+# Any negation left after parsing ("without touchscreen", "no bloatware") and the word it applies to
+_NEGATED_TERM = re.compile(
+    r"(?<![a-z0-9])(?:not|no|without|except|excluding|other than|apart from|avoid|non)(?![a-z0-9])[\s-]*"
+    r"(?:(?:a|an|the|any)\s+)*([a-z0-9][a-z0-9'\-]*)?"
+)
+# Between two brands of one list ("not hp or lenovo"), so the negation carries over
+_BRAND_JOINER = re.compile(r"\s*(?:,|/|or|nor|and)\s*(?:or|nor|and)?\s*")
+# Units that only mean something next to a number the parser doesn't read ("27 inch", "1 tb ssd", "7 kg")
+_UNITS = {
+    "inch", "inches", "tb", "gb", "mb", "kg", "kgs", "g", "gm", "grams", "lb", "lbs", "mah", "hz", "ghz",
+    "w", "watt", "watts", "mp", "cm", "mm", "litre", "liter", "litres", "liters", "ltr", "cc", "cores",
+}
+
+
+class SpecParse(NamedTuple):
+    specs: ProductSpecs
+    confidence: float
+    # Fields that were actually found in the text (and that the LLM has to respect)
+    found: List[str]
+    # Brands the query rules out ("not Samsung"); never part of `brand_preferences`
+    excluded_brands: List[str]
+    # Numbers and units no rule explained: constraints only the LLM can represent
+    unparsed: List[str]
+    # Other terms the query rules out ("without touchscreen"); never part of the use cases / requirements
+    negated: List[str]
+
+
+def _parse_amount(text: str) -> Tuple[Optional[float], bool, float]:
+    """Returns (value, has_currency_marker, suffix_multiplier)"""
+    match = _AMOUNT.search(text)
+    if not match:
+        return None, False, 1.0
+    before, number, suffix, after = match.groups()
+    try:
+        value = float(number.replace(",", ""))
+    except ValueError:
+        return None, False, 1.0
+    multiplier = _MULTIPLIERS.get(suffix.lower(), 1.0) if suffix else 1.0
+    return value * multiplier, bool(before or after or suffix), multiplier
+
+
+def _lexicon_pattern(lexicon: Dict[str, str]) -> re.Pattern:
+    aliases = sorted(lexicon, key=len, reverse=True)
+    return re.compile(r"(?<![a-z0-9])(" + "|".join(re.escape(a) for a in aliases) + r")(?![a-z0-9])", re.IGNORECASE)
+
+
+_BRANDS = _lexicon_pattern(BRAND_LEXICON)
+_CATEGORIES = _lexicon_pattern(CATEGORY_LEXICON)
+_USE_CASES = _lexicon_pattern(USE_CASE_LEXICON)
+_REQUIREMENTS = _lexicon_pattern(REQUIREMENT_LEXICON)
+
+
+def _unique(values: List[str]) -> List[str]:
+    return list(dict.fromkeys(values))
+
+
+def _match_lexicon(
+    pattern: re.Pattern,
+    lexicon: Dict[str, str],
+    text: str,
+    consumed: List[Tuple[int, int]],
+    negated: Optional[List[str]] = None,
+) -> List[str]:
+    """Canonical values of the lexicon aliases in `text`; with `negated`, negated ones go there instead"""
+    values = []
+    for match in pattern.finditer(text):
+        if any(start <= match.start() < end for start, end in consumed):
+            continue
+        negation = _NEGATION.search(text, 0, match.start()) if negated is not None else None
+        if negation:
+            negated.append(lexicon[match.group(1).lower()])
+            consumed.append((negation.start(), match.end()))
+            continue
+        values.append(lexicon[match.group(1).lower()])
+        consumed.append(match.span())
+    return _unique(values)
+
+
+def _parse_brands(text: str, consumed: List[Tuple[int, int]]) -> Tuple[List[str], List[str]]:
+    """(preferred, excluded) brands; a negation before a brand, or before the list it starts, excludes it"""
+    preferred, excluded = [], []
+    previous_end, previous_negated = 0, False
+    for match in _BRANDS.finditer(text):
+        brand = BRAND_LEXICON[match.group(1).lower()]
+        negation = _NEGATION.search(text, 0, match.start())
+        if negation:
+            negated, start = True, negation.start()
+        elif previous_negated and _BRAND_JOINER.fullmatch(text, previous_end, match.start()):
+            negated, start = True, previous_end
+        else:
+            negated, start = False, match.start()
+        (excluded if negated else preferred).append(brand)
+        consumed.append((start, match.end()))
+        previous_end, previous_negated = match.end(), negated
+    excluded = _unique(excluded)
+    return [brand for brand in _unique(preferred) if brand not in excluded], excluded
+
+
+def brand_of(text: str) -> Optional[str]:
+    """Canonical brand of the first lexicon alias in `text` (a product name, say), or None"""
+    match = _BRANDS.search(text)
+    return BRAND_LEXICON[match.group(1).lower()] if match else None
+
+
+def normalize_category(category: str) -> str:
+    """Lexicon canonical form of a category ("laptops" -> "laptop"); other categories lowercased"""
+    category = " ".join(category.lower().split())
+    return CATEGORY_LEXICON.get(category, category)
+
+
+def _parse_prices(text: str, consumed: List[Tuple[int, int]]) -> Tuple[Optional[float], Optional[float]]:
+    min_price = max_price = None
+
+    for pattern in (_RANGE, _BARE_RANGE):
+        for match in pattern.finditer(text):
+            low, low_marked, low_mult = _parse_amount(match.group(1))
+            high, high_marked, high_mult = _parse_amount(match.group(2))
+            # "2-3" alone is not a price range; "20k-30k" or "between 200 and 300" is
+            if low is None or high is None or (pattern is _BARE_RANGE and not (low_marked or high_marked)):
+                continue
+            # "20-30k": the suffix applies to both ends
+            if low_mult == 1.0 and high_mult > 1.0 and low * high_mult <= high:
+                low *= high_mult
+            min_price, max_price = sorted((low, high))
+            consumed.append(match.span())
+            return min_price, max_price
+
+    for pattern, is_max in ((_MAX, True), (_MIN, False)):
+        for match in pattern.finditer(text):
+            value, _, _ = _parse_amount(match.group(1))
+            # "more than 50k" inside "not more than 50k" is the ceiling already read
+            if value is None or any(start <= match.start() < end for start, end in consumed):
+                continue
+            if is_max:
+                max_price = value
+            else:
+                min_price = value
+            consumed.append(match.span())
+            break
+
+    if max_price is None and min_price is None:
+        match = _BUDGET.search(text)
+        if match:
+            value, marked, _ = _parse_amount(match.group(1))
+            if value is not None and marked:
+                max_price = value
+                consumed.append(match.span())
+
+    return min_price, max_price
+
+
+def parse_specs(query: str) -> SpecParse:
+    """
+    Extract ProductSpecs from the query with lexicons and regexes.
+
+    Confidence is half "a category was recognised" and half "share of the query's content
+    words explained by the recognised price / brand / category / use-case / requirement spans".
+    Negated brands ("not Samsung") are excluded rather than preferred, and other negated terms
+    ("without touchscreen") are left out of the specs and listed in `negated`.
+    """
+    text = query.lower()
+    consumed: List[Tuple[int, int]] = []
+    negated: List[str] = []
+
+    min_price, max_price = _parse_prices(text, consumed)
+    # Requirements before categories, so "ssd" in "with 1tb ssd" isn't read as the category when a laptop is mentioned
+    requirements = _match_lexicon(_REQUIREMENTS, REQUIREMENT_LEXICON, text, consumed, negated)
+    use_cases = _match_lexicon(_USE_CASES, USE_CASE_LEXICON, text, consumed, negated)
+    categories = _match_lexicon(_CATEGORIES, CATEGORY_LEXICON, text, consumed)
+    # Brands may overlap a category ("macbook" is both Apple and a laptop)
+    brands, excluded = _parse_brands(text, consumed)
+    # Negations no rule above explained still rule something out
+    for match in _NEGATED_TERM.finditer(text):
+        if not any(start <= match.start() < end for start, end in consumed):
+            negated.append(match.group(0).strip())
+            consumed.append(match.span())
+
+    words = [m for m in _WORD.finditer(text) if m.group(0) not in _STOPWORDS]
+    unexplained = [m for m in words if not any(start <= m.start() < end for start, end in consumed)]
+    unparsed = [m.group(0) for m in unexplained if m.group(0) in _UNITS or any(c.isdigit() for c in m.group(0))]
+    coverage = 1.0 - len(unexplained) / len(words) if words else 0.0
+    confidence = round(0.5 * bool(categories) + 0.5 * coverage, 3)
+
+    found = [name for name, value in (
+        ("category", categories), ("min_price", min_price), ("max_price", max_price),
+        ("brand_preferences", brands), ("use_cases", use_cases), ("key_requirements", requirements),
+    ) if value]
+
+    specs: ProductSpecs = {
+        "category": categories[0] if categories else "",
+        "max_price": max_price,
+        "min_price": min_price,
+        "brand_preferences": brands,
+        "excluded_brands": excluded,
+        "use_cases": use_cases,
+        "key_requirements": requirements,
+    }
+    return SpecParse(
+        specs=specs, confidence=confidence, found=found, excluded_brands=excluded, unparsed=unparsed,
+        negated=_unique(negated),
+    )
+
+
+def spec_signature(query: str) -> tuple:
+    """
+    What the rules recognise in `query`, ignoring order: near-duplicate queries have to agree on it
+    to share specs ("prefer HP" / "prefer Dell", "gaming" / "programming", "Dell" / "not Dell")
+    """
+    parsed = parse_specs(query)
+    specs = parsed.specs
+    return (
+        specs["category"],
+        frozenset(specs["brand_preferences"]),
+        frozenset(parsed.excluded_brands),
+        frozenset(specs["use_cases"]),
+        frozenset(specs["key_requirements"]),
+        frozenset(parsed.negated),
+    )
+
+
+def merge_specs(llm_specs: ProductSpecs, parsed: SpecParse) -> ProductSpecs:
+    """
+    Parsed category, prices and brands are hard constraints, excluded brands are added to the
+    LLM's and removed from the preferences; parsed use cases / requirements are added to the LLM's
+    """
+    merged = dict(llm_specs)
+    for field in ("category", "min_price", "max_price"):
+        if field in parsed.found:
+            merged[field] = parsed.specs[field]
+    if "brand_preferences" in parsed.found:
+        merged["brand_preferences"] = parsed.specs["brand_preferences"]
+    excluded = _unique([brand_of(b) or b for b in merged.get("excluded_brands") or []] + parsed.excluded_brands)
+    merged["excluded_brands"] = excluded
+    merged["brand_preferences"] = [
+        b for b in merged.get("brand_preferences") or [] if (brand_of(b) or b) not in excluded
+    ]
+    for field in ("use_cases", "key_requirements"):
+        merged[field] = _unique(list(merged.get(field) or []) + parsed.specs[field])
+    return merged
+
+
+def format_prefill(parsed: SpecParse) -> str:
+    """Instruction block listing the fields the LLM must keep as parsed"""
+    lines = [f"- {field}: {parsed.specs[field]}" for field in parsed.found]
+    if parsed.excluded_brands:
+        lines.append(f"- excluded_brands: {parsed.excluded_brands} (never in brand_preferences)")
+    if parsed.negated:
+        lines.append(f"- the user rules out (never in use_cases or key_requirements): {parsed.negated}")
+    return "These values were already parsed from the query and must be kept as they are:\n" + "\n".join(lines)
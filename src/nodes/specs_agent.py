@@ -1,19 +1,99 @@
 ## Specification Extraction Agent.
+import logging
+import os
+import time
 from src.graph.state import AgentState, ProductSpecs
-from src.llm.llm_openai import llm_openai
+from src.llm import registry
+from src.cache.semantic_cache import SemanticCache
+from src.cache.single_flight import SingleFlight
+from src.nodes.spec_rules import parse_specs, merge_specs, format_prefill, spec_signature
+from src.graph import budget
+from src.net.cassette import cassette
 from langchain_core.messages import SystemMessage, HumanMessage
 
 
-# We are using langchain wrapper for structured output.
-llm_product_spec = llm_openai.with_structured_output(ProductSpecs)
+# Near-duplicate queries reuse the specs (and, if enabled, the product list) of an earlier query
+specs_cache = SemanticCache(
+    name="specs",
+    threshold=float(os.getenv("SPECS_CACHE_THRESHOLD", 0.85)),
+    max_entries=int(os.getenv("SPECS_CACHE_SIZE", 1000)),
+    ttl_seconds=float(os.getenv("SPECS_CACHE_TTL_SECONDS", 6 * 60 * 60)),
+    # Similar wording isn't enough: the brands, use cases and exclusions named must be the same too
+    signature=spec_signature,
+)
+REUSE_CACHED_PRODUCTS = os.getenv("SPECS_CACHE_REUSE_PRODUCTS", "true").lower() == "true"
+# Not consulted under a cassette, where a similar earlier query must not decide which calls a run makes
+SPECS_CACHE_ENABLED = not cassette.active
 
-def specs_agent(state: AgentState):
+# Identical queries arriving together (e.g. in one batch) share one LLM extraction
+_extractions = SingleFlight()
+
+# Queries the rule-based parser understands at least this well never reach the LLM
+SPECS_RULES_ENABLED = os.getenv("SPECS_RULES_ENABLED", "true").lower() == "true"
+SPECS_RULES_CONFIDENCE = float(os.getenv("SPECS_RULES_CONFIDENCE", 0.8))
+
+logger = logging.getLogger(__name__)
+
+# Parser hit rate and the LLM time it saved (estimated from the average LLM extraction latency)
+spec_parser_stats = {
+    "parsed": 0,
+    "fast_path": 0,
+    "prefilled": 0,
+    "llm_calls": 0,
+    "llm_seconds": 0.0,
+    "llm_shared": 0,
+    "seconds_saved": 0.0,
+}
+
+def _avg_llm_seconds() -> float:
+    if not spec_parser_stats["llm_calls"]:
+        return 0.0
+    return spec_parser_stats["llm_seconds"] / spec_parser_stats["llm_calls"]
+
+async def specs_agent(state: AgentState):
     """Extracting the User expecatations from the query"""
     user_query = state['user_query']
 
     state["step"] = "specs_generation"
+    currency = state.get("currency", "USD")
+
+    cached = specs_cache.lookup(user_query, namespace=currency) if SPECS_CACHE_ENABLED else None
+    if cached is not None:
+        state["product_specs"] = cached["product_specs"]
+        # Setting product_list makes the router skip the search entirely
+        if REUSE_CACHED_PRODUCTS and cached.get("product_list") is not None:
+            state["product_list"] = cached["product_list"]
+        return state
 
-    system_prompt = SystemMessage(content=
+    parsed = parse_specs(user_query) if SPECS_RULES_ENABLED else None
+    if parsed is not None:
+        spec_parser_stats["parsed"] += 1
+
+    # A number or unit the parser couldn't place ("27 inch", "1tb") is a constraint it would drop, and
+    # anything the query rules out ("not Dell", "without touchscreen") is left to the LLM to word
+    if (
+        parsed is not None and parsed.confidence >= SPECS_RULES_CONFIDENCE
+        and not (parsed.unparsed or parsed.negated or parsed.excluded_brands)
+    ):
+        spec_parser_stats["fast_path"] += 1
+        spec_parser_stats["seconds_saved"] += _avg_llm_seconds()
+        logger.info(
+            "spec parser fast path (confidence %.2f, hit rate %.0f%%, ~%.1fs LLM time saved so far)",
+            parsed.confidence,
+            100 * spec_parser_stats["fast_path"] / spec_parser_stats["parsed"],
+            spec_parser_stats["seconds_saved"],
+        )
+        state["product_specs"] = parsed.specs
+        specs_cache.store(user_query, {"product_specs": parsed.specs}, namespace=currency)
+        return state
+
+    # Low on time: a partial parse beats spending the budget on extraction
+    if parsed is not None and "category" in parsed.found and budget.below(state, budget.REDUCED_SEARCH_SECONDS):
+        state["product_specs"] = parsed.specs
+        state["degraded"] = budget.degrade(state, "specs_from_parser")
+        return state
+
+    system_content = (
         "you are an expert specification extraction agent from user query." \
         "you have to extract the following:" \
         "1. Category" \
@@ -21,10 +101,31 @@ def specs_agent(state: AgentState):
         "3. min_price" \
         "4. brand_preferences" \
         "5. use cases" \
-        "6. Key requirements")
-    response = llm_product_spec.invoke([system_prompt, HumanMessage(content=user_query)])
+        "6. Key requirements" \
+        "7. excluded_brands (brands the user rules out)")
+    # Whatever the parser did find is handed to the LLM as fixed
+    if parsed is not None and (parsed.found or parsed.excluded_brands or parsed.negated):
+        spec_parser_stats["prefilled"] += 1
+        system_content += "\n" + format_prefill(parsed)
+    system_prompt = SystemMessage(content=system_content)
+
+    async def extract():
+        started = time.perf_counter()
+        response = await registry.llm_for("specs_agent", state, schema=ProductSpecs).ainvoke([system_prompt, HumanMessage(content=user_query)])
+        spec_parser_stats["llm_calls"] += 1
+        spec_parser_stats["llm_seconds"] += time.perf_counter() - started
+        return response
+
+    key = (" ".join(user_query.lower().split()), currency, registry.resolve("specs_agent", state).label)
+    response, shared = await _extractions.do(key, extract)
+    if shared:
+        spec_parser_stats["llm_shared"] += 1
+
+    if parsed is not None and (parsed.found or parsed.excluded_brands or parsed.negated):
+        response = merge_specs(response, parsed)
     # Updating the state withthe extracted specifications
     state["product_specs"] = response
+    specs_cache.store(user_query, {"product_specs": response}, namespace=currency)
 
     return state
 
@@ -33,7 +134,7 @@ def specs_agent(state: AgentState):
 #         "user_query": "I want a lightweight laptop under $1200 for programming. Prefer Dell or Lenovo."
 #     }
 
-#     result = specs_agent(test_state)
+#     result = asyncio.run(specs_agent(test_state))
 
 #     print("Structured Output:\n", result["product_specs"])
 
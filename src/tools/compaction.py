@@ -0,0 +1,122 @@
+# compaction.py
+"""
+Deterministic compaction of Exa search results.
+
+Raw page text is turned into small records before it is appended to the agent's
+messages, so later LLM turns don't re-send tens of kilobytes of page content.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+from src.tools.dedupe import DEDUPE_ENABLED, dedupe_records
+
+_SYMBOL_CURRENCY = {"$": "USD", "₹": "INR", "€": "EUR", "£": "GBP"}
+_CODE_CURRENCY = {"usd": "USD", "inr": "INR", "rs": "INR", "rs.": "INR", "eur": "EUR", "gbp": "GBP"}
+
+_AMOUNT = r"(\d{1,3}(?:,\d{2,3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)"
+_PRICE_PATTERNS = [
+    # ₹45,999 / $1,099.99 / € 899
+    re.compile(r"([$₹€£])\s?" + _AMOUNT),
+    # Rs. 45,999 / INR 45999 / USD 1200
+    re.compile(r"\b(rs\.?|inr|usd|eur|gbp)\s?" + _AMOUNT, re.IGNORECASE),
+]
+_RATING = re.compile(r"(\d(?:\.\d)?)\s*(?:out of 5|/\s?5\b|stars?)", re.IGNORECASE)
+_RATING_COUNT = re.compile(r"(\d{1,3}(?:,\d{2,3})+|\d+)\s*(?:global\s+)?(?:ratings|reviews|customer reviews)", re.IGNORECASE)
+
+
+def _extract_price(text: str) -> tuple[Optional[float], Optional[str]]:
+    for pattern in _PRICE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            marker, amount = match.groups()
+            currency = _SYMBOL_CURRENCY.get(marker) or _CODE_CURRENCY.get(marker.lower())
+            try:
+                return float(amount.replace(",", "")), currency
+            except ValueError:
+                continue
+    return None, None
+
+
+def _extract_rating(text: str) -> tuple[Optional[float], Optional[int]]:
+    rating = rating_count = None
+    match = _RATING.search(text)
+    if match:
+        value = float(match.group(1))
+        rating = value if 0 <= value <= 5 else None
+    match = _RATING_COUNT.search(text)
+    if match:
+        rating_count = int(match.group(1).replace(",", ""))
+    return rating, rating_count
+
+
+def _domain(url: str) -> str:
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _result_text(result: Any) -> str:
+    parts = [getattr(result, "text", None), getattr(result, "summary", None)]
+    parts += getattr(result, "highlights", None) or []
+    return " ".join(" ".join(p.split()) for p in parts if p)
+
+
+def compact_result(result: Any, snippet_chars: int) -> Dict[str, Any]:
+    """One Exa `Result` -> a flat record with only what the product extraction needs"""
+    text = _result_text(result)
+    url = getattr(result, "url", "") or ""
+    title = getattr(result, "title", None) or ""
+    price, currency = _extract_price(f"{title} {text}")
+    rating, rating_count = _extract_rating(text)
+
+    record = {
+        "title": title,
+        "url": url,
+        "domain": _domain(url),
+        "price": price,
+        "currency": currency,
+        "rating": rating,
+        "rating_count": rating_count,
+        "image": getattr(result, "image", None),
+        "snippet": text[:snippet_chars],
+    }
+    # Missing fields carry no information for the LLM
+    return {k: v for k, v in record.items() if v not in (None, "")}
+
+
+def _dumps(records: List[Dict[str, Any]]) -> str:
+    return json.dumps(records, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact_response(response: Any, snippet_chars: int = 300, budget_chars: int = 3000) -> str:
+    """
+    Compacts a whole `SearchResponse` into a JSON array of records that fits in `budget_chars`.
+
+    Results for the same product are collapsed first (see dedupe.py). Snippets are then
+    shortened evenly; if even bare records don't fit, trailing (lowest ranked) results
+    are dropped.
+    """
+    records = [compact_result(r, snippet_chars) for r in getattr(response, "results", None) or []]
+    if DEDUPE_ENABLED:
+        # One product listed under several URLs would otherwise take its share of the budget more than once
+        records = dedupe_records(records, "results")
+
+    while records:
+        payload = _dumps(records)
+        if len(payload) <= budget_chars:
+            return payload
+
+        bare = [{k: v for k, v in r.items() if k != "snippet"} for r in records]
+        spare = budget_chars - len(_dumps(bare)) - len(records) * len(',"snippet":""')
+        per_snippet = spare // len(records)
+        # JSON escaping can push the payload a little over, so keep trimming a bit at a time
+        while per_snippet >= 40:
+            trimmed = [{**r, "snippet": r["snippet"][:per_snippet]} if "snippet" in r else r for r in records]
+            payload = _dumps(trimmed)
+            if len(payload) <= budget_chars:
+                return payload
+            per_snippet = int(per_snippet * 0.9)
+        records.pop()
+
+    return _dumps(records)
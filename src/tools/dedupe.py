@@ -0,0 +1,213 @@
+# dedupe.py
+"""
+Canonicalization and de-duplication of search results and extracted products.
+
+The same product turns up under several URLs (tracking parameters, mobile hosts, marketplace
+variants) and under slightly different titles across Exa calls. Between the tool output and the
+product extraction, URLs are canonicalized and records collapse when they share a canonical URL
+or their names are near-duplicates: estimated Jaccard similarity of character trigrams (MinHash,
+computed with NumPy) of at least `DEDUPE_NAME_THRESHOLD`, with the same brand and compatible
+product-line words ("xps", "inspiron"), model tokens ("13", "m2") and qualifiers ("pro", "ultra"),
+so that different products and variants stay apart. A false split only costs prompt tokens, a
+false merge loses a product, so the guards err on the side of keeping records.
+"""
+
+import json
+import os
+import re
+import zlib
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.messages import AnyMessage, ToolMessage
+
+from src.catalog.urls import canonical_url
+from src.graph.state import Product, Product_info
+from src.nodes.spec_rules import BRAND_LEXICON, CATEGORY_LEXICON, REQUIREMENT_LEXICON, USE_CASE_LEXICON, brand_of
+
+DEDUPE_ENABLED = os.getenv("DEDUPE_ENABLED", "true").lower() == "true"
+DEDUPE_NAME_THRESHOLD = float(os.getenv("DEDUPE_NAME_THRESHOLD", 0.8))
+MINHASH_PERMUTATIONS = 128
+
+# Retailer suffixes: "Dell XPS 13 Laptop | Best Buy", "... - Amazon.in: Electronics"
+_TITLE_SEPARATOR = re.compile(r"\s+[|–—-]\s+")
+_RETAILER = re.compile(
+    r"(?:buy\s+)?(?:[a-z0-9-]+(?:\.[a-z]{2,})+|amazon|flipkart|best\s*buy|walmart|croma|reliance digital|vijay sales"
+    r"|newegg|ebay|target|b&h(?: photo)?)(?::.*)?",
+    re.IGNORECASE,
+)
+_WORD = re.compile(r"[a-z0-9]+(?:[.+][a-z0-9]+)*")
+_QUALIFIERS = {"pro", "max", "plus", "mini", "ultra", "lite", "air", "se", "fe", "neo", "prime", "edge", "fold", "flip"}
+# Words that describe the kind of product rather than which one it is
+_GENERIC = {
+    word
+    for lexicon in (BRAND_LEXICON, CATEGORY_LEXICON, USE_CASE_LEXICON, REQUIREMENT_LEXICON)
+    for alias in lexicon
+    for word in _WORD.findall(alias)
+} | {
+    "inch", "inches", "smart", "led", "lcd", "qled", "display", "screen", "full", "hd", "uhd", "fhd",
+    "with", "and", "the", "for", "of", "in", "by", "new", "latest", "edition", "series", "model", "version",
+    "gen", "generation", "chip", "processor", "core", "memory", "storage", "ram", "cancellation", "canceling",
+    "cancelling", "over", "ear", "true", "earphone", "earbud", "handset", "unlocked", "dual", "sim",
+}
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(0x5EED)
+# Universal hashes h(x) = (a * x + b) mod p, one per permutation; a * x stays below 2**62
+_A = _rng.integers(1, _PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+# Per stage, since one request's records pass several of them: "results" (one Exa response),
+# "fanout" (the merged fan-out queries), "tool_messages" (all Exa calls before the extraction)
+# and "products" (the extracted product list)
+dedupe_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _stage_stats(stage: str) -> Dict[str, int]:
+    return dedupe_stats.setdefault(stage, {"records_in": 0, "records_out": 0, "url_duplicates": 0, "name_duplicates": 0})
+
+
+def _name_words(name: str) -> List[str]:
+    segments = _TITLE_SEPARATOR.split(name.lower())
+    while len(segments) > 1 and _RETAILER.fullmatch(segments[-1].strip()):
+        segments.pop()
+    return _WORD.findall(" ".join(segments))
+
+
+def _shingles(words: Sequence[str]) -> List[str]:
+    """Character trigrams of each word, padded so word starts and ends count"""
+    padded = [f" {word} " for word in words]
+    return [word[i:i + 3] for word in padded for i in range(len(word) - 2)]
+
+
+def minhash(shingles: Iterable[str]) -> np.ndarray:
+    """MINHASH_PERMUTATIONS-long signature of a set; equal positions estimate the Jaccard similarity"""
+    x = np.array([zlib.crc32(s.encode()) % _PRIME for s in set(shingles)], dtype=np.uint64)
+    if not len(x):
+        return np.full(MINHASH_PERMUTATIONS, _PRIME, dtype=np.uint64)
+    return ((_A * x[:, None] + _B) % _PRIME).min(axis=0)
+
+
+class _Guard(NamedTuple):
+    brand: Optional[str]
+    # Product-line words ("xps", "victus"), model tokens ("13", "m2") and qualifiers ("pro")
+    lines: frozenset
+    models: frozenset
+    qualifiers: frozenset
+
+
+def _guard(name: str, words: Sequence[str]) -> _Guard:
+    return _Guard(
+        brand=brand_of(name),
+        lines=frozenset(w for w in words if w.isalpha() and w not in _GENERIC and w not in _QUALIFIERS),
+        models=frozenset(w for w in words if any(c.isdigit() for c in w)),
+        qualifiers=frozenset(w for w in words if w in _QUALIFIERS),
+    )
+
+
+def _nested(a: frozenset, b: frozenset) -> bool:
+    """One side is at most more specific than the other, and neither side lacks the field entirely"""
+    return bool(a) == bool(b) and (a <= b or b <= a)
+
+
+def _compatible(a: _Guard, b: _Guard) -> bool:
+    """
+    Brands and qualifiers must be equal ("iPhone 15" is not "iPhone 15 Pro", "Samsung 55 inch TV" is
+    not "LG 55 inch TV"); product-line words and model tokens may only be more specific on one side
+    ("XPS 13" is "XPS 13 9340", but not "XPS 15" or "Inspiron 13").
+    """
+    return (
+        a.brand == b.brand
+        and a.qualifiers == b.qualifiers
+        and _nested(a.lines, b.lines)
+        and _nested(a.models, b.models)
+    )
+
+
+class Deduper:
+    """
+    Collapses records into one per product as they are added. The first record of a product is
+    kept; records with the same canonical URL fill in fields it lacks (price, rating, ...), while
+    name matches are only dropped, since a near-duplicate name is weaker evidence than the same page.
+    """
+
+    def __init__(self, stage: str, name_field: str = "title", threshold: float = DEDUPE_NAME_THRESHOLD):
+        self.name_field = name_field
+        self.threshold = threshold
+        self.stats = _stage_stats(stage)
+        self.kept: List[Dict[str, Any]] = []
+        self._by_url: Dict[str, int] = {}
+        self._signatures: List[np.ndarray] = []
+        self._guards: List[Optional[_Guard]] = []
+
+    def _name_match(self, name: str) -> Tuple[Optional[int], np.ndarray, Optional[_Guard]]:
+        words = _name_words(name)
+        if not words:
+            return None, minhash(()), None
+        signature, guard = minhash(_shingles(words)), _guard(name, words)
+        if self._signatures:
+            similarity = (np.stack(self._signatures) == signature).mean(axis=1)
+            for index in np.flatnonzero(similarity >= self.threshold):
+                if self._guards[index] is not None and _compatible(self._guards[index], guard):
+                    return int(index), signature, guard
+        return None, signature, guard
+
+    def add(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The records (with canonical URLs) that are new products, in their original order"""
+        new = []
+        for record in records:
+            self.stats["records_in"] += 1
+            record = dict(record)
+            url = record["url"] = canonical_url(record["url"]) if record.get("url") else record.get("url")
+            index = self._by_url.get(url) if url else None
+            if index is not None:
+                self.stats["url_duplicates"] += 1
+                kept = self.kept[index]
+                kept.update({k: v for k, v in record.items() if kept.get(k) in (None, "", [])})
+                continue
+            index, signature, guard = self._name_match(record.get(self.name_field) or "")
+            if index is not None:
+                self.stats["name_duplicates"] += 1
+                continue
+            if url:
+                self._by_url[url] = len(self.kept)
+            self.kept.append(record)
+            self._signatures.append(signature)
+            self._guards.append(guard)
+            new.append(record)
+            self.stats["records_out"] += 1
+        return new
+
+
+def dedupe_records(records: List[Dict[str, Any]], stage: str, name_field: str = "title") -> List[Dict[str, Any]]:
+    """Search records with canonical URLs, one per product, in their original order"""
+    return Deduper(stage, name_field).add(records)
+
+
+def dedupe_tool_messages(messages: List[AnyMessage]) -> List[AnyMessage]:
+    """
+    The conversation with every tool result's records de-duplicated against all earlier ones, so
+    each product reaches the extraction once. Records a call only repeated are dropped from it.
+    """
+    deduper = Deduper("tool_messages")
+    fresh: Dict[int, List[Dict[str, Any]]] = {}
+    for position, message in enumerate(messages):
+        if isinstance(message, ToolMessage) and isinstance(message.content, str):
+            try:
+                records = json.loads(message.content)
+            except ValueError:
+                continue
+            if isinstance(records, list) and all(isinstance(r, dict) for r in records):
+                fresh[position] = deduper.add(records)
+    # Serialized only now, so kept records include what later duplicates filled in
+    return [
+        message.model_copy(update={"content": json.dumps(fresh[position], ensure_ascii=False, separators=(",", ":"))})
+        if position in fresh else message
+        for position, message in enumerate(messages)
+    ]
+
+
+def dedupe_products(product_list: Product) -> Product:
+    """The extracted product list with one entry per product (canonical URLs, near-duplicate names collapsed)"""
+    records = dedupe_records([p.model_dump() for p in product_list.products], "products", name_field="name")
+    return product_list.model_copy(update={"products": [Product_info.model_validate(r) for r in records]})
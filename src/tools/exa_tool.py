@@ -1,24 +1,94 @@
-from exa_py import Exa
 import os
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Annotated, Optional
 from dotenv import load_dotenv
 from langchain_core.tools import tool
+from langgraph.prebuilt import InjectedState
+from src.cache.tiered_cache import TieredCache
+from src.tools.compaction import compact_response
+from src.graph import budget
+from src.net.cassette import cassette
+from src.net.http_pool import async_client
 
 load_dotenv(override=True)
 
+# Repeated queries (from the ReAct loop or from other users) are served from here. Under a cassette
+# only the memory tier is used, so every search of a run is recorded / replayed whatever earlier runs left on disk
+exa_cache = TieredCache(
+    name="exa",
+    path=None if cassette.active else os.getenv("EXA_CACHE_PATH", ".cache/exa_cache.sqlite") or None,
+    ttl_seconds=float(os.getenv("EXA_CACHE_TTL_SECONDS", 6 * 60 * 60)),
+    max_memory_entries=int(os.getenv("EXA_CACHE_MEMORY_SIZE", 256)),
+    max_disk_entries=int(os.getenv("EXA_CACHE_DISK_SIZE", 5000)),
+)
+
+# Page text fetched per result, and the size of what is handed back to the LLM
+EXA_TEXT_MAX_CHARS = int(os.getenv("EXA_TEXT_MAX_CHARS", 4000))
+EXA_SNIPPET_CHARS = int(os.getenv("EXA_SNIPPET_CHARS", 300))
+EXA_RESULT_BUDGET_CHARS = int(os.getenv("EXA_RESULT_BUDGET_CHARS", 3000))
+
+@lru_cache(maxsize=1)
 def get_exa_client():
-    return Exa(os.getenv("EXA_API_KEY"))
+    # exa_py pulls in the whole openai SDK, so it is only imported on first use
+    from exa_py import AsyncExa
+
+    class PooledExa(AsyncExa):
+        """AsyncExa sends every request through its `client` property; this one is on the shared pool"""
+
+        _pooled_client = None
+
+        @property
+        def client(self):
+            if self._pooled_client is None:
+                self._pooled_client = async_client(base_url=self.base_url, headers=self.headers, timeout=600)
+            return self._pooled_client
+
+    return PooledExa(os.getenv("EXA_API_KEY"), api_base=os.getenv("EXA_API_BASE", "https://api.exa.ai"))
+
+# Fields of an Exa result that compaction reads
+_RESULT_FIELDS = ("title", "url", "text", "summary", "highlights", "image")
+
+def _encode_response(response) -> list:
+    return [{f: getattr(r, f, None) for f in _RESULT_FIELDS} for r in response.results]
+
+def _decode_response(results: list):
+    return SimpleNamespace(results=[SimpleNamespace(**r) for r in results])
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
 
 @tool("exa_search")
-def exa_tool(query:str):
+async def exa_tool(query:str, state: Annotated[Optional[dict], InjectedState] = None):
     """
     The function helps in searching the web
     """
-    exa = get_exa_client()
-    result = exa.search_and_contents(
-    query=query,
-    context = True,
-    type = "auto",
-    user_location = os.getenv("USER_LOCATION", "IN"),
-    num_results = 5,
+    user_location = os.getenv("USER_LOCATION", "IN")
+    # Fewer results (faster and a smaller prompt) when the request is running out of time
+    num_results = 2 if state and budget.below(state, budget.REDUCED_SEARCH_SECONDS) else 5
+    search_type = "auto"
+
+    request = {
+        "query": query,
+        "text": {"max_characters": EXA_TEXT_MAX_CHARS},
+        "type": search_type,
+        "user_location": user_location,
+        "num_results": num_results,
+    }
+
+    async def search():
+        return await get_exa_client().search_and_contents(**request)
+
+    async def fetch():
+        # The raw results go on the cassette, so replays still exercise compaction
+        response = await cassette.call("exa", request, search, encode=_encode_response, decode=_decode_response)
+        # Only the compact records are cached and appended to the conversation
+        return compact_response(response, EXA_SNIPPET_CHARS, EXA_RESULT_BUDGET_CHARS)
+
+    # The compaction budget is part of the key so entries stored under another budget are never served
+    key = exa_cache.make_key(
+        _normalize_query(query), user_location.upper(), num_results, search_type,
+        EXA_SNIPPET_CHARS, EXA_RESULT_BUDGET_CHARS,
     )
+    result = await exa_cache.get_or_fetch(key, fetch)
     return result
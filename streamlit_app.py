@@ -1,23 +1,38 @@
 # streamlit_app.py
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List
 import os
 from dotenv import load_dotenv
 from src.frontend.components import VectorUI, ProductDisplay, RecommendationDisplay
-import plotly.express as px
-import pandas as pd
 
 load_dotenv(override=True)
 
+# Connecting should be quick; a research run can take a while between two streamed events
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", 5))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", 180))
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """One keep-alive connection pool to the API, shared by every rerun and browser session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 def make_api_request(query: str, currency: str, api_url: str = "http://localhost:8000/USER") -> Dict[str, Any]:
     """Make API request to the FastAPI backend"""
     try:
         payload = {"user": query, "currency": currency}
-        response = requests.post(api_url, json=payload)
+        response = get_http_session().post(api_url, json=payload, timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT))
         response.raise_for_status()
         return response.json()
+    except requests.exceptions.Timeout:
+        st.error(f"❌ The API server did not answer within {API_READ_TIMEOUT:.0f}s")
+        return {}
     except requests.exceptions.ConnectionError:
         st.error("❌ Cannot connect to the API server. Make sure the FastAPI server is running on http://localhost:8000")
         return {}
@@ -28,6 +43,79 @@ def make_api_request(query: str, currency: str, api_url: str = "http://localhost
         st.error(f"❌ Unexpected error: {e}")
         return {}
 
+def stream_api_request(query: str, currency: str, api_url: str = "http://localhost:8000/USER", trace: bool = False):
+    """Call the SSE endpoint and yield (event, data) pairs as the graph progresses"""
+    payload = {"user": query, "currency": currency, "trace": trace}
+    with get_http_session().post(f"{api_url}/stream", json=payload, stream=True,
+                                 timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT)) as response:
+        response.raise_for_status()
+        event, data = "message", []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data.append(line[len("data:"):].strip())
+            elif not line and data:
+                yield event, json.loads("\n".join(data))
+                event, data = "message", []
+
+NODE_LABELS = {
+    "refine": "🔁 Applied follow-up to the previous results",
+    "specs_agent": "📋 Extracted specifications",
+    "catalog_search": "🗂️ Checked the local product catalog",
+    "search_agent": "🤖 Search agent step",
+    "tools": "🌐 Web search finished",
+    "product_list": "📦 Structured product list",
+    "extract_and_recommend": "📦 Products and recommendation",
+    "comb_results": "🎯 Final recommendation",
+}
+
+def run_streaming_search(query: str, currency: str, api_url: str, trace: bool = False) -> Dict[str, Any]:
+    """Render graph progress and partial results while the backend is still working"""
+    results: Dict[str, Any] = {}
+    progress = st.empty()
+    try:
+        with progress.container():
+            status = st.status("🔍 Researching products...", expanded=True)
+            specs_slot = st.empty()
+            products_slot = st.empty()
+
+            for event, data in stream_api_request(query, currency, api_url, trace):
+                if event == "node" and data.get("node") in NODE_LABELS:
+                    status.write(NODE_LABELS[data["node"]])
+                elif event == "specs":
+                    results["product_specs"] = data["product_specs"]
+                    with specs_slot.container():
+                        st.subheader("📋 Extracted Specifications")
+                        st.json(data["product_specs"])
+                elif event == "tool_call":
+                    status.write(f"🔎 Searching: {data.get('args', {}).get('query', '')}")
+                elif event == "products":
+                    products = (data.get("product_list") or {}).get("products", [])
+                    with products_slot.container():
+                        st.subheader(f"📦 {len(products)} products found, building recommendation...")
+                        for i, product in enumerate(products):
+                            ProductDisplay.render_product_card(product, i)
+                elif event == "error":
+                    st.error(f"❌ API request failed: {data.get('detail')}")
+                    return {}
+                elif event == "done":
+                    results.update(data)
+            status.update(label="✅ Research complete", state="complete")
+    except requests.exceptions.Timeout:
+        st.error(f"❌ The API server sent nothing for {API_READ_TIMEOUT:.0f}s")
+        return {}
+    except requests.exceptions.ConnectionError:
+        st.error("❌ Cannot connect to the API server. Make sure the FastAPI server is running on http://localhost:8000")
+        return {}
+    except requests.exceptions.HTTPError as e:
+        st.error(f"❌ API request failed: {e}")
+        return {}
+
+    # The full results view below takes over from the progressive one
+    progress.empty()
+    return results
+
 def display_product_card(product):
     """Display a single product in a card format"""
     with st.container():
@@ -126,7 +214,7 @@ def main():
     VectorUI.render_header()
     
     # Render sidebar and get API URL
-    api_url, currency = VectorUI.render_sidebar()
+    api_url, currency, trace = VectorUI.render_sidebar()
     
     # Main content area
     col1, col2 = st.columns([3, 1])
@@ -158,80 +246,82 @@ def main():
     
     # Process search
     if search_button and query.strip():
-        with st.spinner("🔍 Searching for products... This may take a moment."):
-            results = make_api_request(query, currency, api_url)
-            if results:
-                st.session_state.results = results
+        results = run_streaming_search(query, currency, api_url, trace)
+        if results:
+            st.session_state.results = results
     
     # Display results
     if 'results' in st.session_state:
-        results = st.session_state.results
+        render_results(st.session_state.results)
+
+RESULT_VIEWS = ["🎯 Detailed View", "📊 Quick Overview", "📈 Analytics"]
+
+def render_analytics(products: List[Dict[str, Any]]):
+    """Price and rating distributions"""
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        prices = [p.get('price', 0) for p in products if p.get('price')]
+        if prices:
+            st.subheader("💰 Price Distribution")
+            st.plotly_chart(VectorUI.create_distribution_chart(prices, "Price", 10), width="stretch")
+    
+    with col2:
+        ratings = [p.get('rating', 0) for p in products if p.get('rating')]
+        if ratings:
+            st.subheader("⭐ Rating Distribution")
+            st.plotly_chart(VectorUI.create_distribution_chart(ratings, "Rating", 5), width="stretch")
+
+@st.fragment
+def render_results(results: Dict[str, Any]):
+    """
+    The loaded result. Runs as a fragment, so switching views reruns only this function, and the
+    figures and table come from the cache; only the selected view is built at all.
+    """
+    # Display product list
+    if results.get('product_list') and results['product_list'].get('products'):
+        products = results['product_list']['products']
         
-        # Display product list
-        if results.get('product_list') and results['product_list'].get('products'):
-            products = results['product_list']['products']
-            
-            st.subheader("📦 Product Results")
-            st.write(f"Found {len(products)} products")
-            
-            # Show metrics overview
-            VectorUI.render_product_metrics(products)
-            
-            # Show price comparison chart
-            chart = VectorUI.create_price_comparison_chart(products)
-            if chart:
-                st.plotly_chart(chart, width="stretch")
-            
-            # Create tabs for different views
-            tab1, tab2, tab3 = st.tabs(["🎯 Detailed View", "📊 Quick Overview", "📈 Analytics"])
-            
-            with tab1:
-                for i, product in enumerate(products):
-                    ProductDisplay.render_product_card(product, i)
-            
-            with tab2:
-                # Create a simple table view
-                table_data = []
-                for product in products:
-                    table_data.append({
-                        "Product": product.get('name', 'N/A'),
-                        "Price": f"₹{product.get('price', 'N/A')} {product.get('currency', '')}",
-                        "Rating": f"{product.get('rating', 'N/A')}/5.0" if product.get('rating') else 'N/A',
-                        "Source": product.get('source', 'N/A'),
-                        "Availability": product.get('availability', 'N/A')
-                    })
-                st.dataframe(table_data, width="stretch")
-            
-            with tab3:
-                # Additional analytics
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    # Price distribution
-                    prices = [p.get('price', 0) for p in products if p.get('price')]
-                    if prices:
-                        st.subheader("💰 Price Distribution")
-                        st.subheader("💰 Price Distribution")
-                        df = pd.DataFrame({'Price': prices})
-                        fig = px.histogram(df, x='Price', nbins=10, title="Price Distribution")
-                        st.plotly_chart(fig, width="stretch")
-                
-                with col2:
-                    # Rating distribution
-                    ratings = [p.get('rating', 0) for p in products if p.get('rating')]
-                    if ratings:
-                        st.subheader("⭐ Rating Distribution")
-                        df = pd.DataFrame({'Rating': ratings})
-                        fig = px.histogram(df, x='Rating', nbins=5, title="Rating Distribution")
-                        st.plotly_chart(fig, width="stretch")
+        st.subheader("📦 Product Results")
+        st.write(f"Found {len(products)} products")
+        
+        # Show metrics overview
+        VectorUI.render_product_metrics(products)
+        
+        # Show price comparison chart
+        chart = VectorUI.create_price_comparison_chart(products)
+        if chart:
+            st.plotly_chart(chart, width="stretch")
         
-        # Display recommendations
-        if results.get('final_recommendation'):
-            RecommendationDisplay.render_recommendations(results['final_recommendation'])
+        # Unlike tabs, which build every tab on each run, only the selected view is rendered
+        view = st.radio("View", RESULT_VIEWS, horizontal=True, label_visibility="collapsed", key="results_view")
         
-        # Raw data toggle
-        with st.expander("🔧 Raw API Response (for debugging)"):
-            st.json(results)
+        if view == RESULT_VIEWS[0]:
+            for i, product in enumerate(products):
+                ProductDisplay.render_product_card(product, i)
+        elif view == RESULT_VIEWS[1]:
+            st.dataframe(VectorUI.create_product_table(products), width="stretch")
+        else:
+            render_analytics(products)
+    
+    # Display recommendations
+    if results.get('final_recommendation'):
+        RecommendationDisplay.render_recommendations(results['final_recommendation'])
+    
+    # Trace waterfall, when the search was traced
+    if results.get('trace'):
+        with st.expander("🧭 Request Trace", expanded=True):
+            chart = VectorUI.create_trace_waterfall_chart(results['trace'])
+            if chart:
+                st.plotly_chart(chart, width="stretch")
+            supersteps = results['trace'].get('supersteps') or []
+            if supersteps:
+                st.caption("Graph state size after each superstep")
+                st.dataframe(supersteps, width="stretch")
+    
+    # Raw data toggle
+    with st.expander("🔧 Raw API Response (for debugging)"):
+        st.json(results)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file